@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Memory / time of per-policy used-action sets: frozensets of strings (one string
+object per report row, as a CSV parse produces) vs ActionSets over the shared
+action vocabulary.
+
+    python benchmarks/bench_action_sets.py --policies 20000 --actions-per-policy 40
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from action_vocab import ActionVocabulary  # noqa: E402
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark string sets vs integer-coded ActionSets.")
+    ap.add_argument("--policies", type=int, default=20_000)
+    ap.add_argument("--actions-per-policy", type=int, default=40)
+    ap.add_argument("--vocabulary", type=int, default=15_000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab_names = [f"svc{i % 300}:Action{i}" for i in range(args.vocabulary)]
+    rows = [[rng.choice(vocab_names) for _ in range(args.actions_per_policy)] for _ in range(args.policies)]
+    probes = [rng.choice(vocab_names) for _ in range(args.actions_per_policy)]
+
+    # ''.join(...) forces a fresh string object per row, like a CSV reader does
+    strings, s_mem, s_time = measure(
+        lambda: [frozenset("".join(a).lower() for a in policy) for policy in rows])
+    vocab = ActionVocabulary()
+    coded, c_mem, c_time = measure(lambda: [vocab.encode(policy) for policy in rows])
+
+    start = time.perf_counter()
+    hits_s = sum(p.lower() in s for s in strings for p in probes)
+    t_s = time.perf_counter() - start
+    start = time.perf_counter()
+    hits_c = sum(p in s for s in coded for p in probes)
+    t_c = time.perf_counter() - start
+    assert hits_s == hits_c
+
+    print(f"{args.policies:,} policies x {args.actions_per_policy} actions, vocabulary {args.vocabulary:,}")
+    print(f"  frozenset[str] : {s_mem / 1e6:8.1f} MB  build {s_time:6.2f}s  probe {t_s:6.2f}s")
+    print(f"  ActionSet      : {c_mem / 1e6:8.1f} MB  build {c_time:6.2f}s  probe {t_c:6.2f}s "
+          f"(vocabulary included)")
+    print(f"  memory ratio   : {s_mem / c_mem:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Startup time of the CLI entry points: wall time of a fresh interpreter importing each
+tool module (as it does before parsing arguments), next to the same import with pandas
+and numpy loaded up front (the previous module-top imports), plus `cli.py <command>
+--help` end to end. Median of --repeat runs each.
+
+    python benchmarks/bench_cli_startup.py --repeat 7
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SCRIPT = ROOT / "script"
+sys.path.insert(0, str(SCRIPT))
+
+from cli import COMMANDS  # noqa: E402
+
+HEAVY = ("pandas", "numpy", "pyarrow", "boto3")
+
+
+def wall(cmd, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=SCRIPT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def heavy_modules(module: str) -> str:
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT, capture_output=True, text=True)
+    return out.stdout.strip() or "-"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark CLI startup (import) time.")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--command", action="append", default=[], help="Only these commands (repeatable)")
+    args = ap.parse_args()
+
+    commands = args.command or list(COMMANDS)
+    baseline = wall([sys.executable, "-c", "pass"], args.repeat)
+    eager = wall([sys.executable, "-c", "import numpy, pandas"], args.repeat)
+    print(f"interpreter start {baseline * 1000:7.1f} ms; + import numpy, pandas {eager * 1000:7.1f} ms")
+    print(f"  cli.py --help   {wall([sys.executable, 'cli.py', '--help'], args.repeat) * 1000:7.1f} ms\n")
+    print(f"  {'command':<13} {'module':<23} {'import':>9} {'eager':>9} {'--help':>9}  heavy modules loaded")
+    for command in commands:
+        module = COMMANDS[command][0]
+        lazy = wall([sys.executable, "-c", f"import {module}"], args.repeat)
+        preloaded = wall([sys.executable, "-c", f"import numpy, pandas, {module}"], args.repeat)
+        helped = wall([sys.executable, "cli.py", command, "--help"], args.repeat)
+        print(f"  {command:<13} {module:<23} {lazy * 1000:7.1f}ms {preloaded * 1000:7.1f}ms "
+              f"{helped * 1000:7.1f}ms  {heavy_modules(module)}")
+
+
+if __name__ == "__main__":
+    main()
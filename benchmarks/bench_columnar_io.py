@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Size and load time of a synthetic policy_usage_report: CSV vs dictionary-encoded
+Parquet, written by compare_policy_usage and read back by least_privilege_tool's
+loader (projected Policy File / Action / Status columns). Needs pyarrow.
+
+    python benchmarks/bench_columnar_io.py --policies 20000 --actions-per-policy 40
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from compare_policy_usage import write_report  # noqa: E402
+from least_privilege_tool import load_usage_tables  # noqa: E402
+
+STATUSES = ["Used", "Unused", "Wildcard", "Covered"]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark CSV vs Parquet usage reports.")
+    ap.add_argument("--policies", type=int, default=20_000)
+    ap.add_argument("--actions-per-policy", type=int, default=40)
+    ap.add_argument("--vocabulary", type=int, default=15_000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = [f"svc{i % 300}:Action{i}" for i in range(args.vocabulary)]
+    results = {
+        f"Policy{p:06d}.json": [(rng.choice(vocab), rng.choice(STATUSES)) for _ in range(args.actions_per_policy)]
+        for p in range(args.policies)
+    }
+    rows = args.policies * args.actions_per_policy
+
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for fmt in ("csv", "parquet"):
+            path = os.path.join(tmp, f"report.{fmt}")
+            _, write_s = timed(lambda: write_report(results, path))
+            tables, read_s = timed(lambda: load_usage_tables(path))
+            timings[fmt] = (os.path.getsize(path), write_s, read_s, tables)
+
+    print(f"\n{rows:,} report rows ({args.policies:,} policies x {args.actions_per_policy} actions)")
+    for fmt, (size, write_s, read_s, _) in timings.items():
+        print(f"  {fmt:<8}: {size / 1e6:8.1f} MB  write {write_s:6.2f}s  load {read_s:6.2f}s")
+    csv_t, pq_t = timings["csv"], timings["parquet"]
+    assert {k: frozenset(v) for k, v in csv_t[3][0].items()} == {k: frozenset(v) for k, v in pq_t[3][0].items()}
+    print(f"  size ratio {csv_t[0] / pq_t[0]:.1f}x, load speedup {csv_t[2] / pq_t[2]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Benchmark the paginated IAM fetchers against the in-memory stub backend:
+serial vs thread-pool fetching, with simulated API latency and throttling.
+
+    python benchmarks/bench_iam_fetch.py --entities 2000 --latency 0.005 --workers 1 16
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from fetch_iam_policies import fetch_and_save_policies  # noqa: E402
+from fetch_inline_policies import fetch_all_inline_policies  # noqa: E402
+from iam_backend import StubIAMClient  # noqa: E402
+
+
+def run(fetch, entities: int, latency: float, throttle: float, workers: int):
+    client = StubIAMClient(entities=entities, latency=latency, throttle_rate=throttle)
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        saved = fetch(client, tmp, workers)
+        elapsed = time.perf_counter() - start
+    return saved, elapsed, client
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark IAM fetch concurrency on the stub backend.")
+    ap.add_argument("--entities", type=int, default=1000)
+    ap.add_argument("--latency", type=float, default=0.005, help="Simulated seconds per API call")
+    ap.add_argument("--throttle-rate", type=float, default=0.02)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    args = ap.parse_args()
+
+    for label, fetch in (("managed", fetch_and_save_policies), ("inline", fetch_all_inline_policies)):
+        for workers in args.workers:
+            saved, elapsed, client = run(fetch, args.entities, args.latency, args.throttle_rate, workers)
+            print(f"{label:<8} workers={workers:<3} {saved:6,} policies  {elapsed:7.2f}s  "
+                  f"{saved / elapsed:8,.0f}/s  calls={client.calls:,} throttled={client.throttled:,}")
+
+
+if __name__ == "__main__":
+    main()
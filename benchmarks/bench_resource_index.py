@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Resource index at scale: build a ResourceIndex over N distinct S3 object ARNs and time
+prefix-pattern matching, glob matching and collapsed Resource suggestions.
+
+    python benchmarks/bench_resource_index.py --arns 2000000 --buckets 200
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from resource_index import ResourceIndex  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark ResourceIndex matching and suggestions.")
+    ap.add_argument("--arns", type=int, default=2_000_000)
+    ap.add_argument("--buckets", type=int, default=200)
+    ap.add_argument("--prefixes", type=int, default=1000, help="Key prefixes per bucket")
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    arns = [f"arn:aws:s3:::bucket-{rng.randrange(args.buckets)}/data/{rng.randrange(args.prefixes)}/obj-{i}"
+            for i in range(args.arns)]
+    index = ResourceIndex()
+    _, add_s = timed(lambda: index.add("s3", "GetObject", arns))
+    _, build_s = timed(lambda: index.arns_for("s3:GetObject"))
+    print(f"\n{args.arns:,} ARNs: add {add_s:.2f}s, sort/build {build_s:.2f}s")
+
+    queries = [
+        ("prefix", ["arn:aws:s3:::bucket-7/data/*"]),
+        ("glob", ["arn:aws:s3:::bucket-7/*/5*"]),
+        ("all", ["*"]),
+    ]
+    for label, patterns in queries:
+        matched, match_s = timed(lambda: index.matching("s3:GetObject", patterns))
+        suggestion, suggest_s = timed(lambda: index.suggest(["s3:GetObject"], patterns, args.limit))
+        print(f"  {label:<7} {patterns[0]:<32} {len(matched):>10,} ARNs  match {match_s * 1000:8.1f} ms  "
+              f"suggest {suggest_s * 1000:8.1f} ms -> {len(suggestion)} entries")
+
+
+if __name__ == "__main__":
+    main()
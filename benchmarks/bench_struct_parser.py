@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Throughput of Hive-struct useridentity parsing over an Athena-style event stream where
+a few thousand identity strings repeat across many events: full parse without the memo,
+field-selected parse without the memo, and the memoized field-selected parse.
+
+    python benchmarks/bench_struct_parser.py --events 200000 --identities 2000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import hive_struct  # noqa: E402
+
+
+def identity(i: int) -> str:
+    if i % 3:
+        return (f"{{type=IAMUser, principalid=AIDA{i:016d}, arn=arn:aws:iam::123456789012:user/user{i}, "
+                f"accountid=123456789012, accesskeyid=ASIA{i:016d}, username=user{i}, "
+                f"sessioncontext={{sessionissuer={{}}, webidfederationdata={{}}, attributes={{"
+                f"creationdate=2023-07-10T11:42:31Z, mfaauthenticated=true}}}}, invokedby=null}}")
+    return (f"{{type=AssumedRole, principalid=AROA{i:016d}:session, "
+            f"arn=arn:aws:sts::123456789012:assumed-role/role{i}/session, accountid=123456789012, "
+            f"accesskeyid=ASIA{i:016d}, username=null, sessioncontext={{sessionissuer={{type=Role, "
+            f"principalid=AROA{i:016d}, arn=arn:aws:iam::123456789012:role/role{i}, "
+            f"accountid=123456789012, username=role{i}}}, webidfederationdata={{}}, attributes={{"
+            f"creationdate=2023-07-10T11:42:31Z, mfaauthenticated=false}}}}, invokedby=null}}")
+
+
+def timed(label: str, events, fn) -> float:
+    start = time.perf_counter()
+    for text in events:
+        fn(text)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28}: {elapsed:6.2f}s  ({len(events) / elapsed:12,.0f} events/sec)")
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark memoized Hive-struct parsing.")
+    ap.add_argument("--events", type=int, default=200_000)
+    ap.add_argument("--identities", type=int, default=2_000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    pool = [identity(i) for i in range(args.identities)]
+    # ''.join(...) gives each row its own string object, as the CSV reader does
+    events = ["".join(rng.choice(pool)) for _ in range(args.events)]
+    fields = ("arn", "type")
+    uncached = hive_struct._parse_cached.__wrapped__
+
+    print(f"{args.events:,} events over {args.identities:,} distinct identities")
+    full = timed("full parse, no memo", events, lambda t: uncached(t, None))
+    selected = timed("arn+type, no memo", events, lambda t: uncached(t, fields))
+    memo = timed("arn+type, memoized", events, lambda t: hive_struct.parse_struct(t, fields))
+    print(f"  speedup vs full parse       : {full / memo:6.1f}x (field selection alone {full / selected:.1f}x)")
+    print(f"  memo: {hive_struct.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite on a synthetic corpus (see synthetic.py). Times each stage
+separately – load events, compare, load report, refine, summary – records wall and CPU
+time, throughput and each stage's peak RSS, and compares wall time / memory against the
+stored baseline (benchmarks/baseline.json). Exits 1 on a regression beyond --tolerance.
+
+    python benchmarks/run_benchmarks.py --profile small
+    python benchmarks/run_benchmarks.py --profile medium --workers 4
+    python benchmarks/run_benchmarks.py --profile small --update-baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+sys.path.insert(0, str(ROOT / "script"))
+sys.path.insert(0, str(HERE))
+
+# the tools import pandas lazily; load it before any stage is timed so the first stage
+# that needs it (load_report) is not charged the one-off import
+import pandas  # noqa: E402,F401
+import compare_policy_usage as cpu  # noqa: E402
+import least_privilege_tool as lpt  # noqa: E402
+from fix_policy_summary import fix_summary  # noqa: E402
+from synthetic import CorpusSpec, add_spec_arguments, generate_corpus, spec_from_args  # noqa: E402
+from usage_index import load_usage_index  # noqa: E402
+
+PROFILES = {
+    "tiny": CorpusSpec(policies=50, events=5_000, principals=20),
+    "small": CorpusSpec(policies=500, events=100_000, principals=100),
+    "medium": CorpusSpec(policies=5_000, events=1_000_000, principals=1_000),
+    "large": CorpusSpec(policies=20_000, events=5_000_000, principals=10_000),
+}
+
+BASELINE_PATH = HERE / "baseline.json"
+CORPUS_DIR = HERE / ".corpus"
+
+# Stages shorter than this are too noisy to flag on a ratio alone
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the process high-water mark so the next reading covers one stage only
+    (Linux: writing 5 to /proc/self/clear_refs resets VmHWM). False where unsupported.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def stage_peak_rss_mb() -> float:
+    with open("/proc/self/status", "r", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return peak_rss_mb()
+
+
+def run_stage(name: str, items: int, fn: Callable[[], object], results: List[Dict]) -> object:
+    """
+    Run one stage with its console chatter silenced and record its figures.
+    The peak RSS is reset before the stage, so peak_rss_mb is that stage's own peak
+    (worker processes not included). Where it cannot be reset only the process-lifetime
+    peak exists; it is recorded as cumulative_peak_rss_mb and not compared, since every
+    stage would inherit the largest earlier one.
+    """
+    per_stage = reset_peak_rss()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = fn()
+    wall, cpu_s = time.perf_counter() - wall0, time.process_time() - cpu0
+    memory = ({"peak_rss_mb": round(stage_peak_rss_mb(), 1)} if per_stage
+              else {"cumulative_peak_rss_mb": round(peak_rss_mb(), 1)})
+    results.append({"stage": name, "wall_s": round(wall, 4), "cpu_s": round(cpu_s, 4), "items": items,
+                    "items_per_s": round(items / wall, 1) if wall > 0 else None, **memory})
+    return value
+
+
+def run_suite(corpus: str, workers: int = 1) -> List[Dict]:
+    events = os.path.join(corpus, "events.csv")
+    policies_dir = os.path.join(corpus, "policies")
+    files = cpu.list_policy_files(policies_dir, os.path.join(policies_dir, "inline"))
+    results: List[Dict] = []
+    with open(events, "rb") as f:
+        n_events = sum(1 for _ in f) - 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = os.path.join(tmp, "policy_usage_report.csv")
+        refined = os.path.join(tmp, "refined")
+
+        index, _ = run_stage("load_events", n_events, lambda: load_usage_index(events), results)
+        run_stage("compare", len(files),
+                  lambda: cpu.write_report_to_csv(cpu.compare_policy_files(files, index, workers), report),
+                  results)
+        usage_map, coverage_map = run_stage("load_report", len(files), lambda: lpt.load_usage_tables(report),
+                                            results)
+        run_stage("refine", len(files),
+                  lambda: lpt.refine_folder(files, usage_map, coverage_map, refined, workers), results)
+        run_stage("summary", len(files),
+                  lambda: fix_summary(os.path.join(refined, "policy_summary.csv"), False, 90.0, 40.0), results)
+    return results
+
+
+def compare_to_baseline(results: List[Dict], baseline: Optional[Dict],
+                        tolerance: float) -> Tuple[List[str], List[str]]:
+    """Returns (report lines, regressions)."""
+    lines: List[str] = []
+    regressions: List[str] = []
+    stages = {r["stage"]: r for r in (baseline or {}).get("stages", [])}
+    for r in results:
+        base = stages.get(r["stage"])
+        peak = r.get("peak_rss_mb")
+        line = (f"  {r['stage']:<12} wall {r['wall_s']:8.3f}s  cpu {r['cpu_s']:8.3f}s  "
+                f"{r['items_per_s'] or 0:>12,.0f}/s  "
+                + (f"peak {peak:7.1f} MB" if peak is not None else f"peak {r['cumulative_peak_rss_mb']:7.1f} MB (process)"))
+        if base:
+            ratio = r["wall_s"] / base["wall_s"] if base["wall_s"] else 1.0
+            line += f"  ({ratio:5.2f}x baseline)"
+            slower = r["wall_s"] - base["wall_s"]
+            if ratio > 1 + tolerance and slower > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{r['stage']}: {r['wall_s']:.3f}s vs {base['wall_s']:.3f}s")
+            base_peak = base.get("peak_rss_mb")
+            if peak is not None and base_peak is not None and peak > base_peak * (1 + tolerance):
+                regressions.append(f"{r['stage']}: peak {peak:.1f} MB vs {base_peak:.1f} MB")
+        lines.append(line)
+    return lines, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the synthetic end-to-end benchmark suite.")
+    ap.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    ap.add_argument("--workers", type=int, default=1, help="Workers for compare/refine (default: 1)")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH), help=f"Baseline file (default: {BASELINE_PATH.name})")
+    ap.add_argument("--tolerance", type=float, default=0.3,
+                    help="Allowed slowdown / memory growth vs baseline before failing (default: 0.3 = 30%%)")
+    ap.add_argument("--update-baseline", action="store_true", help="Store this run as the profile's baseline")
+    ap.add_argument("--json", default=None, help="Also write this run's results to a JSON file")
+    ap.add_argument("--corpus-dir", default=str(CORPUS_DIR), help="Where generated corpora are cached")
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+
+    spec = spec_from_args(args, PROFILES[args.profile])
+    profile = args.profile if spec == PROFILES[args.profile] else f"{args.profile}-{spec.key()}"
+    corpus = os.path.join(args.corpus_dir, spec.key())
+    print(f"📦 Corpus {profile}: {spec.policies:,} policies, {spec.events:,} events → {corpus}")
+    start = time.perf_counter()
+    generate_corpus(corpus, spec)
+    print(f"   ready in {time.perf_counter() - start:.1f}s")
+
+    results = run_suite(corpus, args.workers)
+    run = {"profile": profile, "corpus": asdict(spec), "workers": args.workers,
+           "python": platform.python_version(), "machine": platform.machine(), "stages": results}
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baselines = json.load(f)
+    except (OSError, ValueError):
+        baselines = {}
+    baseline = baselines.get(profile)
+    if baseline and baseline.get("workers") != args.workers:
+        print(f"⚠️  Baseline for {profile} was recorded with {baseline.get('workers')} worker(s)")
+
+    lines, regressions = compare_to_baseline(results, baseline, args.tolerance)
+    print(f"\n⏱  {profile} (workers={args.workers})" + ("" if baseline else " – no baseline yet"))
+    print("\n".join(lines))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    if args.update_baseline:
+        baselines[profile] = run
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n💾 Baseline updated: {args.baseline} [{profile}]")
+        return
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.tolerance:.0%}:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    if baseline:
+        print(f"\n✅ Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
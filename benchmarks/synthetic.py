@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic corpus for benchmarks: N IAM policies (managed + inline) with a
+configurable statement count and wildcard ratio, and M CloudTrail events (Athena CSV
+layout, Hive-struct useridentity) spread over services, principals and days.
+The same parameters and seed always produce byte-identical files.
+
+    python benchmarks/synthetic.py --out /tmp/corpus --policies 5000 --events 1000000
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import shutil
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Dict, List
+
+SERVICES = ["s3", "ec2", "iam", "logs", "lambda", "dynamodb", "sts", "kms",
+            "sqs", "sns", "rds", "cloudwatch", "ecr", "ecs", "glue", "athena"]
+VERBS = ["Get", "List", "Describe", "Put", "Create", "Delete", "Update", "Tag", "Start", "Stop"]
+NOUNS = ["Bucket", "Object", "Instance", "Role", "Policy", "Function", "Table", "Key", "Queue",
+         "Topic", "Cluster", "Image", "Job", "Stream", "Alarm", "Snapshot", "Volume", "User"]
+
+
+@dataclass
+class CorpusSpec:
+    policies: int = 500
+    statements: int = 3
+    actions_per_statement: int = 8
+    wildcard_ratio: float = 0.1
+    deny_ratio: float = 0.05
+    inline_ratio: float = 0.3
+    events: int = 100_000
+    principals: int = 100
+    days: int = 30
+    seed: int = 7
+
+    def key(self) -> str:
+        """Short stable id of the parameters (names the cached corpus folder)."""
+        return hashlib.sha1(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:12]
+
+
+def action_catalog(rng: random.Random) -> Dict[str, List[str]]:
+    """service -> its action names (same for a given seed)."""
+    return {svc: sorted({f"{rng.choice(VERBS)}{rng.choice(NOUNS)}{rng.choice(['', 's', 'Attribute'])}"
+                         for _ in range(40)})
+            for svc in SERVICES}
+
+
+def _principals(spec: CorpusSpec) -> List[str]:
+    return [f"{'role' if i % 3 else 'user'}/svc-{i:05d}" for i in range(spec.principals)]
+
+
+def _statement(rng: random.Random, catalog: Dict[str, List[str]], spec: CorpusSpec) -> Dict:
+    actions = []
+    for _ in range(spec.actions_per_statement):
+        svc = rng.choice(SERVICES)
+        if rng.random() < spec.wildcard_ratio:
+            actions.append(f"{svc}:*" if rng.random() < 0.3 else f"{svc}:{rng.choice(VERBS)}*")
+        else:
+            actions.append(f"{svc}:{rng.choice(catalog[svc])}")
+    effect = "Deny" if rng.random() < spec.deny_ratio else "Allow"
+    return {"Effect": effect, "Action": sorted(set(actions)), "Resource": "*"}
+
+
+def write_policies(out_dir: str, spec: CorpusSpec) -> None:
+    rng = random.Random(spec.seed)
+    catalog = action_catalog(random.Random(spec.seed))
+    principals = _principals(spec)
+    inline_dir = os.path.join(out_dir, "policies", "inline")
+    os.makedirs(inline_dir, exist_ok=True)
+    for i in range(spec.policies):
+        doc = {"Version": "2012-10-17",
+               "Statement": [_statement(rng, catalog, spec) for _ in range(spec.statements)]}
+        if rng.random() < spec.inline_ratio:
+            kind, name = rng.choice(principals).split("/", 1)
+            path = os.path.join(inline_dir, f"{kind}_{name}_inline{i:05d}.json")
+        else:
+            path = os.path.join(out_dir, "policies", f"Policy{i:05d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=2)
+
+
+def _identity(principal: str) -> str:
+    kind, name = principal.split("/", 1)
+    if kind == "user":
+        return (f"{{type=IAMUser, principalid=AIDA{name.upper()}, arn=arn:aws:iam::123456789012:user/{name}, "
+                f"accountid=123456789012, username={name}, sessioncontext={{sessionissuer={{}}, "
+                f"attributes={{mfaauthenticated=false}}}}}}")
+    return (f"{{type=AssumedRole, principalid=AROA{name.upper()}:s, "
+            f"arn=arn:aws:sts::123456789012:assumed-role/{name}/s, accountid=123456789012, "
+            f"sessioncontext={{sessionissuer={{type=Role, arn=arn:aws:iam::123456789012:role/{name}}}, "
+            f"attributes={{mfaauthenticated=false}}}}}}")
+
+
+def write_events(out_dir: str, spec: CorpusSpec) -> None:
+    rng = random.Random(spec.seed + 1)
+    catalog = action_catalog(random.Random(spec.seed))
+    identities = [_identity(p) for p in _principals(spec)]
+    start = date(2024, 1, 1)
+    days = [(start + timedelta(days=d)).isoformat() for d in range(spec.days)]
+    # a few services and actions dominate, as in real trails
+    svc_weights = [1.0 / (i + 1) for i in range(len(SERVICES))]
+    with open(os.path.join(out_dir, "events.csv"), "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, quoting=csv.QUOTE_ALL)
+        w.writerow(["eventtime", "useridentity", "eventsource", "eventname"])
+        for i in range(spec.events):
+            svc = rng.choices(SERVICES, svc_weights)[0]
+            actions = catalog[svc]
+            name = actions[min(int(rng.expovariate(0.15)), len(actions) - 1)]
+            w.writerow([f"{rng.choice(days)}T{i % 24:02d}:{i % 60:02d}:00Z", rng.choice(identities),
+                        f"{svc}.amazonaws.com", name])
+
+
+def generate_corpus(out_dir: str, spec: CorpusSpec) -> str:
+    """Write policies/, policies/inline/, events.csv and corpus.json into `out_dir` (reused if complete)."""
+    marker = os.path.join(out_dir, "corpus.json")
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            if json.load(f) == asdict(spec):
+                return out_dir
+    shutil.rmtree(os.path.join(out_dir, "policies"), ignore_errors=True)
+    write_policies(out_dir, spec)
+    write_events(out_dir, spec)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(asdict(spec), f, indent=2)
+    return out_dir
+
+
+def add_spec_arguments(ap: argparse.ArgumentParser) -> None:
+    for name, value in asdict(CorpusSpec()).items():
+        ap.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=None,
+                        help=f"Corpus parameter (generator default: {value})")
+
+
+def spec_from_args(args, base: CorpusSpec) -> CorpusSpec:
+    overrides = {k: v for k, v in vars(args).items() if k in asdict(base) and v is not None}
+    return CorpusSpec(**{**asdict(base), **overrides})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a deterministic synthetic IAM policy + CloudTrail corpus.")
+    ap.add_argument("--out", required=True, help="Output folder")
+    add_spec_arguments(ap)
+    args = ap.parse_args()
+    spec = spec_from_args(args, CorpusSpec())
+    generate_corpus(args.out, spec)
+    print(f"✅ Corpus written to {args.out}: {spec.policies:,} policies, {spec.events:,} events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# ---------- Shared action vocabulary + integer-coded action sets ----------
+#
+# Every normalized 'service:action' string gets a dense integer id in one shared
+# vocabulary, so the string itself is stored once per process. Per-policy action sets
+# are then sorted uint32 arrays of ids (4 bytes per action instead of a set entry plus
+# a string object), and set algebra runs on ints. Sets convert to int bitsets for
+# bulk operations over the whole action space (see bits()/from_bits()).
+
+
+# bounded: long-running processes (analysis_service) see arbitrary client action strings
+@lru_cache(maxsize=65536)
+def normalize_action(action: str) -> str:
+    """'S3:GetObject ' -> 's3:getobject' (IAM actions are case-insensitive)."""
+    return action.strip().lower()
+
+
+class ActionVocabulary:
+    """Bidirectional map between normalized action strings and dense int ids."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def id(self, action: str) -> int:
+        """Id for `action`, assigning the next one if it is new."""
+        key = normalize_action(action)
+        ident = self._ids.get(key)
+        if ident is None:
+            ident = len(self._names)
+            self._ids[key] = ident
+            self._names.append(key)
+        return ident
+
+    def get(self, action: str) -> Optional[int]:
+        """Id for `action` or None – never grows the vocabulary."""
+        ident = self._ids.get(action)  # already-normalized fast path
+        return ident if ident is not None else self._ids.get(normalize_action(action))
+
+    def name(self, ident: int) -> str:
+        return self._names[ident]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, action: str) -> bool:
+        return normalize_action(action) in self._ids
+
+    def encode(self, actions: Iterable[str]) -> "ActionSet":
+        return ActionSet.from_ids(self, (self.id(a) for a in actions))
+
+    def universe(self) -> "ActionSet":
+        """Every action known to the vocabulary."""
+        return ActionSet(self, array("I", range(len(self._names))))
+
+
+class ActionSet:
+    """
+    Immutable set of actions stored as a sorted array('I') of vocabulary ids.
+    Supports `in` with action strings, iteration (normalized names), len and & | -.
+    """
+
+    __slots__ = ("vocab", "ids")
+
+    def __init__(self, vocab: ActionVocabulary, ids: array) -> None:
+        self.vocab = vocab
+        self.ids = ids
+
+    @classmethod
+    def from_ids(cls, vocab: ActionVocabulary, ids: Iterable[int]) -> "ActionSet":
+        return cls(vocab, array("I", sorted(set(ids))))
+
+    @classmethod
+    def from_bits(cls, vocab: ActionVocabulary, bits: int) -> "ActionSet":
+        ids = array("I")
+        while bits:
+            low = bits & -bits
+            ids.append(low.bit_length() - 1)
+            bits ^= low
+        return cls(vocab, ids)
+
+    def bits(self) -> int:
+        """Int bitset over the vocabulary (dense form for whole-action-space algebra)."""
+        if not self.ids:
+            return 0
+        buf = bytearray(self.ids[-1] // 8 + 1)
+        for ident in self.ids:
+            buf[ident >> 3] |= 1 << (ident & 7)
+        return int.from_bytes(buf, "little")
+
+    def has_id(self, ident: int) -> bool:
+        i = bisect_left(self.ids, ident)
+        return i < len(self.ids) and self.ids[i] == ident
+
+    def __contains__(self, action: str) -> bool:
+        ident = self.vocab.get(action)
+        if ident is None:
+            return False
+        ids = self.ids
+        i = bisect_left(ids, ident)
+        return i < len(ids) and ids[i] == ident
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __bool__(self) -> bool:
+        return bool(self.ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.vocab.name(i) for i in self.ids)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ActionSet):
+            return self.vocab is other.vocab and self.ids == other.ids
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.ids.tobytes())
+
+    def _combine(self, other: "ActionSet", op) -> "ActionSet":
+        if other.vocab is not self.vocab:
+            raise ValueError("ActionSets from different vocabularies cannot be combined")
+        return ActionSet.from_ids(self.vocab, op(set(self.ids), other.ids))
+
+    def __and__(self, other: "ActionSet") -> "ActionSet":
+        return self._combine(other, set.intersection)
+
+    def __or__(self, other: "ActionSet") -> "ActionSet":
+        return self._combine(other, set.union)
+
+    def __sub__(self, other: "ActionSet") -> "ActionSet":
+        return self._combine(other, set.difference)
+
+    def __repr__(self) -> str:
+        return f"ActionSet({sorted(self)!r})"
+
+    def __reduce__(self):
+        # Ids are only meaningful within one process: ship names, re-encode on arrival
+        if self.vocab is VOCABULARY:
+            return (_decode_shared, (list(self),))
+        return (ActionSet, (self.vocab, self.ids))
+
+
+# Process-wide vocabulary shared by the loaders and analyzers
+VOCABULARY = ActionVocabulary()
+
+
+def _decode_shared(names: List[str]) -> ActionSet:
+    return VOCABULARY.encode(names)
@@ -0,0 +1,470 @@
+import os
+import json
+import time
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from action_vocab import VOCABULARY
+from compare_policy_usage import compare_policy_document, list_policy_files, load_policy
+from event_stream import DEFAULT_CHUNK_SIZE, JSON_SUFFIXES
+from iam_snapshot import SnapshotReader
+from least_privilege_tool import refine_policy, usage_maps_from_findings
+from reporting import Reporter, add_reporting_arguments, reporter_from_args
+from resource_index import DEFAULT_RESOURCE_LIMIT, ResourceIndex, load_resource_index
+from result_cache import policy_hash
+from usage_index import UsageIndex, load_usage_index
+from usage_rollups import describe_window, ingest, manifest_path, parse_window, usage_index_from_rollups
+
+# ---------- Analysis service (warm indexes over HTTP) ----------
+#
+# A long-running process for tools that ask "how is this policy used / what would it
+# look like refined?" many times an hour. The usage index, the parsed policies and the
+# optional resource index are loaded once and kept in memory; each request only runs
+# compare_policy_document / refine_policy on one document, and results are memoized
+# per (policy hash, index generation, options).
+#
+#   GET  /health            index description, generation, request counters
+#   POST /compare           {"policy": {...}} or {"policy_name": "X.json"} -> findings
+#   POST /refine            same, plus "flatten" / "narrow_resources" / "resource_limit"
+#   POST /reload            reload now; also re-reads --policies / --snapshot
+#
+# A watcher thread polls the event sources every --reload-interval seconds. New files
+# in a --counts folder are streamed into a copy of the current index; a changed or
+# removed file rebuilds it. With --rollups --inbox, new exports in the inbox are
+# ingested into the rollups first; a rollup lookback window (--since 90d) is also
+# rebuilt when its first day moves with the calendar. The new index is built next to
+# the old one and swapped in whole, so requests never see a half-loaded index.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_RELOAD_INTERVAL = 10.0
+DEFAULT_MEMO_SIZE = 4096
+
+EVENT_SUFFIXES = (".csv",) + JSON_SUFFIXES
+# request body keys passed to refine_policy
+REFINE_OPTIONS = ("flatten", "narrow_resources", "resource_limit")
+
+# (path, size, mtime_ns) of every watched file
+Signature = Tuple[Tuple[str, int, int], ...]
+# resolved --since / --until days
+Window = Tuple[Optional[str], Optional[str]]
+
+
+def event_files(path: str) -> List[str]:
+    """`path` itself, or the CSV / JSON-lines exports (optionally .gz) directly inside a folder."""
+    if not os.path.isdir(path):
+        return [path]
+    names = sorted(os.listdir(path))
+    return [os.path.join(path, name) for name in names
+            if (name[:-3] if name.endswith(".gz") else name).lower().endswith(EVENT_SUFFIXES)]
+
+
+def signature(paths: List[str]) -> Signature:
+    entries = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(entries)
+
+
+def _copy_index(index: UsageIndex) -> UsageIndex:
+    copy = UsageIndex()
+    copy.qualified = dict(index.qualified)
+    copy.bare = set(index.bare)
+    return copy
+
+
+class UsageSource:
+    """
+    Where the usage index comes from: event exports (--counts, a file or a folder) or
+    a rollup store with an optional window (--rollups / --since / --until) fed from --inbox.
+    """
+
+    def __init__(self, counts: Optional[str] = None, rollups: Optional[str] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 inbox: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        if bool(counts) == bool(rollups):
+            raise ValueError("Give exactly one of counts / rollups")
+        self.counts = counts
+        self.rollups = rollups
+        self.since = since
+        self.until = until
+        self.inbox = inbox
+        self.chunk_size = chunk_size
+
+    def watched(self) -> List[str]:
+        if self.counts:
+            return event_files(self.counts)
+        return [manifest_path(self.rollups)]
+
+    def ingest_inbox(self) -> int:
+        """Fold new inbox exports into the rollups; returns how many were ingested."""
+        if not (self.rollups and self.inbox and os.path.isdir(self.inbox)):
+            return 0
+        return sum(ingest(path, self.rollups, chunk_size=self.chunk_size) is not None
+                   for path in event_files(self.inbox))
+
+    def window(self) -> Window:
+        """
+        Resolved (first day, last day) of a --rollups window, re-parsed on every call so a
+        '90d' lookback moves with the calendar; (None, None) for --counts.
+        """
+        if not self.rollups:
+            return None, None
+        return parse_window(self.since, self.until)
+
+    def load(self, previous: Optional[UsageIndex] = None, previous_signature: Signature = (),
+             window: Optional[Window] = None) -> Tuple[UsageIndex, Signature, str]:
+        """(index, signature of what it was built from, how it was loaded)."""
+        if self.rollups:
+            since, until = window or self.window()
+            current = signature(self.watched())
+            index, _ = usage_index_from_rollups(self.rollups, since, until)
+            return index, current, f"rollups {self.rollups} [{describe_window(since, until)}]"
+
+        current = signature(self.watched())
+        known = {entry[0]: entry for entry in previous_signature}
+        added = [entry for entry in current if entry[0] not in known]
+        unchanged = all(entry in current for entry in previous_signature)
+        if previous is not None and unchanged and added:
+            # only new files: extend a copy of the live index
+            index = _copy_index(previous)
+            how = f"+{len(added)} new file(s)"
+        else:
+            index, added = UsageIndex(), list(current)
+            how = f"{len(added)} file(s)"
+        for path, _, _ in added:
+            load_usage_index(path, self.chunk_size, index)
+        return index, current, how
+
+
+@dataclass
+class WarmState:
+    """Everything one request reads; replaced as a whole on reload."""
+    usage: UsageIndex
+    usage_signature: Signature
+    policies: Dict[str, Dict]
+    resources: Optional[ResourceIndex] = None
+    resources_signature: Signature = ()
+    usage_window: Window = (None, None)
+    generation: int = 0
+    loaded_at: float = field(default_factory=time.time)
+
+
+class RequestError(Exception):
+    """Client error: reported as JSON with `status`."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def refine_options(body: Dict) -> Dict[str, Any]:
+    """REFINE_OPTIONS from a request body, validated (RequestError on bad values) and defaulted."""
+    options: Dict[str, Any] = {"flatten": False, "narrow_resources": False,
+                               "resource_limit": DEFAULT_RESOURCE_LIMIT}
+    for key in ("flatten", "narrow_resources"):
+        if key in body:
+            if not isinstance(body[key], bool):
+                raise RequestError(f"{key!r} must be true or false")
+            options[key] = body[key]
+    if "resource_limit" in body:
+        limit = body["resource_limit"]
+        # bool is an int subclass: reject it along with strings, floats and lists
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise RequestError("'resource_limit' must be a positive integer")
+        options["resource_limit"] = limit
+    return options
+
+
+class AnalysisService:
+    def __init__(self, source: UsageSource, policies_dir: Optional[str] = None,
+                 inline_dir: Optional[str] = None, snapshot: Optional[str] = None,
+                 resources: Optional[str] = None, memo_size: int = DEFAULT_MEMO_SIZE,
+                 reporter: Optional[Reporter] = None) -> None:
+        self.source = source
+        self.policies_dir = policies_dir
+        self.inline_dir = inline_dir
+        self.snapshot = snapshot
+        self.resources_path = resources
+        self.memo_size = memo_size
+        self.reporter = reporter or Reporter()
+        self.requests: Counter = Counter()
+        self.request_ms: Counter = Counter()
+        self._memo: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        # analysis shares the action vocabulary and the index's lazy wildcard memo;
+        # re-entrant because a refine computes (or reuses) the compare findings first
+        self._analysis_lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self.state = self._load(None, force=True)
+
+    # ----- loading
+
+    def load_policies(self) -> Dict[str, Dict]:
+        if self.snapshot:
+            return dict(SnapshotReader(self.snapshot).policy_documents())
+        if not self.policies_dir:
+            return {}
+        inline_dir = self.inline_dir or os.path.join(self.policies_dir, "inline")
+        return {name: load_policy(path) for name, path in list_policy_files(self.policies_dir, inline_dir)}
+
+    def _load(self, state: Optional[WarmState], force: bool) -> Optional[WarmState]:
+        """A new WarmState if anything changed (always with `force`), else None."""
+        ingested = self.source.ingest_inbox()
+        window = self.source.window()
+        usage_changed = (force or state is None or ingested or window != state.usage_window
+                         or signature(self.source.watched()) != state.usage_signature)
+        resources_signature = signature([self.resources_path]) if self.resources_path else ()
+        resources_changed = state is None or (self.resources_path and resources_signature != state.resources_signature)
+        if not (usage_changed or resources_changed):
+            return None
+
+        start = time.perf_counter()
+        if usage_changed:
+            previous = None if force or state is None else state.usage
+            usage, usage_signature, how = self.source.load(previous, state.usage_signature if previous else (), window)
+        else:
+            usage, usage_signature, how = state.usage, state.usage_signature, "unchanged"
+        resources = state.resources if state is not None else None
+        if self.resources_path and (resources_changed or force):
+            resources, _ = load_resource_index(self.resources_path, self.source.chunk_size)
+        policies = self.load_policies() if force or state is None else state.policies
+
+        new = WarmState(usage, usage_signature, policies, resources, resources_signature, window,
+                        generation=(state.generation + 1) if state is not None else 1)
+        self.reporter.info(f"🔄 Generation {new.generation}: {usage.describe()} ({how}"
+                           f"{f', {ingested} ingested from inbox' if ingested else ''}), "
+                           f"{len(policies)} policies"
+                           f"{f', {resources.describe()}' if resources is not None else ''} "
+                           f"in {time.perf_counter() - start:.2f}s")
+        self.reporter.flush()
+        return new
+
+    def reload(self, force: bool = False) -> bool:
+        """Swap in a new WarmState if the sources changed; True if one was loaded."""
+        with self._reload_lock:
+            new = self._load(self.state, force)
+            if new is None:
+                return False
+            self.state = new
+            with self._memo_lock:
+                self._memo.clear()
+            return True
+
+    # ----- requests
+
+    def resolve_policy(self, body: Dict, state: WarmState) -> Tuple[str, Dict]:
+        if isinstance(body.get("policy"), dict):
+            return str(body.get("name") or "policy.json"), body["policy"]
+        name = body.get("policy_name")
+        if not name:
+            raise RequestError("Send a policy document as 'policy' or a loaded policy file as 'policy_name'")
+        if name not in state.policies:
+            raise RequestError(f"Unknown policy_name {name!r} ({len(state.policies)} policies loaded)", 404)
+        return name, state.policies[name]
+
+    def _memoized(self, key: Tuple, compute) -> Tuple[Dict, bool]:
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key], True
+        with self._analysis_lock:
+            result = compute()
+        with self._memo_lock:
+            self._memo[key] = result
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return result, False
+
+    def _findings(self, policy: Dict, digest: str, state: WarmState) -> Tuple[Dict, bool]:
+        def compute() -> Dict:
+            findings = compare_policy_document("", policy, state.usage, verbose=False)
+            return {"findings": [{"action": a, "status": s} for a, s in findings],
+                    "counts": dict(Counter(s for _, s in findings))}
+        return self._memoized(("compare", state.generation, digest), compute)
+
+    def compare(self, body: Dict) -> Dict:
+        state = self.state
+        name, policy = self.resolve_policy(body, state)
+        result, hit = self._findings(policy, policy_hash(policy), state)
+        return {"policy": name, "generation": state.generation, "memoized": hit, **result}
+
+    def refine(self, body: Dict) -> Dict:
+        state = self.state
+        name, policy = self.resolve_policy(body, state)
+        options = refine_options(body)
+        if options["narrow_resources"] and state.resources is None:
+            raise RequestError("narrow_resources needs the service to be started with --resources")
+        digest = policy_hash(policy)
+
+        def compute() -> Dict:
+            compared, _ = self._findings(policy, digest, state)
+            findings = [(row["action"], row["status"]) for row in compared["findings"]]
+            used, covered = usage_maps_from_findings({name: findings})
+            refined, metrics, diff = refine_policy(
+                policy, used.get(name, VOCABULARY.encode(())), covered.get(name, frozenset()),
+                flatten=options["flatten"], resources=state.resources,
+                narrow_resources=options["narrow_resources"], resource_limit=options["resource_limit"])
+            return {"refined": refined, "metrics": metrics, "diff": diff}
+
+        result, hit = self._memoized(("refine", state.generation, digest, tuple(sorted(options.items()))), compute)
+        return {"policy": name, "generation": state.generation, "memoized": hit, **result}
+
+    def record(self, route: str, seconds: float) -> None:
+        self.requests[route] += 1
+        self.request_ms[route] += seconds * 1000.0
+
+    def health(self) -> Dict:
+        state = self.state
+        return {
+            "status": "ok",
+            "generation": state.generation,
+            "loaded_at": state.loaded_at,
+            "usage": state.usage.describe(),
+            "policies": len(state.policies),
+            "resources": state.resources.describe() if state.resources is not None else None,
+            "memoized_results": len(self._memo),
+            "requests": {route: {"count": n, "mean_ms": round(self.request_ms[route] / n, 3)}
+                         for route, n in self.requests.items()},
+        }
+
+
+# ---------- HTTP ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "AnalysisServer"
+
+    def _send(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as exc:
+            raise RequestError(f"Request body is not JSON: {exc}")
+        if not isinstance(body, dict):
+            raise RequestError("Request body must be a JSON object")
+        return body
+
+    def _route(self, routes: Dict) -> None:
+        service = self.server.service
+        route = self.path.split("?", 1)[0]
+        handler = routes.get(route)
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise RequestError(f"No route {self.command} {self.path}", 404)
+            payload = handler()
+            payload["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+            self._send(200, payload)
+        except RequestError as exc:
+            self._send(exc.status, {"error": str(exc)})
+        except Exception as exc:  # keep the daemon up; report the failure to the caller
+            service.reporter.warn(f"⚠️  {self.command} {self.path} failed: {exc!r}")
+            service.reporter.flush()
+            self._send(500, {"error": repr(exc)})
+        finally:
+            service.record(f"{self.command} {route if handler else '(no route)'}", time.perf_counter() - start)
+
+    def do_GET(self) -> None:
+        self._route({"/health": self.server.service.health})
+
+    def do_POST(self) -> None:
+        service = self.server.service
+        self._route({
+            "/compare": lambda: service.compare(self._body()),
+            "/refine": lambda: service.refine(self._body()),
+            "/reload": lambda: {"reloaded": service.reload(force=True), **service.health()},
+        })
+
+    def log_message(self, format: str, *args: Any) -> None:
+        reporter = self.server.service.reporter
+        if reporter.detailed:
+            reporter.detail(f"{self.address_string()} {format % args}")
+            reporter.flush()
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service: AnalysisService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        self.service = service
+        super().__init__((host, port), _Handler)
+
+
+def start_watcher(service: AnalysisService, interval: float) -> threading.Event:
+    """Poll the sources every `interval` seconds in a daemon thread; set the returned Event to stop."""
+    stop = threading.Event()
+
+    def watch() -> None:
+        while not stop.wait(interval):
+            try:
+                service.reload()
+            except Exception as exc:  # a bad export must not stop the watcher
+                service.reporter.warn(f"⚠️  Reload failed, keeping generation {service.state.generation}: {exc!r}")
+                service.reporter.flush()
+
+    threading.Thread(target=watch, name="usage-watcher", daemon=True).start()
+    return stop
+
+
+# ---------- CLI ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve compare / refine for single policies from warm in-memory indexes.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--counts", help="CloudTrail export, or a folder of exports (new files are picked up)")
+    src.add_argument("--rollups", help="Rollup store built by usage_rollups.py")
+    ap.add_argument("--since", default=None, help="With --rollups: first day, YYYY-MM-DD or a lookback like 90d")
+    ap.add_argument("--until", default=None, help="With --rollups: last day, YYYY-MM-DD (default: latest)")
+    ap.add_argument("--inbox", default=None, help="With --rollups: folder whose new exports are ingested on reload")
+    ap.add_argument("--policies", default=None, help="Managed policies folder served by policy_name (+ <policies>/inline)")
+    ap.add_argument("--inline", default=None, help="Inline policies folder (default: <policies>/inline)")
+    ap.add_argument("--snapshot", default=None, help="Serve policies from an iam_snapshot.py snapshot instead")
+    ap.add_argument("--resources", default=None, help="Events with a resources column, for Resource narrowing")
+    ap.add_argument("--host", default=DEFAULT_HOST, help=f"Bind address (default: {DEFAULT_HOST})")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    ap.add_argument("--reload-interval", type=float, default=DEFAULT_RELOAD_INTERVAL,
+                    help=f"Seconds between source checks (default: {DEFAULT_RELOAD_INTERVAL:g}; 0 = only POST /reload)")
+    ap.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE,
+                    help=f"Results kept in memory (default: {DEFAULT_MEMO_SIZE})")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                    help=f"Rows read per chunk while loading events (default: {DEFAULT_CHUNK_SIZE})")
+    add_reporting_arguments(ap)
+    args = ap.parse_args()
+    if (args.since or args.until or args.inbox) and not args.rollups:
+        ap.error("--since/--until/--inbox need --rollups")
+
+    reporter = reporter_from_args(args)
+    source = UsageSource(args.counts, args.rollups, args.since, args.until, args.inbox, args.chunk_size)
+    service = AnalysisService(source, args.policies, args.inline, args.snapshot, args.resources,
+                              args.memo_size, reporter)
+    server = AnalysisServer(service, args.host, args.port)
+    stop = start_watcher(service, args.reload_interval) if args.reload_interval > 0 else None
+    print(f"🚀 Serving on http://{args.host}:{server.server_port} (GET /health, POST /compare /refine /reload)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if stop is not None:
+            stop.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
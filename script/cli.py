@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+# ---------- Single entry point for every tool ----------
+#
+#   python script/cli.py <command> [options]
+#
+# Each command runs the existing tool's main() with the remaining arguments, so flags
+# and output are exactly those of the standalone script. The tool module is imported
+# only once its command is chosen: `cli.py --help` loads nothing but argparse, and
+# pandas / pyarrow / boto3 are imported by the tools themselves at the point they
+# are needed (see the lazy imports in columnar, least_privilege_tool,
+# fix_policy_summary and iam_backend).
+
+# command -> (module, one-line description)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "fetch": ("fetch_iam_policies", "Fetch customer-managed IAM policies into JSON files"),
+    "fetch-inline": ("fetch_inline_policies", "Fetch inline policies of every user, role and group"),
+    "snapshot": ("iam_snapshot", "Build a compact, indexed IAM snapshot (fetch or from-dir)"),
+    "compare": ("compare_policy_usage", "Compare policy actions against CloudTrail usage"),
+    "refine": ("least_privilege_tool", "Write least-privilege policies, diffs and policy_summary"),
+    "fix-summary": ("fix_policy_summary", "Recalculate Least-Privilege % in policy_summary files"),
+    "run-all": ("run_all", "Run compare + refine for every dataset variant"),
+    "rollups": ("usage_rollups", "Maintain per-day usage rollups"),
+    "store": ("event_store", "Ingest / query the sharded, memory-mapped event store"),
+    "effective": ("effective_permissions", "Effective permissions per principal (Deny, NotAction)"),
+    "resources": ("resource_index", "Show the resource ARNs each action was observed on"),
+    "serve": ("analysis_service", "Serve compare / refine from warm in-memory indexes"),
+}
+
+
+def run(command: str, argv: List[str], prog: Optional[str] = None) -> None:
+    """Import the module behind `command` and run its main() on `argv`."""
+    module = importlib.import_module(COMMANDS[command][0])
+    saved = sys.argv
+    # the tool's argparse takes its usage line from argv[0]: 'cli.py compare'
+    sys.argv = [f"{prog or os.path.basename(saved[0])} {command}", *argv]
+    try:
+        module.main()
+    finally:
+        sys.argv = saved
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    width = max(len(name) for name in COMMANDS)
+    ap = argparse.ArgumentParser(
+        description="IAM least-privilege tools.",
+        epilog="commands:\n" + "\n".join(f"  {name:<{width}}  {text}" for name, (_, text) in COMMANDS.items())
+               + "\n\n'<command> --help' shows the options of one command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=COMMANDS, metavar="command", help="One of the commands below")
+    ap.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    run(args.command, args.args, ap.prog)
+
+
+if __name__ == "__main__":
+    main()
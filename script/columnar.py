@@ -0,0 +1,145 @@
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ---------- Optional columnar (Parquet / Arrow) I/O ----------
+#
+# Usage reports and policy summaries can be written as Parquet instead of CSV: string
+# columns with few distinct values (Policy File, Action, Status, recommendation) are
+# dictionary-encoded, and readers project only the columns they need without parsing
+# text. pyarrow is optional and imported on first use; CSV stays the default. The
+# format follows the file extension ('.parquet' / '.pq'), so every existing CSV path
+# keeps working unchanged. pandas itself is imported by the functions that need it, so
+# format_for_path / find_summaries stay cheap for callers that never build a frame.
+
+FORMATS = ("csv", "parquet")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+SUMMARY_BASENAME = "policy_summary"
+# Low-cardinality policy_summary columns stored dictionary-encoded in Parquet
+SUMMARY_DICTIONARY_COLUMNS = ["% Reduction vs Original", "Least privilage recommendation"]
+
+
+def require_pyarrow():
+    """Import pyarrow (+ parquet) lazily, with an actionable error when it is missing."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("Parquet support needs pyarrow: pip install pyarrow "
+                           "(or use a .csv path)") from exc
+    return pa, pq
+
+
+def format_for_path(path: str) -> str:
+    return "parquet" if path.lower().endswith(PARQUET_SUFFIXES) else "csv"
+
+
+def summary_path(folder: str, fmt: str = "csv") -> str:
+    return os.path.join(folder, f"{SUMMARY_BASENAME}.{fmt}")
+
+
+def find_summaries(folder: str) -> List[str]:
+    """Existing policy_summary.csv / .parquet files in `folder`."""
+    return [p for p in (summary_path(folder, fmt) for fmt in FORMATS) if os.path.exists(p)]
+
+
+# ---------- Read ----------
+
+def column_names(path: str) -> List[str]:
+    """Column names without reading any data rows."""
+    if format_for_path(path) == "csv":
+        import pandas as pd
+        return list(pd.read_csv(path, nrows=0).columns)
+    _, pq = require_pyarrow()
+    return list(pq.read_schema(path).names)
+
+
+def read_columns(path: str, columns: Optional[Sequence[str]] = None, **csv_options) -> "pd.DataFrame":
+    """
+    Load `columns` (all if None) from a CSV or Parquet file; `csv_options` go to
+    pd.read_csv only. Parquet string columns come back as pandas categoricals
+    (dictionary-encoded), so downstream factorize/groupby work on integer codes.
+    """
+    if format_for_path(path) == "csv":
+        import pandas as pd
+        return pd.read_csv(path, usecols=list(columns) if columns else None, **csv_options)
+    _, pq = require_pyarrow()
+    table = pq.read_table(path, columns=list(columns) if columns else None)
+    return table.to_pandas()
+
+
+# ---------- Write ----------
+
+def write_frame(df: "pd.DataFrame", path: str, dictionary_columns: Iterable[str] = ()) -> None:
+    """
+    Write a DataFrame as CSV or Parquet (by extension), dictionary-encoding the given
+    columns. The file is written next to `path` and renamed over it, so readers never
+    see a half-written summary.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    if format_for_path(path) == "csv":
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return
+    pa, pq = require_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in dictionary_columns:
+        if name in table.column_names and not pa.types.is_dictionary(table.schema.field(name).type):
+            i = table.column_names.index(name)
+            table = table.set_column(i, name, table.column(name).dictionary_encode())
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def write_report_parquet(rows: Iterable[Tuple[str, Iterable[Tuple[str, str]]]], path: str) -> None:
+    """
+    (policy file, [(action, status), ...]) pairs -> dictionary-encoded Parquet report,
+    written next to `path` and renamed over it like write_frame().
+    """
+    pa, pq = require_pyarrow()
+    policies: List[str] = []
+    actions: List[str] = []
+    statuses: List[str] = []
+    for policy_file, findings in rows:
+        for action, status in findings:
+            policies.append(policy_file)
+            actions.append(action)
+            statuses.append(status)
+    table = pa.table({
+        "Policy File": pa.array(policies, pa.string()).dictionary_encode(),
+        "Action": pa.array(actions, pa.string()).dictionary_encode(),
+        "Status": pa.array(statuses, pa.string()).dictionary_encode(),
+    })
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+
+def replace_columns(path: str, values: Dict[str, "pd.Series"], dictionary_columns: Iterable[str] = (),
+                    dest: Optional[str] = None) -> None:
+    """
+    Overwrite / append columns of a Parquet file in place (or write the result to `dest`).
+    Untouched columns are carried over as Arrow data, never converted to pandas.
+    """
+    pa, pq = require_pyarrow()
+    table = pq.read_table(path)
+    dictionary_columns = set(dictionary_columns)
+    for name, series in values.items():
+        array = pa.Array.from_pandas(series.reset_index(drop=True))
+        if name in dictionary_columns and not pa.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, array)
+        else:
+            table = table.append_column(name, array)
+    # the pandas schema metadata describes the old columns; drop it so dtypes follow Arrow
+    table = table.replace_schema_metadata(None)
+    dest = dest or path
+    tmp = dest + ".tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, dest)
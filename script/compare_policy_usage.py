@@ -2,108 +2,213 @@ import os
 import json
 import csv
 import argparse
-from typing import Dict, Iterable, List, Set, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from columnar import format_for_path, write_report_parquet
+from effective_permissions import granted_actions
+from event_store import EventStore
+from event_stream import DEFAULT_CHUNK_SIZE, load_used_events_streaming
+from iam_snapshot import SnapshotReader
+from metrics import add_metrics_arguments, file_bytes, finish, metrics_from_args
+from parallel import imap_chunks
+from policy_dedup import DocumentGroups
+from principal_usage import PolicyPrincipals, attribute_policies, load_principal_usage
+from reporting import Reporter, add_reporting_arguments, reporter_from_args
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE_DAYS, ResultCache, policy_hash
+from usage_index import UsageIndex, load_usage_index
+from usage_rollups import (describe_window, parse_window, principal_usage_from_rollups,
+                           usage_index_from_rollups, window_files)
+from wildcard_matcher import is_wildcard
 
 # ---------- Helpers ----------
 
-def load_used_actions_from_csv(csv_file: str) -> Set[str]:
+def load_used_actions_from_csv(csv_file: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Set[str]:
     """
     Load CloudTrail event names from a CSV (robust header detection).
     Works with headers like: eventname, eventName, event_name.
     If a 'dataset,eventname' CSV is passed, it will pick 'eventname'.
     Falls back to a sensible column if needed.
+    Gzip'd CSV and CloudTrail JSON-lines are streamed the same way (see event_stream).
     Returns a LOWERCASED set of event names (e.g., 'putobject').
     """
-    if not os.path.exists(csv_file):
-        raise FileNotFoundError(f"Counts file not found: {csv_file}")
-
-    used: Set[str] = set()
-    with open(csv_file, "r", newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        if not reader.fieldnames:
-            raise ValueError(f"No header row found in CSV: {csv_file}")
-
-        original_headers = reader.fieldnames
-        lower_to_orig = {h.lower(): h for h in original_headers}
-
-        key = None
-        # 1) Preferred headers
-        if "eventname" in lower_to_orig:
-            key = lower_to_orig["eventname"]
-        elif "event_name" in lower_to_orig:
-            key = lower_to_orig["event_name"]
-        elif "eventName" in original_headers:  # exact camel-case check
-            key = "eventName"
-
-        # 2) Fallbacks if event name not explicit
-        if key is None:
-            # Common combined CSV: ['dataset', 'eventname']
-            if original_headers[0].lower() == "dataset" and len(original_headers) > 1:
-                key = original_headers[1]
-            else:
-                # Last resort: use the first column
-                key = original_headers[0]
+    used, _ = load_used_events_streaming(csv_file, chunk_size)
+    return used
 
-        for row in reader:
-            val = (row.get(key) or "").strip()
-            if val:
-                used.add(val.lower())
 
-    return used
+def load_policy(policy_path: str) -> Dict:
+    with open(policy_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_policy_files(policies_dir: str, inline_dir: str) -> List[Tuple[str, str]]:
+    """
+    (file name, path) for every *.json policy: managed policies first, then inline,
+    each in sorted order – the order rows appear in the usage report.
+    """
+    files: List[Tuple[str, str]] = []
+    for folder in (policies_dir, inline_dir):
+        if os.path.isdir(folder):
+            for file in sorted(os.listdir(folder)):
+                if file.endswith(".json"):
+                    files.append((file, os.path.join(folder, file)))
+    return files
 
 
 def extract_actions(policy_json: Dict) -> Set[str]:
     """
-    Extract all actions from a policy JSON (handles string or list).
-    Returns the raw 'service:Action' strings.
+    Extract the actions granted by a policy JSON (Allow statements; string or list).
+    Returns the raw 'service:Action' strings. Deny statements grant nothing, so their
+    actions are not findings; effective_permissions.py evaluates Deny and NotAction.
     """
-    actions: Set[str] = set()
-    stmts = policy_json.get("Statement", [])
-    if not isinstance(stmts, list):
-        stmts = [stmts]
-
-    for stmt in stmts:
-        action = stmt.get("Action", [])
-        if isinstance(action, str):
-            actions.add(action)
-        elif isinstance(action, list):
-            for a in action:
-                if isinstance(a, str):
-                    actions.add(a)
-    return actions
-
-
-def compare_policy_to_usage(policy_path: str, used_events_lower: Set[str]) -> List[Tuple[str, str]]:
+    return set(granted_actions(policy_json))
+
+
+def compare_policy_to_usage(policy_path: str, usage: Union[UsageIndex, Set[str]]) -> List[Tuple[str, str]]:
     """
     Compare a single policy to used CloudTrail events.
-    Returns list of tuples: (action, 'Used'|'Unused'|'Wildcard').
+    `usage` is a UsageIndex (service-qualified); a plain set of lowercased event
+    names is still accepted and indexed on the fly.
+    Returns list of tuples: (action, 'Used'|'Unused'|'Wildcard'|'Covered').
+    'Covered' rows follow their wildcard and name observed events it grants, so the
+    refinement step can replace the wildcard with concrete actions.
     """
-    with open(policy_path, "r", encoding="utf-8") as f:
-        policy = json.load(f)
+    policy = load_policy(policy_path)
+    return compare_policy_document(os.path.basename(policy_path), policy, usage)
+
+
+def compare_policy_document(policy_name: str, policy: Dict,
+                            usage: Union[UsageIndex, Set[str]],
+                            verbose: bool = True) -> List[Tuple[str, str]]:
+    """Same as compare_policy_to_usage, for an already-parsed policy document."""
+    if not isinstance(usage, UsageIndex):
+        usage = UsageIndex.from_event_names(usage)
 
     actions = extract_actions(policy)
     findings: List[Tuple[str, str]] = []
+    coverage = usage.covered_by(a for a in actions if is_wildcard(a))
+    explicit = {a.lower() for a in actions}
 
-    print(f"\n📄 Policy: {os.path.basename(policy_path)}")
     for action in sorted(actions):
-        # Wildcards like 's3:*'
-        if "*" in action:
-            print(f"  ⚠️  Wildcard Action: {action}")
+        # Wildcards like 's3:*' – list the observed events they actually cover
+        if is_wildcard(action):
             findings.append((action, "Wildcard"))
+            for event in coverage.get(action.strip(), []):
+                if event.lower() not in explicit:
+                    findings.append((event, "Covered"))
             continue
 
-        # Compare suffix (after 'service:') case-insensitively to CloudTrail event names
-        suffix = action.split(":", 1)[-1].lower()
-        if suffix in used_events_lower:
-            print(f"  ✅ Used:   {action}")
-            findings.append((action, "Used"))
-        else:
-            print(f"  ❌ Unused: {action}")
-            findings.append((action, "Unused"))
+        # Match 'service:Action' against the service-qualified index (case-insensitive)
+        findings.append((action, "Used" if usage.is_used(action) else "Unused"))
 
+    if verbose:
+        print_findings(policy_name, findings)
     return findings
 
 
+_STATUS_LINES = {
+    "Wildcard": "  ⚠️  Wildcard Action: {}",
+    "Covered": "      ↳ Covered: {}",
+    "Used": "  ✅ Used:   {}",
+    "Unused": "  ❌ Unused: {}",
+}
+
+
+def print_findings(policy_name: str, findings: Iterable[Tuple[str, str]],
+                   reporter: Optional[Reporter] = None) -> None:
+    """Per-action lines; through `reporter` they only appear at --log-level detail."""
+    if reporter is None:
+        print(f"\n📄 Policy: {policy_name}")
+        for action, status in findings:
+            print(_STATUS_LINES[status].format(action))
+    elif reporter.detailed:
+        reporter.detail(f"\n📄 Policy: {policy_name}",
+                        *(_STATUS_LINES[status].format(action) for action, status in findings))
+
+
+# ---------- Parallel driver ----------
+
+# (file, path-or-document) or (file, path-or-document, UsageIndex for this policy)
+PolicyItem = Union[Tuple[str, Union[str, Dict]], Tuple[str, Union[str, Dict], UsageIndex]]
+
+_WORKER_USAGE: Optional[UsageIndex] = None
+_WORKER_CACHE: Optional[ResultCache] = None
+
+
+def _init_worker(usage: UsageIndex, cache: Optional[ResultCache] = None) -> None:
+    global _WORKER_USAGE, _WORKER_CACHE
+    _WORKER_USAGE = usage
+    _WORKER_CACHE = cache
+
+
+def _compare_cached(file: str, policy: Union[str, Dict],
+                    usage: Optional[UsageIndex] = None) -> Tuple[str, List[Tuple[str, str]], bool]:
+    if not isinstance(policy, dict):
+        policy = load_policy(policy)
+    usage = usage if usage is not None else _WORKER_USAGE
+    cache = _WORKER_CACHE
+    if cache is None or not cache.enabled:
+        return file, compare_policy_document(file, policy, usage, verbose=False), False
+
+    key = cache.key(policy_hash(policy), usage.fingerprint())
+    cached = cache.get(key)
+    if cached is not None:
+        return file, [tuple(row) for row in cached], True
+    findings = compare_policy_document(file, policy, usage, verbose=False)
+    cache.put(key, findings)
+    return file, findings, False
+
+
+def _compare_chunk(chunk: List[PolicyItem]) -> List[Tuple[str, List[Tuple[str, str]], bool]]:
+    return [_compare_cached(*item) for item in chunk]
+
+
+def _dedup_key(item: PolicyItem) -> Tuple[Tuple[str, ...], Optional[int]]:
+    # findings depend only on the action strings (Resource, Effect, Sid do not matter),
+    # and a per-principal UsageIndex makes otherwise identical documents different work units
+    return tuple(sorted(extract_actions(item[1]))), id(item[2]) if len(item) > 2 else None
+
+
+def compare_policy_files(files: List[PolicyItem], usage: UsageIndex,
+                         workers: int = 1, chunk_size: Optional[int] = None,
+                         cache: Optional[ResultCache] = None,
+                         reporter: Optional[Reporter] = None,
+                         dedup: bool = True) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Compare every (file name, path-or-parsed-document) pair, sharding the files over
+    `workers` processes. Findings are merged (and, at --log-level detail, printed) in
+    input order, so the report is identical for any N. With a `cache`, policies whose document and usage index are
+    unchanged since an earlier run reuse their stored findings.
+    An item may carry its own UsageIndex as a third element (per-principal attribution);
+    otherwise it is compared against `usage`.
+    With `dedup`, documents granting the same action strings are compared once and
+    their findings reused for every copy (see policy_dedup).
+    """
+    reporter = reporter or Reporter()
+    reporter.reset()
+    if dedup:
+        # parse once here: the representatives go to the workers as documents
+        files = [(item[0], item[1] if isinstance(item[1], dict) else load_policy(item[1]), *item[2:])
+                 for item in files]
+        groups = DocumentGroups(_dedup_key(item) for item in files)
+    else:
+        groups = DocumentGroups(range(len(files)))
+    results: Dict[str, List[Tuple[str, str]]] = {}
+    compared = imap_chunks(_compare_chunk, groups.representatives(files), workers, chunk_size,
+                           initializer=_init_worker, initargs=(usage, cache))
+    for position, (_, findings, hit), first in groups.fan_out(compared):
+        file = files[position][0]
+        print_findings(file, findings, reporter)
+        reporter.tick(status for _, status in findings)
+        results[file] = findings
+        if cache is not None and first:
+            cache.record(hit)
+    if groups.duplicates:
+        reporter.info(f"♊ {groups.duplicates} duplicate policies reused the findings of an identical document "
+                      f"({len(groups)} unique)")
+    reporter.done("✔ Compared")
+    return results
+
+
 def write_report_to_csv(results: Dict[str, Iterable[Tuple[str, str]]], output_file: str) -> None:
     os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
     with open(output_file, "w", newline="", encoding="utf-8") as f:
@@ -115,6 +220,15 @@ def write_report_to_csv(results: Dict[str, Iterable[Tuple[str, str]]], output_fi
     print(f"\n📄 Report saved to: {output_file}")
 
 
+def write_report(results: Dict[str, Iterable[Tuple[str, str]]], output_file: str) -> None:
+    """CSV by default; a .parquet / .pq path writes a dictionary-encoded Parquet report."""
+    if format_for_path(output_file) == "csv":
+        write_report_to_csv(results, output_file)
+        return
+    write_report_parquet(results.items(), output_file)
+    print(f"\n📄 Report saved to: {output_file}")
+
+
 # ---------- Main ----------
 
 def main():
@@ -125,7 +239,35 @@ def main():
         "--counts",
         default="data/athena_event_counts.csv",
         help="Path to CSV containing CloudTrail event names "
-             "(e.g., data/athena_event_counts.csv, data/athena_events_custom.csv, or data/combined_events.csv)",
+             "(e.g., data/athena_event_counts.csv, data/athena_events_custom.csv, or data/combined_events.csv). "
+             "Gzip'd CSV and CloudTrail JSON-lines (.jsonl/.jsonl.gz) are also accepted.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Rows read per chunk while streaming the counts file (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--rollups",
+        default=None,
+        help="Read usage from per-day rollups built by usage_rollups.py instead of --counts",
+    )
+    parser.add_argument(
+        "--store",
+        default=None,
+        help="Read usage from a sharded event store built by event_store.py instead of --counts "
+             "(no scan: the header alone answers which actions were called)",
+    )
+    parser.add_argument(
+        "--since",
+        default=None,
+        help="With --rollups/--store: first day of the usage window, YYYY-MM-DD or a lookback like 90d",
+    )
+    parser.add_argument(
+        "--until",
+        default=None,
+        help="With --rollups/--store: last day of the usage window, YYYY-MM-DD (default: latest)",
     )
     parser.add_argument(
         "--policies",
@@ -137,46 +279,141 @@ def main():
         default=None,
         help="Directory containing inline policies (default: <policies>/inline)",
     )
+    parser.add_argument(
+        "--snapshot",
+        default=None,
+        help="Read managed + inline policies from an iam_snapshot.py snapshot instead of --policies/--inline",
+    )
+    parser.add_argument(
+        "--by-principal",
+        action="store_true",
+        help="Attribute events to principals via useridentity and check each policy only against "
+             "the principals holding it (inline owner; managed attachments need --snapshot)",
+    )
     parser.add_argument(
         "--output",
         default="data/policy_usage_report.csv",
-        help="Output CSV path (default: data/policy_usage_report.csv)",
+        help="Output report path (default: data/policy_usage_report.csv; "
+             "a .parquet path writes Parquet, which needs pyarrow)",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        help=f"Per-policy result cache location (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute every policy and do not read or write the result cache",
+    )
+    parser.add_argument(
+        "--cache-max-age-days",
+        type=float,
+        default=DEFAULT_MAX_AGE_DAYS,
+        help=f"Evict cache entries unused for this many days (default: {DEFAULT_MAX_AGE_DAYS:g})",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Compare every policy file separately, even copies granting the same actions",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to shard policies across (default: 1; 0 = one per CPU)",
+    )
+    add_metrics_arguments(parser)
+    add_reporting_arguments(parser)
     args = parser.parse_args()
 
     policies_dir = args.policies
     inline_dir = args.inline or os.path.join(policies_dir, "inline")
 
-    print("Loading CloudTrail event usage …")
-    used_events_lower = load_used_actions_from_csv(args.counts)
-    print(f"Loaded {len(used_events_lower)} unique event names from: {args.counts}")
+    if args.rollups and args.store:
+        parser.error("--rollups and --store are alternative usage sources; pass one")
+    if (args.since or args.until) and not (args.rollups or args.store):
+        parser.error("--since/--until need --rollups or --store (build them with usage_rollups.py / "
+                     "event_store.py ingest)")
+    if args.store and args.by_principal:
+        parser.error("--by-principal needs per-principal usage: use --rollups or --counts, not --store")
+
+    metrics = metrics_from_args("compare_policy_usage", args)
+    reporter = reporter_from_args(args)
+    reporter.info("Loading CloudTrail event usage …")
+    principal_usage = None
+    with metrics.stage("load usage", unit="events") as stage:
+        if args.rollups:
+            since, until = parse_window(args.since, args.until)
+            source = f"{args.rollups} [{describe_window(since, until)}]"
+            stage.bytes_read = file_bytes(window_files(args.rollups, since, until))
+            if args.by_principal:
+                principal_usage, stream_stats = principal_usage_from_rollups(args.rollups, since, until)
+                usage_index = principal_usage.overall
+            else:
+                usage_index, stream_stats = usage_index_from_rollups(args.rollups, since, until)
+        elif args.store:
+            since, until = parse_window(args.since, args.until)
+            source = f"{args.store} [{describe_window(since, until)}]"
+            with EventStore(args.store) as store:
+                stage.bytes_read = file_bytes(store.files(shards=bool(since or until)))
+                usage_index, stream_stats = store.usage_index(since, until)
+        elif args.by_principal:
+            source = args.counts
+            stage.bytes_read = file_bytes([args.counts])
+            principal_usage, stream_stats = load_principal_usage(args.counts, args.chunk_size)
+            usage_index = principal_usage.overall
+        else:
+            source = args.counts
+            stage.bytes_read = file_bytes([args.counts])
+            usage_index, stream_stats = load_usage_index(args.counts, args.chunk_size)
+        stage.items = stream_stats.rows
+    metrics.count("usage_rows", stream_stats.rows)
+    reporter.info(f"Loaded {usage_index.describe()} from: {source}")
+    reporter.info(f"Streamed {stream_stats.describe()}")
     # Show a tiny sample so you can sanity‑check quickly
     try:
-        preview = ", ".join(sorted(list(used_events_lower))[:8])
-        print(f"Sample events: {preview} …")
+        preview = ", ".join(usage_index.sample(8))
+        reporter.info(f"Sample events: {preview} …")
     except Exception:
         pass
 
-    results: Dict[str, List[Tuple[str, str]]] = {}
-
-    # Managed policies (top-level JSON files under iam_policies/)
-    if os.path.isdir(policies_dir):
-        for file in sorted(os.listdir(policies_dir)):
-            if file.endswith(".json"):
-                path = os.path.join(policies_dir, file)
-                policy_findings = compare_policy_to_usage(path, used_events_lower)
-                results[file] = policy_findings
-
-    # Inline policies (JSON files under iam_policies/inline/)
-    if os.path.isdir(inline_dir):
-        for file in sorted(os.listdir(inline_dir)):
-            if file.endswith(".json"):
-                path = os.path.join(inline_dir, file)
-                policy_findings = compare_policy_to_usage(path, used_events_lower)
-                results[file] = policy_findings
-
-    write_report_to_csv(results, args.output)
+    # Managed policies (top-level JSON files under iam_policies/), then inline ones
+    with metrics.stage("list policies", unit="policies") as stage:
+        if args.snapshot:
+            files = SnapshotReader(args.snapshot).policy_documents()
+            stage.bytes_read = file_bytes([args.snapshot])
+            reporter.info(f"Loaded {len(files)} policies from snapshot: {args.snapshot}")
+        else:
+            files = list_policy_files(policies_dir, inline_dir)
+        stage.items = len(files)
+    if principal_usage is not None:
+        reporter.info(f"Attributed usage: {principal_usage.describe()}")
+        if principal_usage.principals():
+            with metrics.stage("attribute", items=len(files), unit="policies"):
+                attribution = PolicyPrincipals.from_snapshot(args.snapshot) if args.snapshot else None
+                files, attributed = attribute_policies(files, principal_usage, attribution)
+            metrics.count("policies_attributed", attributed)
+            reporter.info(f"Per-principal comparison for {attributed}/{len(files)} policies "
+                          f"(the rest use account-wide usage)")
+        else:
+            reporter.warn("⚠️  No useridentity ARNs in the counts file – using account-wide usage")
+    cache = ResultCache(args.cache_dir, "compare", enabled=not args.no_cache)
+    with metrics.stage("compare", items=len(files), unit="policies") as stage:
+        results = compare_policy_files(files, usage_index, args.workers, cache=cache, reporter=reporter,
+                                       dedup=not args.no_dedup)
+        # policy files are read here (snapshot documents were counted above)
+        stage.bytes_read = file_bytes(item[1] for item in files)
+    cache.evict(args.cache_max_age_days)
+    metrics.record_cache("compare", cache)
+    reporter.info(f"\n♻️  Cache: {cache.describe()}")
+    reporter.flush()
 
+    with metrics.stage("write report", unit="rows") as stage:
+        write_report(results, args.output)
+        stage.items = sum(len(findings) for findings in results.values())
+        stage.bytes_written = file_bytes([args.output])
+    finish(metrics, args)
 
 if __name__ == "__main__":
     main()
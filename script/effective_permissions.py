@@ -0,0 +1,392 @@
+import os
+import sys
+import csv
+import argparse
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+from action_vocab import VOCABULARY, ActionSet
+from wildcard_matcher import WildcardMatcher, is_wildcard
+
+# ---------- Effective permissions across attached policies ----------
+#
+# IAM evaluates every policy a principal holds together: its inline policies, its
+# attached managed policies and those of its groups. An action is allowed when some
+# Allow statement grants it and no Deny statement matches it; explicit Deny always wins.
+# "NotAction" grants (or denies) everything except the listed actions.
+#
+# Evaluation runs over an indexed action space: the concrete actions known to the run
+# (literal actions in the policies, observed usage, anything passed in explicitly),
+# numbered by the shared VOCABULARY. Each policy compiles once into int bitsets
+# (allow, deny); each distinct pattern ('s3:Get*', '*') is expanded once against the
+# space. A principal is then the OR of its policies' allows minus the OR of their
+# denies – a handful of big-int operations, memoized per distinct set of held policies,
+# so thousands of principals sharing the same attachments cost one evaluation.
+#
+# Wildcards and NotAction complements are relative to the known space: an action never
+# seen anywhere in the run cannot be reported. Deny statements restricted by Condition,
+# Resource or NotResource may not apply to every request, so they do not remove actions;
+# they are kept apart (conditional_deny) so reports can flag them.
+
+Principal = str
+PolicyKey = Tuple[str, str]  # (kind, name): ("managed", "ReadOnly.json"), ("inline", "role_x_y.json")
+
+
+def _listed(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, str)]
+    return []
+
+
+def _statements(policy: Dict) -> List[Dict]:
+    statements = policy.get("Statement", [])
+    if not isinstance(statements, list):
+        statements = [statements]
+    return [statement for statement in statements if isinstance(statement, dict)]
+
+
+def granted_actions(policy: Dict) -> List[str]:
+    """
+    Action strings of the Allow statements, in document order (duplicates kept).
+    The grants that compare and refine analyze; Deny statements take nothing away
+    here, and NotAction grants are only resolved by PermissionEngine.
+    """
+    actions: List[str] = []
+    for statement in _statements(policy):
+        if statement.get("Effect") == "Allow":
+            # interned: the same action string across thousands of parsed policies is stored once
+            actions.extend(sys.intern(action) for action in _listed(statement.get("Action")))
+    return actions
+
+
+def policy_actions(policy: Dict) -> List[str]:
+    """Every concrete (non-wildcard) action named anywhere in the document, Action or NotAction."""
+    return [action for statement in _statements(policy)
+            for key in ("Action", "NotAction") for action in _listed(statement.get(key))
+            if not is_wildcard(action)]
+
+
+def _unconditional(statement: Dict) -> bool:
+    resources = _listed(statement.get("Resource"))
+    return ("Condition" not in statement and "NotResource" not in statement
+            and any(resource.strip() == "*" for resource in resources))
+
+
+@dataclass(frozen=True)
+class PolicyBits:
+    """One policy compiled over an ActionSpace."""
+    allow: int = 0
+    deny: int = 0
+    conditional_deny: int = 0
+
+
+class ActionSpace:
+    """
+    The concrete actions an evaluation can talk about, as a bitset over VOCABULARY ids,
+    plus a cache of pattern -> bitset. Growing the space drops the cache, since
+    wildcards and complements then cover more.
+    """
+
+    def __init__(self, actions: Iterable[str] = ()) -> None:
+        self.actions = ActionSet.from_ids(VOCABULARY, ())
+        self.bits = 0
+        self._patterns: Dict[str, int] = {}
+        self.extend(actions)
+
+    def extend(self, actions: Iterable[str]) -> bool:
+        """Add concrete actions (wildcards are ignored). True if the space grew."""
+        added = VOCABULARY.encode(a for a in actions if a and a.strip() and not is_wildcard(a)) - self.actions
+        if not added:
+            return False
+        self.actions = self.actions | added
+        self.bits = self.actions.bits()
+        self._patterns.clear()
+        return True
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def __contains__(self, action: str) -> bool:
+        return action in self.actions
+
+    def bit(self, action: str) -> int:
+        ident = VOCABULARY.get(action)
+        if ident is None or not self.actions.has_id(ident):
+            raise KeyError(f"{action!r} is not in the action space")
+        return 1 << ident
+
+    def _expand(self, patterns: Sequence[str]) -> None:
+        ids: Dict[str, List[int]] = {pattern: [] for pattern in patterns}
+        matcher = WildcardMatcher(patterns)
+        for ident in self.actions.ids:
+            for pattern in matcher.match(VOCABULARY.name(ident)):
+                ids[pattern].append(ident)
+        for pattern, found in ids.items():
+            self._patterns[pattern] = ActionSet.from_ids(VOCABULARY, found).bits()
+
+    def pattern_bits(self, patterns: Iterable[str]) -> int:
+        """Union of what the patterns (literal actions or wildcards) cover in the space."""
+        patterns = [pattern.strip() for pattern in patterns if pattern and pattern.strip()]
+        new = [p for p in dict.fromkeys(patterns) if is_wildcard(p) and p not in self._patterns]
+        if new:
+            self._expand(new)
+        bits = 0
+        for pattern in patterns:
+            if is_wildcard(pattern):
+                bits |= self._patterns[pattern]
+            else:
+                ident = VOCABULARY.get(pattern)
+                if ident is not None and self.actions.has_id(ident):
+                    bits |= 1 << ident
+        return bits
+
+    def compile(self, policy: Dict) -> PolicyBits:
+        allow = deny = conditional_deny = 0
+        for statement in _statements(policy):
+            effect = statement.get("Effect")
+            if effect not in ("Allow", "Deny"):
+                continue
+            if "NotAction" in statement:
+                bits = self.bits & ~self.pattern_bits(_listed(statement["NotAction"]))
+            else:
+                bits = self.pattern_bits(_listed(statement.get("Action")))
+            if effect == "Allow":
+                allow |= bits
+            elif _unconditional(statement):
+                deny |= bits
+            else:
+                conditional_deny |= bits
+        return PolicyBits(allow, deny, conditional_deny)
+
+
+@dataclass(frozen=True)
+class Effective:
+    """Effective permissions of one principal, as bitsets over the ActionSpace."""
+    allowed: int
+    denied: int             # granted somewhere but removed by an explicit Deny
+    conditional_deny: int   # allowed, but a Deny with Condition/Resource may apply
+
+    def actions(self, bits: Optional[int] = None) -> ActionSet:
+        return ActionSet.from_bits(VOCABULARY, self.allowed if bits is None else bits)
+
+
+class PermissionEngine:
+    """
+    Policies by key, principals by the policy keys they hold directly and the groups
+    they belong to. Compiled policies and per-principal results are memoized.
+    """
+
+    def __init__(self, space: Optional[ActionSpace] = None) -> None:
+        self.space = space or ActionSpace()
+        self.policies: Dict[PolicyKey, Dict] = {}
+        self.holdings: Dict[Principal, Set[PolicyKey]] = {}
+        self.groups: Dict[Principal, Set[Principal]] = {}
+        self._compiled: Dict[PolicyKey, PolicyBits] = {}
+        self._by_holding: Dict[FrozenSet[PolicyKey], Effective] = {}
+        # literal actions of added policies, joined to the space in one step before compiling
+        self._pending: List[str] = []
+
+    # ----- building -----
+    def add_policy(self, key: PolicyKey, document: Dict) -> None:
+        self.policies[key] = document
+        self._compiled.pop(key, None)
+        self._by_holding.clear()
+        self._pending.extend(policy_actions(document))
+
+    def attach(self, principal: Principal, key: PolicyKey) -> None:
+        self.holdings.setdefault(principal, set()).add(key)
+
+    def add_member(self, principal: Principal, group: str) -> None:
+        """`group` is a group name or 'group/<name>'."""
+        group = group if group.startswith("group/") else f"group/{group}"
+        self.groups.setdefault(principal, set()).add(group)
+        self.holdings.setdefault(group, set())
+
+    def extend_space(self, actions: Iterable[str]) -> None:
+        """Grow the action space; compiled policies are redone against the larger space."""
+        if self.space.extend(actions):
+            self._compiled.clear()
+            self._by_holding.clear()
+
+    def sync(self) -> None:
+        """Join the actions of newly added policies to the space (done before any evaluation)."""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.extend_space(pending)
+
+    @classmethod
+    def from_snapshot(cls, reader, space: Optional[ActionSpace] = None) -> "PermissionEngine":
+        """From an iam_snapshot.SnapshotReader: inline owners, attachments and group membership."""
+        engine = cls(space)
+        for rec in reader.iter_records(("managed", "inline", "principal")):
+            if rec["kind"] == "principal":
+                for name in rec.get("attached", []):
+                    engine.attach(rec["name"], ("managed", name))
+                for group in rec.get("groups", []):
+                    engine.add_member(rec["name"], group)
+                engine.holdings.setdefault(rec["name"], set())
+                continue
+            engine.add_policy((rec["kind"], rec["name"]), rec["document"])
+            if rec["kind"] == "inline":
+                engine.attach(rec["principal"], ("inline", rec["name"]))
+        return engine
+
+    # ----- evaluation -----
+    def compiled(self, key: PolicyKey) -> PolicyBits:
+        self.sync()
+        bits = self._compiled.get(key)
+        if bits is None:
+            document = self.policies.get(key)
+            bits = self._compiled[key] = self.space.compile(document) if document is not None else PolicyBits()
+        return bits
+
+    def held(self, principal: Principal) -> FrozenSet[PolicyKey]:
+        """Policies that apply to `principal`: its own plus those of its groups."""
+        keys = set(self.holdings.get(principal, ()))
+        for group in self.groups.get(principal, ()):
+            keys.update(self.holdings.get(group, ()))
+        return frozenset(keys)
+
+    def evaluate_policies(self, keys: Iterable[PolicyKey]) -> Effective:
+        self.sync()
+        keys = frozenset(keys)
+        result = self._by_holding.get(keys)
+        if result is None:
+            allow = deny = conditional = 0
+            for key in keys:
+                bits = self.compiled(key)
+                allow |= bits.allow
+                deny |= bits.deny
+                conditional |= bits.conditional_deny
+            result = self._by_holding[keys] = Effective(allowed=allow & ~deny, denied=allow & deny,
+                                                        conditional_deny=allow & ~deny & conditional)
+        return result
+
+    def effective(self, principal: Principal) -> Effective:
+        return self.evaluate_policies(self.held(principal))
+
+    def decide(self, principal: Principal, action: str) -> str:
+        """'Allowed', 'ExplicitDeny' or 'ImplicitDeny' (the IAM policy simulator's terms)."""
+        self.sync()
+        bit = self.space.bit(action)
+        if self.effective(principal).allowed & bit:
+            return "Allowed"
+        if any(self.compiled(key).deny & bit for key in self.held(principal)):
+            return "ExplicitDeny"
+        return "ImplicitDeny"
+
+    def principals(self) -> List[Principal]:
+        return sorted(self.holdings)
+
+
+# ---------- Loading ----------
+
+def engine_from_directory(policies_dir: str, inline_dir: Optional[str] = None,
+                          space: Optional[ActionSpace] = None) -> PermissionEngine:
+    """
+    From an iam_policies/ (+ inline/) tree. Inline files are attributed to their owner by
+    name ('role_<role>_<policy>.json' -> 'role/<role>'). Attachments are unknown without a
+    snapshot, so every other policy is held by a principal of its own ('managed/<file>',
+    'inline/<file>') and evaluated alone.
+    """
+    from iam_snapshot import records_from_directory
+    from principal_usage import inline_owner
+
+    engine = PermissionEngine(space)
+    for rec in records_from_directory(policies_dir, inline_dir):
+        key = (rec["kind"], rec["name"])
+        engine.add_policy(key, rec["document"])
+        owner = inline_owner(rec["name"], frozenset()) if rec["kind"] == "inline" else None
+        engine.attach(owner or f"{rec['kind']}/{rec['name']}", key)
+    return engine
+
+
+# ---------- CLI ----------
+
+def _names(result: Effective, bits: int) -> List[str]:
+    return sorted(result.actions(bits))
+
+
+def write_report(engine: PermissionEngine, path: str) -> int:
+    """One row per principal: policy count and allowed / denied / conditionally denied actions."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Principal", "Policies", "Allowed", "ExplicitlyDenied", "ConditionallyDenied",
+                         "AllowedActions"])
+        for principal in engine.principals():
+            result = engine.effective(principal)
+            allowed = _names(result, result.allowed)
+            writer.writerow([principal, len(engine.held(principal)), len(allowed),
+                             bin(result.denied).count("1"), bin(result.conditional_deny).count("1"),
+                             " ".join(allowed)])
+    return len(engine.holdings)
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Effective permissions per principal across all held policies (Deny wins, NotAction complements).")
+    ap.add_argument("--snapshot", default=None, help="iam_snapshot.py snapshot (attachments and group membership)")
+    ap.add_argument("--policies", default="iam_policies", help="Directory of managed policies (default: iam_policies)")
+    ap.add_argument("--inline", default=None, help="Directory of inline policies (default: <policies>/inline)")
+    ap.add_argument("--combine", nargs="+", default=None, metavar="POLICY_JSON",
+                    help="Evaluate these policy files together as one principal")
+    ap.add_argument("--counts", default=None,
+                    help="CloudTrail export whose observed actions join the action space (wildcards / NotAction "
+                         "are resolved against it)")
+    ap.add_argument("--principal", action="append", default=[], help="Show one principal's actions (repeatable)")
+    ap.add_argument("--check", action="append", default=[], metavar="ACTION",
+                    help="Decision for this action per principal (repeatable)")
+    ap.add_argument("--output", default=None, help="Write a per-principal CSV report")
+    args = ap.parse_args()
+
+    space = ActionSpace(args.check)
+    if args.counts:
+        from usage_index import load_usage_index
+        index, stats = load_usage_index(args.counts)
+        space.extend(index.qualified.values())
+        print(f"📥 Observed actions from {args.counts}: {stats.describe()}")
+
+    if args.combine:
+        from least_privilege_tool import load_policy
+        engine = PermissionEngine(space)
+        for path in args.combine:
+            engine.add_policy(("file", path), load_policy(path))
+            engine.attach("(combined)", ("file", path))
+    elif args.snapshot:
+        from iam_snapshot import SnapshotReader
+        engine = PermissionEngine.from_snapshot(SnapshotReader(args.snapshot), space)
+    else:
+        engine = engine_from_directory(args.policies, args.inline, space)
+
+    engine.sync()
+    principals = args.principal or engine.principals()
+    missing = [p for p in principals if p not in engine.holdings]
+    if missing:
+        ap.error(f"unknown principal(s): {', '.join(missing)}")
+    print(f"🔎 {len(engine.policies)} policies, {len(engine.holdings)} principals, "
+          f"{len(engine.space)} actions in the action space")
+
+    for principal in principals:
+        result = engine.effective(principal)
+        allowed = _names(result, result.allowed)
+        print(f"\n👤 {principal}: {len(allowed)} allowed from {len(engine.held(principal))} policies")
+        if args.principal:
+            conditional = set(_names(result, result.conditional_deny))
+            for action in allowed:
+                print(f"  ✅ {action}" + ("  ⚠️ conditional Deny" if action in conditional else ""))
+            for action in _names(result, result.denied):
+                print(f"  ⛔ {action} (explicit Deny)")
+        for action in args.check:
+            decision = engine.decide(principal, action)
+            print(f"  {'✅' if decision == 'Allowed' else '❌'} {action}: {decision}")
+
+    if args.output:
+        rows = write_report(engine, args.output)
+        print(f"\n💾 Wrote {rows} principals to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import mmap
+import hashlib
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from event_stream import DEFAULT_CHUNK_SIZE, StreamStats, iter_event_chunks
+from usage_index import UsageIndex, action_keys
+from usage_rollups import atomic_write, event_day, parse_window, source_id, split_event
+
+# ---------- Sharded, memory-mapped event store ----------
+#
+# CloudTrail exports are ingested once into per-service shard files plus one small
+# header that indexes them:
+#
+#   <store>/header.json        services -> shard file, and per action its display name,
+#                              byte offset and number of days; ingested sources
+#   <store>/shards/<svc>.<generation>.shard
+#   <store>/sources/<id>.json  what each ingested source added (replaced on re-ingest)
+#
+# Inside a shard every action owns one block: the days it was called (uint32 date
+# ordinals, ascending) followed by the call count of each day (uint64), 8-byte
+# aligned. "Has s3:GetObject been called?" is a dict lookup in the header; "... since
+# 2024-05-01?" adds a bisect over that action's days in the memory-mapped shard. A
+# UsageIndex for the whole store is built from the header alone, so pipeline runs
+# sharing a store start without reading any events.
+#
+# Ingest merges the new counts into the shards of the services it touches and writes
+# them under a new generation; the header is replaced last (atomically), so readers
+# always see a consistent store and old shards stay valid for maps already open.
+#
+# Shards are partitioned by service only, not by (service, day): the day axis lives
+# inside each action's block, so a window query is one bisect in one shard instead of
+# opening a file per day. The price is paid on ingest: a source – even a one-day
+# re-ingest – rewrites the full shard (every day) of each service it touches, i.e.
+# O(actions x days) of those services rather than O(rows of the source).
+# Name-only events (athena_event_counts.csv) live in the '' service ("_" shard).
+
+DEFAULT_STORE_DIR = "data/event_store"
+STORE_VERSION = 1
+HEADER_NAME = "header.json"
+
+# per-action day counts during ingest: {action_lower: (display, Counter{ordinal: count})}
+ServiceCounts = Dict[str, Tuple[str, Counter]]
+
+
+def header_path(root: str) -> str:
+    return os.path.join(root, HEADER_NAME)
+
+
+def _empty_header() -> Dict:
+    return {"version": STORE_VERSION, "byteorder": sys.byteorder, "generation": 0,
+            "services": {}, "sources": {}}
+
+
+def load_header(root: str) -> Dict:
+    try:
+        with open(header_path(root), "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        return _empty_header()
+    if header.get("version") != STORE_VERSION:
+        raise ValueError(f"{root}: event store version {header.get('version')} (expected {STORE_VERSION})")
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"{root}: written on a {header.get('byteorder')}-endian host")
+    return header
+
+
+def _ordinal(day: str) -> int:
+    return date.fromisoformat(day).toordinal()
+
+
+def _day(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
+
+
+# ---------- Shard files ----------
+
+def _block_size(n_days: int) -> int:
+    days = n_days * 4
+    return days + (-days % 8) + n_days * 8
+
+
+def encode_shard(counts: ServiceCounts) -> Tuple[bytes, Dict[str, List]]:
+    """Shard bytes and the header entries {action_lower: [display, offset, n_days]}."""
+    out = bytearray()
+    actions: Dict[str, List] = {}
+    for key in sorted(counts):
+        display, per_day = counts[key]
+        ordinals = sorted(per_day)
+        actions[key] = [display, len(out), len(ordinals)]
+        out += array("I", ordinals).tobytes()
+        out += bytes(-len(out) % 8)
+        out += array("Q", (per_day[o] for o in ordinals)).tobytes()
+    return bytes(out), actions
+
+
+class Shard:
+    """One memory-mapped shard; blocks are read as zero-copy memoryviews."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap cannot map an empty file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def block(self, offset: int, n_days: int) -> Tuple[memoryview, memoryview]:
+        """(days, counts) of one action: uint32 ordinals and uint64 counts."""
+        days_end = offset + n_days * 4
+        counts_start = days_end + (-days_end % 8)
+        return (self._view[offset:days_end].cast("I"),
+                self._view[counts_start:counts_start + n_days * 8].cast("Q"))
+
+    def close(self) -> None:
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+
+
+# ---------- Reading ----------
+
+class EventStore:
+    """Read side: the header in memory, shards mapped on first use."""
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR) -> None:
+        self.root = root
+        self.header = load_header(root)
+        self.services: Dict[str, Dict] = self.header["services"]
+        self._shards: Dict[str, Shard] = {}
+
+    def __enter__(self) -> "EventStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()
+
+    def files(self, shards: bool = True) -> List[str]:
+        """The header, plus every shard file if `shards`."""
+        paths = [header_path(self.root)]
+        if shards:
+            paths += [os.path.join(self.root, "shards", info["file"]) for info in self.services.values()]
+        return paths
+
+    def _shard(self, service: str) -> Shard:
+        shard = self._shards.get(service)
+        if shard is None:
+            path = os.path.join(self.root, "shards", self.services[service]["file"])
+            shard = self._shards[service] = Shard(path)
+        return shard
+
+    def _blocks(self, action: str) -> Iterator[Tuple[memoryview, memoryview]]:
+        """
+        (days, counts) blocks recording `action`: its 'service:Action' entry and the
+        name-only entry, which UsageIndex also counts as a use of the action.
+        """
+        qualified, bare = action_keys(action)
+        service, _, name = qualified.partition(":")
+        for svc, key in ((service, name), ("", bare)):
+            entry = self.services.get(svc, {}).get("actions", {}).get(key)
+            if entry is not None:
+                _, offset, n_days = entry
+                yield self._shard(svc).block(offset, n_days)
+
+    @staticmethod
+    def _window(days: memoryview, since: Optional[str], until: Optional[str]) -> Tuple[int, int]:
+        lo = bisect_left(days, _ordinal(since)) if since else 0
+        hi = bisect_right(days, _ordinal(until)) if until else len(days)
+        return lo, hi
+
+    def has_action(self, action: str, since: Optional[str] = None, until: Optional[str] = None) -> bool:
+        """Header lookup; with a window, one bisect over the action's days in its shard."""
+        for days, _ in self._blocks(action):
+            lo, hi = self._window(days, since, until)
+            if lo < hi:
+                return True
+        return False
+
+    def calls(self, action: str, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """Number of calls of `action` on days inside [since, until] (0 if never called)."""
+        total = 0
+        for days, counts in self._blocks(action):
+            lo, hi = self._window(days, since, until)
+            total += sum(counts[lo:hi])
+        return total
+
+    def last_day(self, action: str) -> Optional[str]:
+        last = max((days[-1] for days, _ in self._blocks(action)), default=None)
+        return _day(last) if last is not None else None
+
+    def iter_actions(self) -> Iterator[Tuple[str, str]]:
+        """(service, display action) for every stored action."""
+        for service, info in self.services.items():
+            for display, _, _ in info["actions"].values():
+                yield service, display
+
+    def usage_index(self, since: Optional[str] = None,
+                    until: Optional[str] = None) -> Tuple[UsageIndex, StreamStats]:
+        """
+        UsageIndex of the actions called inside [since, until]. Without a window this reads
+        only the header; with one, each action's day list is bisected in its shard.
+        """
+        stats = StreamStats(path=self.root)
+        index = UsageIndex()
+        for service, info in self.services.items():
+            stats.chunks += 1
+            for key, (display, offset, n_days) in info["actions"].items():
+                stats.rows += 1
+                if since or until:
+                    lo, hi = self._window(self._shard(service).block(offset, n_days)[0], since, until)
+                    if lo == hi:
+                        continue
+                index.add_event(service, f"{service}:{display}" if service else display)
+        return index, stats
+
+    def describe(self) -> str:
+        n_actions = sum(len(info["actions"]) for info in self.services.values())
+        days = [info["days"] for info in self.services.values() if info["days"]]
+        span = f", {min(d[0] for d in days)} .. {max(d[1] for d in days)}" if days else ""
+        return (f"{n_actions} actions in {len(self.services)} service shards{span} "
+                f"({len(self.header['sources'])} sources, generation {self.header['generation']})")
+
+
+# ---------- Ingest ----------
+
+def aggregate_calls(path: str, default_day: Optional[str] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Dict[str, ServiceCounts], int, StreamStats]:
+    """Stream an export once into {service: {action_lower: (display, {day ordinal: calls})}}."""
+    stats = StreamStats(path=path)
+    services: Dict[str, ServiceCounts] = {}
+    skipped = 0
+    default = _ordinal(default_day) if default_day else None
+    columns = ("eventtime", "eventsource", "eventname", "eventcount")
+    for chunk in iter_event_chunks(path, columns, chunk_size, stats):
+        for (eventtime, eventsource, eventname, count), n in Counter(chunk).items():
+            if not eventname.strip():
+                continue
+            day = event_day(eventtime)
+            ordinal = _ordinal(day) if day else default
+            if ordinal is None:
+                skipped += n
+                continue
+            service, action = split_event(eventsource, eventname)
+            action = action.strip()
+            per_service = services.setdefault(service, {})
+            entry = per_service.get(action.lower())
+            if entry is None:
+                entry = per_service[action.lower()] = (action, Counter())
+            entry[1][ordinal] += n * (int(count) if count.strip().isdigit() else 1)
+    return services, skipped, stats
+
+
+def _read_service(store: EventStore, service: str) -> ServiceCounts:
+    info = store.services.get(service)
+    if info is None:
+        return {}
+    shard = store._shard(service)
+    counts: ServiceCounts = {}
+    for key, (display, offset, n_days) in info["actions"].items():
+        days, calls = shard.block(offset, n_days)
+        counts[key] = (display, Counter(dict(zip(days.tolist(), calls.tolist()))))
+    return counts
+
+
+def _contribution_name(source_key: str) -> str:
+    return hashlib.sha256(source_key.encode("utf-8")).hexdigest()[:20] + ".json"
+
+
+def read_contribution(root: str, name: Optional[str]) -> Dict[str, ServiceCounts]:
+    """What a source added at its last ingest, in aggregate_calls' shape (empty if unknown)."""
+    if not name:
+        return {}
+    try:
+        with open(os.path.join(root, "sources", name), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {service: {key: (display, Counter({int(o): n for o, n in per_day.items()}))
+                      for key, (display, per_day) in actions.items()}
+            for service, actions in raw.items()}
+
+
+def write_contribution(root: str, name: str, services: Dict[str, ServiceCounts]) -> None:
+    raw = {service: {key: [display, per_day] for key, (display, per_day) in counts.items()}
+           for service, counts in services.items()}
+    atomic_write(os.path.join(root, "sources", name), json.dumps(raw, sort_keys=True).encode("utf-8"))
+
+
+def ingest(path: str, root: str = DEFAULT_STORE_DIR, default_day: Optional[str] = None,
+           force: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Dict]:
+    """
+    Merge one export into the store, rewriting only the shards of the services it
+    touches. A source ingested before (--force, or the file changed) replaces what it
+    added then, recorded under <store>/sources/, so its events are never counted twice.
+    Returns a summary, or None if the source (same path, size, mtime) was already ingested.
+    """
+    key = os.path.abspath(path)
+    source = source_id(path)
+    with EventStore(root) as store:
+        header = store.header
+        known = header["sources"].get(key)
+        if not force and known is not None and known.get("source") == source:
+            return None
+
+        incoming, skipped, stats = aggregate_calls(path, default_day, chunk_size)
+        summary = {"source": source, "services": sorted(incoming), "rows": stats.rows, "skipped_undated": skipped,
+                   "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        if not incoming and known is None:
+            return summary  # nothing landed (e.g. undated rows without --day): allow a retry
+
+        previous = read_contribution(root, (known or {}).get("contribution"))
+        generation = header["generation"] + 1
+        replaced: List[str] = []
+        for service in sorted(set(incoming) | set(previous)):
+            merged = _read_service(store, service)
+            for action, (_, per_day) in previous.get(service, {}).items():
+                if action in merged:
+                    merged[action][1].subtract(per_day)
+            for action, (display, per_day) in incoming.get(service, {}).items():
+                if action in merged:
+                    merged[action][1].update(per_day)
+                else:
+                    merged[action] = (display, Counter(per_day))
+            # drop days (and actions) whose count went back to zero
+            merged = {action: (display, +per_day) for action, (display, per_day) in merged.items() if +per_day}
+            if service in header["services"]:
+                replaced.append(header["services"][service]["file"])
+            if not merged:
+                header["services"].pop(service, None)
+                continue
+            data, actions = encode_shard(merged)
+            name = f"{service or '_'}.{generation}.shard"
+            atomic_write(os.path.join(root, "shards", name), data)
+            ordinals = [o for _, per_day in merged.values() for o in per_day]
+            header["services"][service] = {"file": name, "actions": actions,
+                                            "days": [_day(min(ordinals)), _day(max(ordinals))]}
+
+    summary["contribution"] = _contribution_name(key)
+    write_contribution(root, summary["contribution"], incoming)
+    header["generation"] = generation
+    header["sources"][key] = summary
+    atomic_write(header_path(root), json.dumps(header, sort_keys=True).encode("utf-8"))
+    for name in replaced:
+        try:
+            os.unlink(os.path.join(root, "shards", name))
+        except OSError:
+            pass  # still mapped elsewhere on platforms that forbid it; harmless
+    return summary
+
+
+# ---------- CLI ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Sharded, memory-mapped store of per-day action call counts.")
+    ap.add_argument("--store", default=DEFAULT_STORE_DIR, help=f"Store location (default: {DEFAULT_STORE_DIR})")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="Merge CloudTrail exports into the store")
+    ing.add_argument("events", nargs="+", help="CloudTrail CSV / JSON-lines exports (optionally .gz)")
+    ing.add_argument("--day", default=None, help="Day (YYYY-MM-DD) for rows without eventtime, e.g. count exports")
+    ing.add_argument("--force", action="store_true", help="Re-ingest sources already in the header")
+    ing.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                     help=f"Rows read per chunk (default: {DEFAULT_CHUNK_SIZE})")
+
+    query = sub.add_parser("query", help="Has an action been called (in a window)?")
+    query.add_argument("actions", nargs="+", help="Actions such as s3:GetObject")
+    query.add_argument("--since", default=None, help="First day, YYYY-MM-DD or a lookback like 90d")
+    query.add_argument("--until", default=None, help="Last day, YYYY-MM-DD (default: latest)")
+
+    sub.add_parser("info", help="Describe the store")
+    args = ap.parse_args()
+
+    if args.command == "ingest":
+        for path in args.events:
+            summary = ingest(path, args.store, args.day, args.force, args.chunk_size)
+            if summary is None:
+                print(f"⏭️  Already ingested: {path}")
+                continue
+            print(f"✅ Ingested {path}: {summary['rows']:,} rows into {len(summary['services'])} service shard(s)")
+            if summary["skipped_undated"]:
+                print(f"⚠️  Skipped {summary['skipped_undated']:,} rows without eventtime (use --day)")
+        return
+
+    with EventStore(args.store) as store:
+        if args.command == "info":
+            print(store.describe())
+            return
+        since, until = parse_window(args.since, args.until)
+        for action in args.actions:
+            calls = store.calls(action, since, until)
+            last_day = store.last_day(action)
+            last = f", last on {last_day}" if last_day else ""
+            print(f"{'✅' if calls else '❌'} {action}: {calls:,} calls{last}")
+
+
+if __name__ == "__main__":
+    main()
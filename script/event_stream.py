@@ -0,0 +1,225 @@
+import os
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from dataclasses import dataclass
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, TextIO, Tuple
+
+# ---------- Streaming CloudTrail event reader ----------
+#
+# Reads Athena CSV exports (plain or .gz) and CloudTrail JSON-lines (plain or .gz)
+# in fixed-size chunks, projecting only the requested columns. Memory stays bounded
+# by the chunk size plus whatever the caller aggregates (e.g. a set of event names).
+# A .json file that is not one record per line (a pretty-printed {"Records": [...]}
+# export) is parsed as one document instead, so its size bounds memory.
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+JSON_SUFFIXES = (".json", ".jsonl", ".ndjson")
+
+# CloudTrail JSON uses camelCase keys, Athena exports use lowercase ones
+_JSON_KEYS = {
+    "eventsource": ("eventSource", "eventsource"),
+    "eventname": ("eventName", "eventname"),
+    "eventtime": ("eventTime", "eventtime"),
+    "useridentity": ("userIdentity", "useridentity"),
+    "resources": ("resources",),
+}
+
+
+def _raise_csv_field_limit() -> None:
+    # useridentity / tlsdetails blobs easily exceed the default 128 KiB field limit
+    limit = sys.maxsize
+    while True:
+        try:
+            csv.field_size_limit(limit)
+            return
+        except OverflowError:
+            limit //= 10
+
+
+_raise_csv_field_limit()
+
+
+@dataclass
+class StreamStats:
+    """Row count and timing for one pass over an event source."""
+    path: str
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+    def describe(self) -> str:
+        return (f"{self.rows:,} rows in {self.seconds:.2f}s "
+                f"({self.rows_per_sec:,.0f} rows/sec, {self.chunks} chunks)")
+
+
+def open_text(path: str) -> TextIO:
+    """Open a plain or gzip-compressed text file for reading."""
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", newline="")
+    return open(path, "r", newline="", encoding="utf-8")
+
+
+def is_json_lines(path: str) -> bool:
+    base = path[:-3] if path.endswith(".gz") else path
+    return base.lower().endswith(JSON_SUFFIXES)
+
+
+def resolve_event_column(headers: Sequence[str]) -> int:
+    """
+    Pick the event-name column (robust header detection).
+    Works with headers like: eventname, eventName, event_name.
+    If a 'dataset,eventname' CSV is passed, it will pick 'eventname'.
+    Falls back to the first column.
+    """
+    lowered = [h.strip().lower() for h in headers]
+    for candidate in ("eventname", "event_name"):
+        if candidate in lowered:
+            return lowered.index(candidate)
+    if lowered[0] == "dataset" and len(lowered) > 1:
+        return 1
+    return 0
+
+
+def resolve_columns(headers: Sequence[str], columns: Sequence[str]) -> List[Optional[int]]:
+    """
+    Map wanted (lowercase) column names onto header positions.
+    Missing columns resolve to None; 'eventname' always resolves (see resolve_event_column).
+    """
+    lowered = [h.strip().lower().replace("_", "") for h in headers]
+    positions: List[Optional[int]] = []
+    for col in columns:
+        if col == "eventname":
+            positions.append(resolve_event_column(headers))
+        elif col in lowered:
+            positions.append(lowered.index(col))
+        else:
+            positions.append(None)
+    return positions
+
+
+def _projector(positions: List[Optional[int]]) -> Callable[[List[str]], Tuple[str, ...]]:
+    present = [p for p in positions if p is not None]
+    if len(present) == len(positions):
+        if len(positions) == 1:
+            pos = positions[0]
+            return lambda row: (row[pos],) if len(row) > pos else ("",)
+        getter = itemgetter(*positions)
+        width = max(positions) + 1
+
+        def project(row: List[str]) -> Tuple[str, ...]:
+            if len(row) >= width:
+                return getter(row)
+            return tuple(row[p] if p < len(row) else "" for p in positions)
+        return project
+
+    def project_sparse(row: List[str]) -> Tuple[str, ...]:
+        return tuple(row[p] if p is not None and p < len(row) else "" for p in positions)
+    return project_sparse
+
+
+def _iter_csv_rows(f: TextIO, path: str, columns: Sequence[str]) -> Iterator[Tuple[str, ...]]:
+    reader = csv.reader(f)
+    headers = next(reader, None)
+    if not headers:
+        raise ValueError(f"No header row found in CSV: {path}")
+    project = _projector(resolve_columns(headers, columns))
+    for row in reader:
+        if row:
+            yield project(row)
+
+
+def _json_value(rec: Dict, col: str) -> str:
+    for key in _JSON_KEYS.get(col, (col,)):
+        val = rec.get(key)
+        if val is not None:
+            return val if isinstance(val, str) else json.dumps(val, separators=(",", ":"))
+    return ""
+
+
+def _records(doc) -> Sequence[Dict]:
+    # A raw CloudTrail log file is {"Records": [...]}; a bare list of records is accepted too
+    if isinstance(doc, list):
+        return [r for r in doc if isinstance(r, dict)]
+    if isinstance(doc, dict):
+        records = doc.get("Records")
+        return records if isinstance(records, list) else (doc,)
+    return ()
+
+
+def _iter_json_rows(f: TextIO, columns: Sequence[str]) -> Iterator[Tuple[str, ...]]:
+    first = True
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            if not first:
+                raise
+            # not one record per line: a pretty-printed document such as a CloudTrail
+            # {"Records": [...]} export, which can only be parsed whole
+            doc = json.loads(line + f.read())
+            for r in _records(doc):
+                yield tuple(_json_value(r, c) for c in columns)
+            return
+        first = False
+        for r in _records(doc):
+            yield tuple(_json_value(r, c) for c in columns)
+
+
+def iter_event_chunks(path: str,
+                      columns: Sequence[str] = ("eventsource", "eventname"),
+                      chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      stats: Optional[StreamStats] = None) -> Iterator[List[Tuple[str, ...]]]:
+    """
+    Yield lists of at most `chunk_size` tuples, one value per requested column.
+    Accepts .csv / .jsonl (CloudTrail JSON-lines) / .json (JSON-lines or one
+    {"Records": [...]} document), optionally gzip-compressed.
+    If `stats` is given it is updated as chunks are consumed.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Counts file not found: {path}")
+
+    columns = [c.lower() for c in columns]
+    start = time.perf_counter()
+    with open_text(path) as f:
+        rows = _iter_json_rows(f, columns) if is_json_lines(path) else _iter_csv_rows(f, path, columns)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if stats is not None:
+                stats.rows += len(chunk)
+                stats.chunks += 1
+                stats.seconds = time.perf_counter() - start
+            yield chunk
+    if stats is not None:
+        stats.seconds = time.perf_counter() - start
+
+
+def load_used_events_streaming(path: str,
+                               chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Set[str], StreamStats]:
+    """
+    Stream an event source once and return (LOWERCASED event names, stats).
+    Only the event-name column is projected; nothing else is kept per row.
+    """
+    stats = StreamStats(path=path)
+    used: Set[str] = set()
+    for chunk in iter_event_chunks(path, ("eventname",), chunk_size, stats):
+        for (name,) in chunk:
+            name = name.strip()
+            if name:
+                used.add(name.lower())
+    return used, stats
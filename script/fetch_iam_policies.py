@@ -1,39 +1,58 @@
-import boto3
+import argparse
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 
-# Step 1: Setup IAM client
-iam = boto3.client('iam')
+from iam_backend import DEFAULT_WORKERS, add_backend_arguments, call_with_retry, client_from_args, make_client, paginate
 
-# Step 2: Create output folder
+# Step 1: Default output folder
 output_dir = 'iam_policies'
-os.makedirs(output_dir, exist_ok=True)
 
-# Step 3: Fetch and save customer-managed IAM policies
-def fetch_and_save_policies():
-    print("🔍 Fetching policies...")
-    response = iam.list_policies(Scope='Local', MaxItems=1000)
+# Step 2: Fetch one policy document (runs on a worker thread)
+def fetch_policy_document(iam, policy: Dict) -> Tuple[str, Dict]:
+    version = call_with_retry(
+        iam.get_policy_version,
+        PolicyArn=policy['Arn'],
+        VersionId=policy['DefaultVersionId']
+    )
+    return policy['PolicyName'], version['PolicyVersion']['Document']
 
-    for policy in response['Policies']:
-        policy_name = policy['PolicyName']
-        policy_arn = policy['Arn']
-        default_version_id = policy['DefaultVersionId']
+def save_policy(policy_name: str, document: Dict, out_dir: str) -> None:
+    file_path = os.path.join(out_dir, f"{policy_name}.json")
+    with open(file_path, 'w') as f:
+        json.dump(document, f, indent=2)
 
-        # Fetch actual policy document
-        version = iam.get_policy_version(
-            PolicyArn=policy_arn,
-            VersionId=default_version_id
-        )
-
-        document = version['PolicyVersion']['Document']
+# Step 3: Fetch and save customer-managed IAM policies
+def fetch_and_save_policies(iam=None, out_dir: Optional[str] = None, workers: int = DEFAULT_WORKERS) -> int:
+    """
+    Page through every customer-managed policy (no MaxItems truncation) and fetch the
+    default versions concurrently on `workers` threads. Returns the number saved.
+    """
+    iam = iam or make_client()
+    out_dir = out_dir or output_dir
+    os.makedirs(out_dir, exist_ok=True)
 
-        # Save policy to JSON file
-        file_path = os.path.join(output_dir, f"{policy_name}.json")
-        with open(file_path, 'w') as f:
-            json.dump(document, f, indent=2)
+    print("🔍 Fetching policies...")
+    policies = list(paginate(iam.list_policies, 'Policies', Scope='Local'))
 
-        print(f"✅ Saved policy: {policy_name}")
+    saved = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for policy_name, document in pool.map(lambda p: fetch_policy_document(iam, p), policies):
+            save_policy(policy_name, document, out_dir)
+            print(f"✅ Saved policy: {policy_name}")
+            saved += 1
+    return saved
 
 # Step 4: Run the function
+def main():
+    ap = argparse.ArgumentParser(description="Fetch customer-managed IAM policies into JSON files.")
+    ap.add_argument("--output", default=output_dir, help=f"Output folder (default: {output_dir})")
+    add_backend_arguments(ap)
+    args = ap.parse_args()
+
+    count = fetch_and_save_policies(client_from_args(args), args.output, args.workers)
+    print(f"🎉 {count} managed policies retrieved.")
+
 if __name__ == "__main__":
-    fetch_and_save_policies()
+    main()
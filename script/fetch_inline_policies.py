@@ -1,48 +1,74 @@
-import boto3
+import argparse
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from iam_backend import DEFAULT_WORKERS, add_backend_arguments, call_with_retry, client_from_args, make_client, paginate
 
-iam = boto3.client('iam')
 output_dir = 'iam_policies/inline'
-os.makedirs(output_dir, exist_ok=True)
 
-def save_inline_policy(entity_type, entity_name, policy_name, document):
+# entity type -> (list call, list key, name key, list-policies call, get-policy call)
+ENTITY_APIS = {
+    'user': ('list_users', 'Users', 'UserName', 'list_user_policies', 'get_user_policy'),
+    'role': ('list_roles', 'Roles', 'RoleName', 'list_role_policies', 'get_role_policy'),
+    'group': ('list_groups', 'Groups', 'GroupName', 'list_group_policies', 'get_group_policy'),
+}
+
+def save_inline_policy(entity_type, entity_name, policy_name, document, out_dir=None):
     filename = f"{entity_type}_{entity_name}_{policy_name}.json"
-    path = os.path.join(output_dir, filename)
+    path = os.path.join(out_dir or output_dir, filename)
     with open(path, 'w') as f:
         json.dump(document, f, indent=2)
     print(f"✅ Saved {entity_type} policy: {filename}")
 
-def fetch_inline_user_policies():
-    users = iam.list_users()['Users']
-    for user in users:
-        user_name = user['UserName']
-        policies = iam.list_user_policies(UserName=user_name)['PolicyNames']
-        for policy_name in policies:
-            policy = iam.get_user_policy(UserName=user_name, PolicyName=policy_name)
-            save_inline_policy('user', user_name, policy_name, policy['PolicyDocument'])
-
-def fetch_inline_role_policies():
-    roles = iam.list_roles()['Roles']
-    for role in roles:
-        role_name = role['RoleName']
-        policies = iam.list_role_policies(RoleName=role_name)['PolicyNames']
-        for policy_name in policies:
-            policy = iam.get_role_policy(RoleName=role_name, PolicyName=policy_name)
-            save_inline_policy('role', role_name, policy_name, policy['PolicyDocument'])
-
-def fetch_inline_group_policies():
-    groups = iam.list_groups()['Groups']
-    for group in groups:
-        group_name = group['GroupName']
-        policies = iam.list_group_policies(GroupName=group_name)['PolicyNames']
-        for policy_name in policies:
-            policy = iam.get_group_policy(GroupName=group_name, PolicyName=policy_name)
-            save_inline_policy('group', group_name, policy_name, policy['PolicyDocument'])
+def fetch_entity_policies(iam, entity_type: str, entity_name: str) -> List[Tuple[str, Dict]]:
+    """All inline (policy name, document) pairs of one user/role/group (runs on a worker thread)."""
+    _, _, name_key, list_call, get_call = ENTITY_APIS[entity_type]
+    names = list(paginate(getattr(iam, list_call), 'PolicyNames', **{name_key: entity_name}))
+    return [
+        (policy_name, call_with_retry(getattr(iam, get_call), **{name_key: entity_name, 'PolicyName': policy_name})['PolicyDocument'])
+        for policy_name in names
+    ]
+
+def fetch_inline_policies(iam, entity_type: str, pool: ThreadPoolExecutor, out_dir: Optional[str] = None) -> int:
+    """Paginate every entity of one type and fetch their inline policies concurrently."""
+    list_call, list_key, name_key, _, _ = ENTITY_APIS[entity_type]
+    entities = [e[name_key] for e in paginate(getattr(iam, list_call), list_key)]
+    saved = 0
+    for entity_name, policies in zip(entities, pool.map(lambda n: fetch_entity_policies(iam, entity_type, n), entities)):
+        for policy_name, document in policies:
+            save_inline_policy(entity_type, entity_name, policy_name, document, out_dir)
+            saved += 1
+    return saved
+
+def fetch_inline_user_policies(iam, pool, out_dir=None):
+    return fetch_inline_policies(iam, 'user', pool, out_dir)
+
+def fetch_inline_role_policies(iam, pool, out_dir=None):
+    return fetch_inline_policies(iam, 'role', pool, out_dir)
+
+def fetch_inline_group_policies(iam, pool, out_dir=None):
+    return fetch_inline_policies(iam, 'group', pool, out_dir)
+
+def fetch_all_inline_policies(iam=None, out_dir: Optional[str] = None, workers: int = DEFAULT_WORKERS) -> int:
+    iam = iam or make_client()
+    out_dir = out_dir or output_dir
+    os.makedirs(out_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return (fetch_inline_user_policies(iam, pool, out_dir)
+                + fetch_inline_role_policies(iam, pool, out_dir)
+                + fetch_inline_group_policies(iam, pool, out_dir))
+
+def main():
+    ap = argparse.ArgumentParser(description="Fetch inline IAM policies of every user, role and group.")
+    ap.add_argument("--output", default=output_dir, help=f"Output folder (default: {output_dir})")
+    add_backend_arguments(ap)
+    args = ap.parse_args()
 
-if __name__ == "__main__":
     print("🔍 Fetching inline policies...")
-    fetch_inline_user_policies()
-    fetch_inline_role_policies()
-    fetch_inline_group_policies()
-    print("🎉 All inline policies retrieved.")
+    count = fetch_all_inline_policies(client_from_args(args), args.output, args.workers)
+    print(f"🎉 All inline policies retrieved ({count}).")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,63 @@
 #!/usr/bin/env python3
-import argparse, sys
+import argparse, os, sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+from columnar import (SUMMARY_BASENAME, SUMMARY_DICTIONARY_COLUMNS, column_names, find_summaries,
+                      format_for_path, read_columns, replace_columns, write_frame)
+from metrics import add_metrics_arguments, file_bytes, finish, metrics_from_args
+from parallel import resolve_workers
+
+# numpy / pandas are imported by the functions that use them, after argument parsing
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+# ---------- Batch recalculation ----------
+#
+# --batch loads every policy_summary of every folder into one frame and recalculates
+# them together: Least-Privilege % is computed once for all rows, each threshold set
+# (--thresholds H:M ...) is a vectorized binning of that column into Low/Medium/High
+# codes, and the recommendation text is a categorical over those codes – no per-row
+# Python. Summaries are read and written by a thread pool (the work is file I/O);
+# every write goes to a temporary file renamed over the target. With several
+# threshold sets each one is written next to the original as
+# policy_summary_h<H>_m<M>.<ext>, leaving policy_summary itself untouched.
+
+# Inputs recalc() reads and the columns it (re)writes
+INPUT_COLUMNS = ["Original Actions", "Kept (Used)", "Wildcards Flagged"]
+OUTPUT_COLUMNS = ["Least-Privilege %", "pct_reduction_num", "% Reduction vs Original",
+                  "Least privilage recommendation"]
+
+# Recommendation texts, indexed by the bin code recommendation_codes() returns
+RECOMMENDATIONS = [
+    "Low: This policy is over-provisioned and needs significant trimming.",
+    "Medium: This policy could be improved by removing some unused permissions.",
+    "High: This policy is already highly optimized for least privilege.",
+]
+LEVELS = ["Low", "Medium", "High"]
+
+ThresholdSet = Tuple[float, float]  # (high_min, med_min)
 
 def lpr_recommendation(keep_pct: float, high_min: float, med_min: float) -> str:
     # High if >= high_min, Medium if [med_min, high_min), Low otherwise.
     if keep_pct >= high_min:
-        return "High: This policy is already highly optimized for least privilege."
+        return RECOMMENDATIONS[2]
     elif med_min <= keep_pct < high_min:
-        return "Medium: This policy could be improved by removing some unused permissions."
+        return RECOMMENDATIONS[1]
     else:
-        return "Low: This policy is over-provisioned and needs significant trimming."
+        return RECOMMENDATIONS[0]
 
-def recalc(df: pd.DataFrame, exclude_wildcards: bool, high_min: float, med_min: float) -> pd.DataFrame:
+def recommendation_codes(keep_pct: "pd.Series", high_min: float, med_min: float) -> "np.ndarray":
+    """Bin keep% into 0 = Low, 1 = Medium, 2 = High (same rules as lpr_recommendation; NaN is Low)."""
+    import numpy as np
+    keep = keep_pct.to_numpy(dtype=float)
+    return np.select([keep >= high_min, keep >= med_min], [2, 1], 0).astype(np.int8)
+
+def keep_percentages(df: "pd.DataFrame", exclude_wildcards: bool) -> "pd.Series":
+    """Least-Privilege % (kept / original actions) per row, rounded to 2 decimals."""
+    import pandas as pd
     # Normalize expected column names (exact names used by your tool)
     must_have = ["Original Actions", "Kept (Used)"]
     for name in must_have:
@@ -28,49 +73,198 @@ def recalc(df: pd.DataFrame, exclude_wildcards: bool, high_min: float, med_min:
     else:
         denom = df["Original Actions"].clip(lower=0)
 
-    # Keep% (Least-Privilege %) and Reduction%
     keep_pct = (df["Kept (Used)"] * 100.0 / denom.where(denom > 0, other=1)).round(2)
-    keep_pct = keep_pct.where(denom > 0, other=0.0)
-    reduction_pct = (100.0 - keep_pct).round(2)
+    return keep_pct.where(denom > 0, other=0.0)
 
-    # Write back
-    df["Least-Privilege %"] = keep_pct
-    df["pct_reduction_num"] = reduction_pct
-    df["% Reduction vs Original"] = df["pct_reduction_num"].map(lambda x: f"{x}%")
+def output_columns(keep_pct: "pd.Series", codes: "np.ndarray") -> Dict[str, "pd.Series"]:
+    """The recalculated OUTPUT_COLUMNS for keep% and its recommendation codes."""
+    import pandas as pd
+    reduction_pct = (100.0 - keep_pct).round(2)
+    return {
+        "Least-Privilege %": keep_pct,
+        "pct_reduction_num": reduction_pct,
+        "% Reduction vs Original": reduction_pct.astype(str) + "%",
+        # Recommendation string (based on KEEP %, not reduction)
+        "Least privilage recommendation": pd.Series(
+            pd.Categorical.from_codes(codes, categories=RECOMMENDATIONS), index=keep_pct.index),
+    }
 
-    # Recommendation string (based on KEEP %, not reduction)
-    df["Least privilage recommendation"] = keep_pct.map(lambda v: lpr_recommendation(v, high_min, med_min))
+def recalc(df: "pd.DataFrame", exclude_wildcards: bool, high_min: float, med_min: float) -> "pd.DataFrame":
+    keep_pct = keep_percentages(df, exclude_wildcards)
+    for name, values in output_columns(keep_pct, recommendation_codes(keep_pct, high_min, med_min)).items():
+        df[name] = values
     return df
 
+def load_summary(path: str) -> "pd.DataFrame":
+    """CSV summaries are read whole (they are rewritten whole); Parquet only the input columns."""
+    if format_for_path(path) == "csv":
+        import pandas as pd
+        return pd.read_csv(path)
+    present = set(column_names(path))
+    return read_columns(path, [c for c in INPUT_COLUMNS if c in present])
+
+def write_summary(source: str, frame: "pd.DataFrame", outputs: Dict[str, "pd.Series"],
+                  dest: Optional[str] = None) -> None:
+    """Write `outputs` into the summary at `source` (or a copy of it at `dest`), atomically."""
+    dest = dest or source
+    if format_for_path(source) == "csv":
+        write_frame(frame.assign(**outputs), dest)
+    else:
+        replace_columns(source, outputs, dictionary_columns=SUMMARY_DICTIONARY_COLUMNS, dest=dest)
+
+def fix_summary(path: str, exclude_wildcards: bool, high_min: float, med_min: float) -> int:
+    """Recalculate one policy_summary file in place (CSV or Parquet). Returns the row count."""
+    df = load_summary(path)
+    keep_pct = keep_percentages(df, exclude_wildcards)
+    write_summary(path, df, output_columns(keep_pct, recommendation_codes(keep_pct, high_min, med_min)))
+    return len(df)
+
+def variant_path(path: str, thresholds: ThresholdSet) -> str:
+    """policy_summary.csv -> policy_summary_h80_m50.csv for one of several threshold sets."""
+    high_min, med_min = thresholds
+    folder, ext = os.path.dirname(path), os.path.splitext(path)[1]
+    return os.path.join(folder, f"{SUMMARY_BASENAME}_h{high_min:g}_m{med_min:g}{ext}")
+
+def parse_thresholds(text: str) -> ThresholdSet:
+    try:
+        high, med = (float(part) for part in text.split(":"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected HIGH:MED (e.g. 90:40), got {text!r}")
+    return high, med
+
+# ---------- Batch mode ----------
+
+def batch_fix(paths: Sequence[str], exclude_wildcards: bool, threshold_sets: Sequence[ThresholdSet],
+              workers: int, metrics, write: bool = True) -> "pd.DataFrame":
+    """
+    Recalculate all summaries in one frame for every threshold set. Returns one row per
+    (summary, threshold set) with its High / Medium / Low policy counts.
+    """
+    import numpy as np
+    import pandas as pd
+    with ThreadPoolExecutor(max_workers=resolve_workers(workers)) as pool:
+        with metrics.stage("load summaries", unit="rows") as stage:
+            stage.bytes_read = file_bytes(paths)
+            frames = list(pool.map(load_summary, paths))
+            stage.items = sum(len(f) for f in frames)
+
+        with metrics.stage("recalculate", unit="rows") as stage:
+            inputs = []
+            for path, frame in zip(paths, frames):
+                missing = [c for c in INPUT_COLUMNS[:2] if c not in frame.columns]
+                if missing:
+                    raise ValueError(f"{path}: missing required column: {missing[0]}")
+                projected = frame.reindex(columns=INPUT_COLUMNS)
+                if "Wildcards Flagged" not in frame.columns:
+                    projected["Wildcards Flagged"] = 0
+                inputs.append(projected)
+            combined = pd.concat(inputs, ignore_index=True)
+            keep_pct = keep_percentages(combined, exclude_wildcards)
+            file_ids = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+            bounds = np.cumsum([0] + [len(f) for f in frames])
+
+            rows = []
+            outputs: Dict[ThresholdSet, Dict[str, "pd.Series"]] = {}
+            for thresholds in threshold_sets:
+                codes = recommendation_codes(keep_pct, *thresholds)
+                outputs[thresholds] = output_columns(keep_pct, codes)
+                counts = np.bincount(file_ids * 3 + codes, minlength=len(frames) * 3).reshape(-1, 3)
+                for path, (low, medium, high) in zip(paths, counts):
+                    rows.append({"Summary": path, "High Min": thresholds[0], "Med Min": thresholds[1],
+                                 "Policies": int(low + medium + high),
+                                 "High": int(high), "Medium": int(medium), "Low": int(low)})
+            stage.items = len(combined) * len(threshold_sets)
+
+        if write:
+            with metrics.stage("write summaries", unit="files") as stage:
+                jobs = []
+                for thresholds, columns in outputs.items():
+                    for i, (path, frame) in enumerate(zip(paths, frames)):
+                        part = {name: values.iloc[bounds[i]:bounds[i + 1]].set_axis(frame.index)
+                                for name, values in columns.items()}
+                        dest = variant_path(path, thresholds) if len(threshold_sets) > 1 else path
+                        jobs.append((pool.submit(write_summary, path, frame, part, dest), dest))
+                for future, _ in jobs:
+                    future.result()
+                stage.items = len(jobs)
+                stage.bytes_written = file_bytes(dest for _, dest in jobs)
+    return pd.DataFrame(rows)
+
+def describe_distribution(report: "pd.DataFrame") -> str:
+    lines = [f"📊 Recommendation mix over {report['Summary'].nunique()} summaries"]
+    totals = report.groupby(["High Min", "Med Min"], sort=False)[["Policies"] + LEVELS].sum()
+    for (high_min, med_min), row in totals.iterrows():
+        share = "  ".join(f"{level} {row[level]:>7,} ({row[level] * 100.0 / max(1, row['Policies']):5.1f}%)"
+                          for level in reversed(LEVELS))
+        lines.append(f"  High>={high_min:g} Medium>={med_min:g}:  {share}")
+    return "\n".join(lines)
+
 def main():
-    ap = argparse.ArgumentParser(description="Recalculate Least-Privilege % in policy_summary.csv files.")
-    ap.add_argument("paths", nargs="+", help="Folders that contain policy_summary.csv (e.g. refined_policies/mit test_refined_custom)")
+    ap = argparse.ArgumentParser(description="Recalculate Least-Privilege % in policy_summary.csv / .parquet files.")
+    ap.add_argument("paths", nargs="+", help="Folders that contain policy_summary.csv or .parquet (e.g. refined_policies/mit test_refined_custom)")
     ap.add_argument("--exclude-wildcards", action="store_true",
                     help="Exclude Wildcards Flagged from the denominator when computing the percentage.")
     ap.add_argument("--high-min", type=float, default=90.0,
                     help="Minimum keep%% to be considered High (default: 90)")
     ap.add_argument("--med-min", type=float, default=40.0,
                     help="Minimum keep%% to be considered Medium (default: 40)")
+    ap.add_argument("--batch", action="store_true",
+                    help="Recalculate all summaries in one vectorized pass with parallel, atomic writes")
+    ap.add_argument("--thresholds", nargs="+", type=parse_thresholds, metavar="HIGH:MED",
+                    help="With --batch: threshold sets to evaluate in the same pass (instead of "
+                         "--high-min/--med-min); several sets write policy_summary_h<H>_m<M> files")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="With --batch: threads reading / writing summaries (default: 0 = one per CPU)")
+    ap.add_argument("--report", default=None,
+                    help="With --batch: write High/Medium/Low counts per summary and threshold set here (.csv / .parquet)")
+    ap.add_argument("--dry-run", action="store_true",
+                    help="With --batch: only print the recommendation mix, do not rewrite summaries")
+    add_metrics_arguments(ap)
     args = ap.parse_args()
+    if not args.batch and (args.thresholds or args.report or args.dry_run):
+        ap.error("--thresholds, --report and --dry-run need --batch")
 
-    any_done = False
+    metrics = metrics_from_args("fix_policy_summary", args)
+    summaries: List[str] = []
     for p in args.paths:
         folder = Path(p)
-        csv_path = folder / "policy_summary.csv"
-        if not csv_path.exists():
-            print(f"Skipping {folder}: no policy_summary.csv")
+        paths = find_summaries(str(folder))
+        if not paths:
+            print(f"Skipping {folder}: no policy_summary.csv / policy_summary.parquet")
             continue
+        summaries.extend(paths)
 
-        print(f"\nFixing {csv_path}  (exclude_wildcards={args.exclude_wildcards}, High>={args.high_min}, Medium>={args.med_min})")
-        df = pd.read_csv(csv_path)
-        df2 = recalc(df, args.exclude_wildcards, args.high_min, args.med_min)
-        df2.to_csv(csv_path, index=False)
-        print(f"✅ Updated: {csv_path}  (rows: {len(df2)})")
-        any_done = True
-
-    if not any_done:
+    if not summaries:
         print("No files updated. Provide folder(s) that contain policy_summary.csv.")
         sys.exit(2)
 
+    if args.batch:
+        threshold_sets = list(dict.fromkeys(args.thresholds or [(args.high_min, args.med_min)]))
+        print(f"\nBatch-fixing {len(summaries)} summaries  (exclude_wildcards={args.exclude_wildcards}, "
+              f"threshold sets: {', '.join(f'{h:g}:{m:g}' for h, m in threshold_sets)})")
+        report = batch_fix(summaries, args.exclude_wildcards, threshold_sets, args.workers, metrics,
+                           write=not args.dry_run)
+        print(describe_distribution(report))
+        if not args.dry_run:
+            target = "in place" if len(threshold_sets) == 1 else "as policy_summary_h<H>_m<M> files"
+            print(f"✅ Updated {len(summaries)} summaries {target}  (rows: {int(report['Policies'].sum() / len(threshold_sets))})")
+        if args.report:
+            write_frame(report, args.report)
+            print(f"📝 Report → {args.report}")
+        metrics.count("summaries_fixed", 0 if args.dry_run else len(summaries))
+        finish(metrics, args)
+        return
+
+    for summary in summaries:
+        print(f"\nFixing {summary}  (exclude_wildcards={args.exclude_wildcards}, High>={args.high_min}, Medium>={args.med_min})")
+        with metrics.stage(f"fix {summary}", unit="rows") as stage:
+            stage.bytes_read = file_bytes([summary])
+            rows = fix_summary(summary, args.exclude_wildcards, args.high_min, args.med_min)
+            stage.items = rows
+            stage.bytes_written = file_bytes([summary])
+        print(f"✅ Updated: {summary}  (rows: {rows})")
+    metrics.count("summaries_fixed", len(metrics.stages))
+    finish(metrics, args)
+
 if __name__ == "__main__":
     main()
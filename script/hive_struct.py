@@ -0,0 +1,201 @@
+import re
+import json
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# ---------- Parser for Athena / Hive struct text ----------
+#
+# Athena CSV exports render CloudTrail structs (useridentity, additionaleventdata,
+# resources, tlsdetails, ...) as Hive text instead of JSON:
+#
+#   {type=IAMUser, principalid=AID..., arn=arn:aws:iam::1:user/bob, sessioncontext={
+#    sessionissuer={}, attributes={creationdate=2023-07-10T11:42:31Z, mfaauthenticated=true}}}
+#   [{accountid=1, type=AWS::S3::Bucket, arn=arn:aws:s3:::bucket}]
+#
+# Values are unquoted, so a ',' only separates fields when followed by ' key='.
+# parse_struct() takes the dotted fields to extract ('arn', 'sessioncontext.sessionissuer.arn');
+# everything else is skipped by bracket counting without building values, and the top
+# level stops as soon as every requested field has been seen. Results are memoized per
+# (text, fields): the same identity string repeats across thousands of events.
+# Cached results are shared – treat them as read-only.
+
+STRUCT_CACHE_SIZE = 65536
+
+# A field tree: {'arn': None, 'sessioncontext': {'sessionissuer': {'arn': None}}};
+# None selects the whole value (and a None tree selects every field)
+FieldTree = Optional[Dict[str, Any]]
+
+_OPEN = "{["
+_CLOSE = "}]"
+
+_SEPARATOR_KEY = re.compile(r" ?[\w\-:.]+=")
+_SCALAR_DELIM = re.compile(r"[,}\]]")
+_BRACKET = re.compile(r"[{}\[\]]")
+
+
+def _is_separator(text: str, comma: int) -> bool:
+    """True if the ',' at `comma` is followed by ' key=' (a field boundary, not part of a value)."""
+    return _SEPARATOR_KEY.match(text, comma + 1) is not None
+
+
+def _skip_nested(text: str, i: int) -> int:
+    """Index just past the balanced {...} / [...] starting at `i`."""
+    depth = 0
+    for m in _BRACKET.finditer(text, i):
+        if m.group() in _OPEN:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    return len(text)
+
+
+def _scalar_end(text: str, i: int, in_array: bool) -> int:
+    """End of an unquoted scalar: the closing bracket or the next field/element separator."""
+    while True:
+        m = _SCALAR_DELIM.search(text, i)
+        if m is None:
+            return len(text)
+        j = m.start()
+        if text[j] != "," or in_array or _is_separator(text, j):
+            return j
+        i = j + 1
+
+
+def _scalar(raw: str) -> Optional[str]:
+    raw = raw.strip()
+    return None if raw == "null" else raw
+
+
+def _parse_value(text: str, i: int, want: FieldTree, in_array: bool) -> Tuple[Any, int]:
+    if i < len(text) and text[i] == "{":
+        return _parse_struct(text, i, want, top=False)
+    if i < len(text) and text[i] == "[":
+        return _parse_array(text, i, want)
+    end = _scalar_end(text, i, in_array)
+    return _scalar(text[i:end]), end
+
+
+def _parse_array(text: str, i: int, want: FieldTree) -> Tuple[List[Any], int]:
+    items: List[Any] = []
+    n = len(text)
+    i += 1
+    while i < n and text[i] == " ":
+        i += 1
+    if i < n and text[i] == "]":
+        return items, i + 1
+    while i < n:
+        value, i = _parse_value(text, i, want, in_array=True)
+        items.append(value)
+        if i >= n or text[i] == "]":
+            return items, i + 1
+        i += 1  # ','
+        while i < n and text[i] == " ":
+            i += 1
+    return items, n
+
+
+def _parse_struct(text: str, i: int, want: FieldTree, top: bool) -> Tuple[Dict[str, Any], int]:
+    out: Dict[str, Any] = {}
+    remaining = None if want is None else len(want)
+    n = len(text)
+    i += 1
+    while i < n and text[i] == " ":
+        i += 1
+    if i < n and text[i] == "}":
+        return out, i + 1
+    while i < n:
+        eq = text.find("=", i)
+        if eq < 0:
+            break
+        key = text[i:eq].strip()
+        j = eq + 1
+        if want is None or key in want:
+            out[key], j = _parse_value(text, j, None if want is None else want[key], in_array=False)
+            if remaining is not None:
+                remaining -= 1
+                if remaining == 0 and top:
+                    return out, n
+        elif j < n and text[j] in _OPEN:
+            j = _skip_nested(text, j)
+        else:
+            j = _scalar_end(text, j, in_array=False)
+        if j >= n or text[j] in _CLOSE:
+            return out, j + 1
+        i = j + 1  # ','
+        while i < n and text[i] == " ":
+            i += 1
+    return out, n
+
+
+@lru_cache(maxsize=1024)
+def _field_tree(fields: Optional[Tuple[str, ...]]) -> FieldTree:
+    if fields is None:
+        return None
+    tree: Dict[str, Any] = {}
+    for path in fields:
+        node = tree
+        parts = path.split(".")
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:  # a parent was already selected whole
+                break
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def _project_json(value: Any, want: FieldTree) -> Any:
+    if want is None:
+        return value
+    if isinstance(value, list):
+        return [_project_json(v, want) for v in value]
+    if not isinstance(value, dict):
+        return value
+    lowered = {k.lower(): v for k, v in value.items()}
+    return {k: _project_json(lowered[k], sub) for k, sub in want.items() if k in lowered}
+
+
+@lru_cache(maxsize=STRUCT_CACHE_SIZE)
+def _parse_cached(text: str, fields: Optional[Tuple[str, ...]]) -> Any:
+    want = _field_tree(fields)
+    stripped = text.strip()
+    if not stripped:
+        return {}
+    if stripped.startswith(("{\"", "[{\"", "[\"")):
+        # CloudTrail JSON-lines input (event_stream serializes nested objects as JSON)
+        try:
+            return _project_json(json.loads(stripped), want)
+        except ValueError:
+            pass
+    if stripped[0] == "[":
+        return _parse_array(stripped, 0, want)[0]
+    if stripped[0] == "{":
+        return _parse_struct(stripped, 0, want, top=True)[0]
+    return {}
+
+
+def parse_struct(text: str, fields: Optional[Iterable[str]] = None) -> Any:
+    """
+    Parse Hive struct text (or JSON) into dicts / lists / strings.
+    `fields` limits the result to those dotted paths (keys are matched lowercased for JSON,
+    as-is for Hive text, which Athena already lowercases).
+    """
+    return _parse_cached(text, None if fields is None else tuple(sorted(set(fields))))
+
+
+def struct_field(text: str, path: str, default: Any = "") -> Any:
+    """One dotted field, e.g. struct_field(identity, 'sessioncontext.sessionissuer.arn')."""
+    value = _parse_cached(text, (path,))
+    for part in path.split("."):
+        if not isinstance(value, dict) or value.get(part) is None:
+            return default
+        value = value[part]
+    return value
+
+
+def cache_info():
+    """lru_cache statistics of the parse memo (hits, misses, maxsize, currsize)."""
+    return _parse_cached.cache_info()
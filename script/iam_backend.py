@@ -0,0 +1,255 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# ---------- IAM API access: pagination, throttling retry, pluggable backends ----------
+#
+# The fetch scripts talk to an "IAM client": anything exposing the boto3 IAM client
+# methods they use. `boto3` is the real thing (optionally pointed at a local fake IAM
+# server with --endpoint-url, e.g. moto_server); `stub` is an in-memory account with a
+# configurable number of entities, per-call latency and throttling, so the fetchers can
+# be exercised and benchmarked without AWS credentials.
+
+DEFAULT_WORKERS = 8
+
+THROTTLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "RequestThrottled",
+}
+
+
+def is_throttling(exc: BaseException) -> bool:
+    response = getattr(exc, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLE_CODES
+
+
+def call_with_retry(fn: Callable[..., Dict], *, max_attempts: int = 8, base_delay: float = 0.1,
+                    max_delay: float = 5.0, **kwargs: Any) -> Dict:
+    """Call an IAM API method, retrying throttling errors with capped exponential backoff + full jitter."""
+    for attempt in range(max_attempts):
+        try:
+            return fn(**kwargs)
+        except Exception as exc:
+            if not is_throttling(exc) or attempt == max_attempts - 1:
+                raise
+            time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
+    raise RuntimeError("unreachable")
+
+
+def paginate(fn: Callable[..., Dict], result_key: str, **kwargs: Any) -> Iterator[Dict]:
+    """
+    Yield every item of a Marker/IsTruncated paginated IAM list call
+    (list_policies, list_users, list_role_policies, ...), retrying throttled pages.
+    """
+    marker: Optional[str] = None
+    while True:
+        page_kwargs = dict(kwargs, Marker=marker) if marker else kwargs
+        page = call_with_retry(fn, **page_kwargs)
+        yield from page.get(result_key, [])
+        if not page.get("IsTruncated"):
+            return
+        marker = page["Marker"]
+
+
+# ---------- In-memory stub backend ----------
+
+class StubThrottlingError(Exception):
+    """Shaped like botocore's ClientError so is_throttling() recognizes it."""
+
+    def __init__(self, operation: str) -> None:
+        super().__init__(f"Rate exceeded ({operation})")
+        self.response = {"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}
+
+
+def _stub_document(service: str, index: int) -> Dict:
+    return {
+        "Version": "2012-10-17",
+        "Statement": [{
+            "Effect": "Allow",
+            "Action": [f"{service}:Get{index % 17}", f"{service}:List{index % 5}", f"{service}:*"],
+            "Resource": "*",
+        }],
+    }
+
+
+class StubIAMClient:
+    """
+    In-memory IAM account with `entities` managed policies, users, roles and groups
+    (each principal carrying `inline_per_entity` inline policies). Implements the subset
+    of the boto3 IAM client used by the fetch scripts, with Marker pagination,
+    optional per-call `latency` (seconds) and a `throttle_rate` of Throttling errors.
+    """
+
+    SERVICES = ["s3", "ec2", "iam", "logs", "lambda", "dynamodb", "sts", "kms"]
+
+    def __init__(self, entities: int = 1000, inline_per_entity: int = 1, latency: float = 0.0,
+                 throttle_rate: float = 0.0, page_size: int = 100, seed: int = 0) -> None:
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.page_size = page_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+        svc = self.SERVICES
+        self.policies = [{
+            "PolicyName": f"StubPolicy{i:05d}",
+            "Arn": f"arn:aws:iam::123456789012:policy/StubPolicy{i:05d}",
+            "DefaultVersionId": "v1",
+            "Document": _stub_document(svc[i % len(svc)], i),
+        } for i in range(entities)]
+        self.principals: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        for kind in ("user", "role", "group"):
+            self.principals[kind] = {
+                f"stub-{kind}-{i:05d}": {
+                    f"inline-{j}": _stub_document(svc[(i + j) % len(svc)], i + j)
+                    for j in range(inline_per_entity)
+                }
+                for i in range(entities)
+            }
+        self._policy_by_arn = {p["Arn"]: p for p in self.policies}
+
+    # ----- plumbing -----
+    def _call(self, operation: str) -> None:
+        with self._lock:
+            self.calls += 1
+            throttle = self.throttle_rate and self._rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            raise StubThrottlingError(operation)
+
+    def _page(self, key: str, items: List, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        start = int(Marker) if Marker else 0
+        end = start + (MaxItems or self.page_size)
+        page: Dict[str, Any] = {key: items[start:end], "IsTruncated": end < len(items)}
+        if page["IsTruncated"]:
+            page["Marker"] = str(end)
+        return page
+
+    # ----- managed policies -----
+    def list_policies(self, Scope: str = "All", Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        self._call("ListPolicies")
+        items = [{k: v for k, v in p.items() if k != "Document"} for p in self.policies]
+        return self._page("Policies", items, Marker, MaxItems)
+
+    def get_policy_version(self, PolicyArn: str, VersionId: str) -> Dict:
+        self._call("GetPolicyVersion")
+        doc = self._policy_by_arn[PolicyArn]["Document"]
+        return {"PolicyVersion": {"Document": doc, "VersionId": VersionId, "IsDefaultVersion": True}}
+
+    # ----- principals + inline policies -----
+    def _list_entities(self, kind: str, key: str, name_key: str, Marker: Optional[str], MaxItems: Optional[int]) -> Dict:
+        self._call(f"List{key}")
+        items = [{name_key: name} for name in self.principals[kind]]
+        return self._page(key, items, Marker, MaxItems)
+
+    def _list_inline(self, kind: str, name: str, Marker: Optional[str], MaxItems: Optional[int]) -> Dict:
+        self._call(f"List{kind.title()}Policies")
+        return self._page("PolicyNames", list(self.principals[kind][name]), Marker, MaxItems)
+
+    def _get_inline(self, kind: str, name_key: str, name: str, policy_name: str) -> Dict:
+        self._call(f"Get{kind.title()}Policy")
+        return {name_key: name, "PolicyName": policy_name,
+                "PolicyDocument": self.principals[kind][name][policy_name]}
+
+    def list_users(self, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_entities("user", "Users", "UserName", Marker, MaxItems)
+
+    def list_roles(self, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_entities("role", "Roles", "RoleName", Marker, MaxItems)
+
+    def list_groups(self, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_entities("group", "Groups", "GroupName", Marker, MaxItems)
+
+    def list_user_policies(self, UserName: str, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_inline("user", UserName, Marker, MaxItems)
+
+    def list_role_policies(self, RoleName: str, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_inline("role", RoleName, Marker, MaxItems)
+
+    def list_group_policies(self, GroupName: str, Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        return self._list_inline("group", GroupName, Marker, MaxItems)
+
+    def get_user_policy(self, UserName: str, PolicyName: str) -> Dict:
+        return self._get_inline("user", "UserName", UserName, PolicyName)
+
+    def get_role_policy(self, RoleName: str, PolicyName: str) -> Dict:
+        return self._get_inline("role", "RoleName", RoleName, PolicyName)
+
+    def get_group_policy(self, GroupName: str, PolicyName: str) -> Dict:
+        return self._get_inline("group", "GroupName", GroupName, PolicyName)
+
+    # ----- bulk snapshot -----
+    def get_account_authorization_details(self, Filter: Optional[List[str]] = None,
+                                          Marker: Optional[str] = None, MaxItems: Optional[int] = None) -> Dict:
+        self._call("GetAccountAuthorizationDetails")
+        acct = "arn:aws:iam::123456789012"
+        items: List[Tuple[str, Dict]] = []
+        for p in self.policies:
+            items.append(("Policies", {
+                "PolicyName": p["PolicyName"], "Arn": p["Arn"], "DefaultVersionId": "v1",
+                "PolicyVersionList": [{"Document": p["Document"], "VersionId": "v1", "IsDefaultVersion": True}],
+            }))
+        for kind, list_key, name_key, policy_list_key in (
+                ("user", "UserDetailList", "UserName", "UserPolicyList"),
+                ("role", "RoleDetailList", "RoleName", "RolePolicyList"),
+                ("group", "GroupDetailList", "GroupName", "GroupPolicyList")):
+            for i, (name, inline) in enumerate(self.principals[kind].items()):
+                managed = self.policies[i % len(self.policies)] if self.policies else None
+                items.append((list_key, {
+                    name_key: name,
+                    "Arn": f"{acct}:{kind}/{name}",
+                    policy_list_key: [{"PolicyName": pn, "PolicyDocument": doc} for pn, doc in inline.items()],
+                    "AttachedManagedPolicies": [{"PolicyName": managed["PolicyName"], "PolicyArn": managed["Arn"]}]
+                    if managed else [],
+                }))
+        page = self._page("_items", items, Marker, MaxItems)
+        out: Dict[str, Any] = {k: [] for k in ("UserDetailList", "RoleDetailList", "GroupDetailList", "Policies")}
+        for key, item in page.pop("_items"):
+            out[key].append(item)
+        out.update(page)
+        return out
+
+
+# ---------- Backend selection ----------
+
+def make_client(backend: str = "boto3", endpoint_url: Optional[str] = None, **stub_options: Any):
+    """
+    'boto3' -> real IAM client (boto3 is imported only here), 'stub' -> StubIAMClient.
+    `endpoint_url` points boto3 at a local fake IAM server.
+    """
+    if backend == "stub":
+        return StubIAMClient(**stub_options)
+    if backend != "boto3":
+        raise ValueError(f"Unknown IAM backend: {backend}")
+    import boto3
+    return boto3.client("iam", endpoint_url=endpoint_url) if endpoint_url else boto3.client("iam")
+
+
+def add_backend_arguments(parser) -> None:
+    parser.add_argument("--backend", choices=["boto3", "stub"], default="boto3",
+                        help="IAM API backend (default: boto3; 'stub' = in-memory fake account)")
+    parser.add_argument("--endpoint-url", default=None,
+                        help="Custom IAM endpoint for boto3, e.g. a local fake IAM server")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Concurrent API fetches (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--stub-entities", type=int, default=1000,
+                        help="Stub backend: number of policies/users/roles/groups (default: 1000)")
+    parser.add_argument("--stub-latency", type=float, default=0.0,
+                        help="Stub backend: simulated seconds per API call (default: 0)")
+    parser.add_argument("--stub-throttle-rate", type=float, default=0.0,
+                        help="Stub backend: fraction of calls that fail with Throttling (default: 0)")
+
+
+def client_from_args(args):
+    return make_client(args.backend, endpoint_url=args.endpoint_url,
+                       **({"entities": args.stub_entities, "latency": args.stub_latency,
+                           "throttle_rate": args.stub_throttle_rate} if args.backend == "stub" else {}))
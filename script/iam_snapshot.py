@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from iam_backend import add_backend_arguments, call_with_retry, client_from_args
+
+# ---------- Compact, indexed IAM snapshot ----------
+#
+# One bulk GetAccountAuthorizationDetails crawl replaces thousands of per-policy API
+# calls, and one JSON-lines file replaces thousands of small pretty-printed JSON files.
+# Each line is one compact record:
+#
+#   {"kind": "managed",   "name": "MyPolicy.json",             "arn": ..., "document": {...}}
+#   {"kind": "inline",    "name": "role_<role>_<policy>.json", "principal": "role/<role>", "document": {...}}
+#   {"kind": "principal", "name": "role/<role>", "arn": ..., "attached": ["MyPolicy.json"], "groups": [...]}
+#
+# Names follow the file names the per-file fetchers write, so reports stay comparable.
+# Records are written managed -> inline -> principal, each sorted by name (the order the
+# analyzers process policies in), so a sequential read is already in report order.
+# A sidecar <snapshot>.idx.json maps each name to its byte offset/length for O(1) loads.
+
+DEFAULT_SNAPSHOT = "iam_policies/snapshot.jsonl"
+KIND_ORDER = ("managed", "inline", "principal")
+
+# GetAccountAuthorizationDetails list key -> (principal type, name key, inline policy list key)
+_DETAIL_LISTS = {
+    "UserDetailList": ("user", "UserName", "UserPolicyList"),
+    "RoleDetailList": ("role", "RoleName", "RolePolicyList"),
+    "GroupDetailList": ("group", "GroupName", "GroupPolicyList"),
+}
+
+
+def index_path(snapshot_path: str) -> str:
+    return snapshot_path + ".idx.json"
+
+
+def _document(doc) -> Dict:
+    # The raw API returns URL-encoded JSON strings; boto3 usually decodes them already
+    if isinstance(doc, str):
+        return json.loads(unquote(doc))
+    return doc
+
+
+# ---------- Fetch ----------
+
+def iter_authorization_details(iam) -> Iterator[Dict]:
+    """Pages of GetAccountAuthorizationDetails (all four lists per page), with throttling retry."""
+    marker: Optional[str] = None
+    while True:
+        kwargs = {"Filter": ["User", "Role", "Group", "LocalManagedPolicy"]}
+        if marker:
+            kwargs["Marker"] = marker
+        page = call_with_retry(iam.get_account_authorization_details, **kwargs)
+        yield page
+        if not page.get("IsTruncated"):
+            return
+        marker = page["Marker"]
+
+
+def records_from_details(pages: Iterable[Dict]) -> List[Dict]:
+    """Flatten authorization-details pages into snapshot records."""
+    records: List[Dict] = []
+    for page in pages:
+        for policy in page.get("Policies", []):
+            default = next((v for v in policy.get("PolicyVersionList", []) if v.get("IsDefaultVersion")), None)
+            if default is None:
+                continue
+            records.append({"kind": "managed", "name": f"{policy['PolicyName']}.json",
+                            "arn": policy.get("Arn"), "document": _document(default["Document"])})
+
+        for list_key, (ptype, name_key, policy_list_key) in _DETAIL_LISTS.items():
+            for entity in page.get(list_key, []):
+                entity_name = entity[name_key]
+                principal = f"{ptype}/{entity_name}"
+                for inline in entity.get(policy_list_key, []):
+                    records.append({"kind": "inline",
+                                    "name": f"{ptype}_{entity_name}_{inline['PolicyName']}.json",
+                                    "principal": principal,
+                                    "document": _document(inline["PolicyDocument"])})
+                records.append({"kind": "principal", "name": principal, "arn": entity.get("Arn"),
+                                "attached": sorted(f"{p['PolicyName']}.json"
+                                                   for p in entity.get("AttachedManagedPolicies", [])),
+                                "groups": sorted(entity.get("GroupList", []))})
+    return records
+
+
+def records_from_directory(policies_dir: str, inline_dir: Optional[str] = None) -> List[Dict]:
+    """Snapshot records for an existing iam_policies/ (+ inline/) tree of JSON files."""
+    inline_dir = inline_dir or os.path.join(policies_dir, "inline")
+    records: List[Dict] = []
+    for kind, folder in (("managed", policies_dir), ("inline", inline_dir)):
+        if not os.path.isdir(folder):
+            continue
+        for fname in sorted(os.listdir(folder)):
+            if fname.endswith(".json"):
+                with open(os.path.join(folder, fname), "r", encoding="utf-8") as f:
+                    records.append({"kind": kind, "name": fname, "document": json.load(f)})
+    return records
+
+
+# ---------- Write / read ----------
+
+def write_snapshot(records: Iterable[Dict], path: str) -> int:
+    """Write compact JSON-lines plus the offset index. Returns the number of records."""
+    ordered = sorted(records, key=lambda r: (KIND_ORDER.index(r["kind"]), r["name"]))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    entries: List[List] = []
+    with open(path, "wb") as f:
+        for rec in ordered:
+            line = json.dumps(rec, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+            entries.append([rec["name"], rec["kind"], f.tell(), len(line)])
+            f.write(line)
+    with open(index_path(path), "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "records": entries}, f, separators=(",", ":"))
+    return len(ordered)
+
+
+class SnapshotReader:
+    """
+    Random and sequential access to a snapshot written by write_snapshot().
+    The index is rebuilt by one scan if the sidecar file is missing.
+    """
+
+    def __init__(self, path: str) -> None:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Snapshot not found: {path}")
+        self.path = path
+        self._entries = self._load_index()
+        self._by_name: Dict[Tuple[str, str], Tuple[int, int]] = {
+            (kind, name): (offset, length) for name, kind, offset, length in self._entries
+        }
+
+    def _load_index(self) -> List[List]:
+        try:
+            with open(index_path(self.path), "r", encoding="utf-8") as f:
+                return json.load(f)["records"]
+        except (OSError, ValueError, KeyError):
+            entries: List[List] = []
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    rec = json.loads(line)
+                    entries.append([rec["name"], rec["kind"], offset, len(line)])
+                    offset += len(line)
+            return entries
+
+    def names(self, kind: Optional[str] = None) -> List[str]:
+        return [name for name, k, _, _ in self._entries if kind is None or k == kind]
+
+    def record(self, name: str, kind: str = "managed") -> Dict:
+        offset, length = self._by_name[(kind, name)]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def load(self, name: str, kind: str = "managed") -> Dict:
+        """Policy document for one managed/inline policy name."""
+        return self.record(name, kind)["document"]
+
+    def iter_records(self, kinds: Iterable[str] = KIND_ORDER) -> Iterator[Dict]:
+        """Sequential scan (no seeks) over records of the given kinds, in snapshot order."""
+        kinds = set(kinds)
+        with open(self.path, "rb") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec["kind"] in kinds:
+                    yield rec
+
+    def policy_documents(self, kinds: Iterable[str] = ("managed", "inline")) -> List[Tuple[str, Dict]]:
+        """(file name, document) pairs: managed then inline, each sorted – the report order."""
+        return [(rec["name"], rec["document"]) for rec in self.iter_records(kinds)]
+
+    def principals(self) -> List[Dict]:
+        return list(self.iter_records(("principal",)))
+
+
+# ---------- CLI ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Build a single compact, indexed IAM snapshot file.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    fetch = sub.add_parser("fetch", help="Bulk-fetch via GetAccountAuthorizationDetails")
+    fetch.add_argument("--output", default=DEFAULT_SNAPSHOT, help=f"Snapshot path (default: {DEFAULT_SNAPSHOT})")
+    add_backend_arguments(fetch)
+
+    convert = sub.add_parser("from-dir", help="Convert an existing iam_policies/ tree")
+    convert.add_argument("--policies", default="iam_policies", help="Managed policies folder (default: iam_policies)")
+    convert.add_argument("--inline", default=None, help="Inline policies folder (default: <policies>/inline)")
+    convert.add_argument("--output", default=DEFAULT_SNAPSHOT, help=f"Snapshot path (default: {DEFAULT_SNAPSHOT})")
+
+    args = ap.parse_args()
+    if args.command == "fetch":
+        print("🔍 Fetching account authorization details...")
+        records = records_from_details(iter_authorization_details(client_from_args(args)))
+    else:
+        records = records_from_directory(args.policies, args.inline)
+
+    count = write_snapshot(records, args.output)
+    kinds = {k: sum(1 for r in records if r["kind"] == k) for k in KIND_ORDER}
+    print(f"✅ Snapshot written: {args.output} ({count} records: "
+          f"{kinds['managed']} managed, {kinds['inline']} inline, {kinds['principal']} principals)")
+
+
+if __name__ == "__main__":
+    main()
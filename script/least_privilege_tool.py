@@ -1,51 +1,113 @@
 import os 
 import json
 import argparse
-from typing import List, Dict, Tuple
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from action_vocab import VOCABULARY, ActionSet
+from columnar import FORMATS, SUMMARY_DICTIONARY_COLUMNS, read_columns, summary_path, write_frame
+from effective_permissions import granted_actions
+from iam_snapshot import SnapshotReader
+from metrics import add_metrics_arguments, file_bytes, finish, metrics_from_args, tree_bytes
+from parallel import imap_chunks
+from policy_dedup import DocumentGroups, canonical_hash
+from reporting import Reporter, add_reporting_arguments, reporter_from_args
+from resource_index import DEFAULT_RESOURCE_LIMIT, ResourceIndex, load_resource_index
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE_DAYS, ResultCache, policy_hash
+from wildcard_matcher import WildcardMatcher, is_wildcard
+
+# pandas is only needed to read usage reports and write the summary and is imported
+# there: --help, argument errors and single-document refines (analysis_service) skip it
+if TYPE_CHECKING:
+    import pandas as pd
 
 # --------------------------
 # Load "used" actions per policy from the usage CSV
 # --------------------------
-def load_usage_report(report_path: str) -> Dict[str, List[str]]:
+USAGE_COLUMNS = ["Policy File", "Action", "Status"]
+
+# { 'PolicyFile.json': ActionSet of used actions (ids in the shared vocabulary) }
+UsageMap = Dict[str, ActionSet]
+# { 'PolicyFile.json': frozenset of observed 'service:Action' covered by a wildcard }
+CoverageMap = Dict[str, FrozenSet[str]]
+
+def _normalized(col: "pd.Series", lower: bool) -> "pd.Series":
+    """strip()/lower() each *distinct* value once, then broadcast back by code."""
+    import pandas as pd
+    codes, uniques = pd.factorize(col, use_na_sentinel=False)
+    cleaned = pd.Index(uniques).astype(str).str.strip()
+    if lower:
+        cleaned = cleaned.str.lower()
+    return pd.Series(cleaned.take(codes), index=col.index)
+
+def _read_usage_frame(report_path: str) -> "pd.DataFrame":
     """
-    Returns: { 'PolicyFile.json': ['service:action', ... lowercased] }
+    Project the three report columns and normalize them column-wise (no per-row Python).
+    Rows without a policy or action (blank lines, truncated rows) are dropped.
+    """
+    import pandas as pd
+    df = read_columns(report_path, USAGE_COLUMNS, dtype=str, keep_default_na=False)
+    frame = pd.DataFrame({
+        "policy": _normalized(df["Policy File"], lower=False),
+        "action": _normalized(df["Action"], lower=False),
+        "status": _normalized(df["Status"], lower=True),
+    })
+    return frame[(frame["policy"] != "") & (frame["action"] != "")]
+
+def _group_used(frame: "pd.DataFrame") -> UsageMap:
+    import pandas as pd
+    rows = frame[frame["status"] == "used"]
+    if rows.empty:
+        return {}
+    # vocabulary ids are assigned per distinct action, then broadcast to the rows
+    codes, uniques = pd.factorize(rows["action"])
+    vocab_ids = pd.Series([VOCABULARY.id(a) for a in uniques], dtype="int64").take(codes)
+    grouped = pd.Series(vocab_ids.values, index=rows.index).groupby(rows["policy"], sort=False).unique()
+    return {policy: ActionSet.from_ids(VOCABULARY, ids.tolist()) for policy, ids in grouped.items()}
+
+def _group_covered(frame: "pd.DataFrame") -> CoverageMap:
+    rows = frame[frame["status"] == "covered"]
+    if rows.empty:
+        return {}
+    grouped = rows["action"].groupby(rows["policy"], sort=False).unique()
+    return {policy: frozenset(values) for policy, values in grouped.items()}
+
+def load_usage_tables(report_path: str) -> Tuple[UsageMap, CoverageMap]:
+    """(load_usage_report, load_wildcard_coverage) from a single read of the CSV."""
+    frame = _read_usage_frame(report_path)
+    return _group_used(frame), _group_covered(frame)
+
+def load_usage_report(report_path: str) -> UsageMap:
+    """
+    Returns: { 'PolicyFile.json': ActionSet({'service:action', ... lowercased}) }
     Only actions with Status == 'Used' are included.
 
-    Expected CSV headers: Policy File, Action, Status
+    Expected columns (CSV or Parquet): Policy File, Action, Status
+    """
+    return _group_used(_read_usage_frame(report_path))
+
+def load_wildcard_coverage(report_path: str) -> CoverageMap:
+    """
+    Returns: { 'PolicyFile.json': frozenset({'service:Action', ...}) } for rows with
+    Status == 'Covered', i.e. observed events granted only through a wildcard
+    (original case kept). Reports produced before wildcard evaluation simply have none.
     """
-    df = pd.read_csv(report_path)
-    usage_map: Dict[str, List[str]] = {}
-    for _, row in df.iterrows():
-        policy = str(row['Policy File']).strip()
-        action = str(row['Action']).strip().lower()
-        status = str(row['Status']).strip().lower()
-        if status == 'used':
-            usage_map.setdefault(policy, []).append(action)
-    return usage_map
+    return _group_covered(_read_usage_frame(report_path))
 
 # --------------------------
 # Extract actions from a policy JSON
 # --------------------------
-def flatten_actions(stmt_actions) -> List[str]:
-    if stmt_actions is None:
-        return []
-    if isinstance(stmt_actions, str):
-        return [stmt_actions]
-    if isinstance(stmt_actions, list):
-        return [a for a in stmt_actions if isinstance(a, str)]
-    return []
+def load_policy(policy_path: str) -> Dict:
+    with open(policy_path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-def collect_original_actions(policy_json: Dict) -> List[str]:
-    actions: List[str] = []
+def _statements(policy_json: Dict) -> List[Dict]:
     statements = policy_json.get("Statement", [])
-    if not isinstance(statements, list):
-        statements = [statements]
-    for stmt in statements:
-        if stmt.get("Effect") != "Allow":
-            continue
-        actions.extend(flatten_actions(stmt.get("Action")))
-    return actions
+    return statements if isinstance(statements, list) else [statements]
+
+def collect_original_actions(policy_json: Dict) -> List[str]:
+    # the Allow grants, as compare's extract_actions sees them (see effective_permissions
+    # for Deny precedence and NotAction across every policy a principal holds)
+    return granted_actions(policy_json)
 
 # --------------------------
 # Recommendation helper (exact wording requested)
@@ -66,42 +128,167 @@ def lpr_recommendation(lpr_percent: float) -> str:
 # --------------------------
 # Build refined policy & metrics
 # --------------------------
-def process_policy(policy_path: str, used_actions_lower: List[str]) -> Tuple[Dict, Dict, str]:
+def process_policy(policy_path: str, used_actions_lower: Iterable[str],
+                   covered_actions: Optional[Iterable[str]] = None) -> Tuple[Dict, Dict, str]:
     """
+    `covered_actions` are observed events granted through a wildcard (see
+    load_wildcard_coverage); wildcards are replaced by the ones they match.
+
     Returns:
       refined_policy_json,
       metrics dict,
       human-readable diff string
     """
-    with open(policy_path, "r", encoding="utf-8") as f:
-        policy = json.load(f)
+    return refine_policy(load_policy(policy_path), used_actions_lower, covered_actions)
+
+# Keys that must match for two Allow statements to be merged into one
+_MERGE_EXCLUDED_KEYS = ("Sid", "Action")
+
+def refine_statements(statements: List[Dict],
+                      granted: Dict[str, Sequence[str]]) -> Tuple[List[Dict], Dict[str, int]]:
+    """
+    Trim each Allow statement's Action list in place of flattening: one pass over the
+    statements, keeping Resource / NotResource / Condition / Principal / Sid as they were.
+
+    - `granted` maps each original action to what replaces it: itself if used, the
+      observed actions it covers if it is a wildcard; unused actions are absent. Wildcard
+      replacements thus stay inside the statement (and Resource scope) that granted them
+    - Allow statements left without actions are dropped
+    - Allow statements with identical everything-but-Action/Sid are merged (first Sid wins)
+    - Deny statements and NotAction statements are kept verbatim (nothing to trim safely)
 
+    Returns (refined statements, counts of preserved / merged / dropped statements).
+    """
+    refined: List[Dict] = []
+    # merge key -> (position in `refined`, lowercased actions seen, actions in first-seen case)
+    groups: Dict[str, Tuple[int, Set[str], List[str]]] = {}
+    stats = {"preserved": 0, "merged": 0, "dropped": 0}
+
+    for stmt in statements:
+        if not isinstance(stmt, dict):
+            continue
+        if stmt.get("Effect") != "Allow" or "Action" not in stmt:
+            refined.append(stmt)
+            stats["preserved"] += 1
+            continue
+
+        raw = stmt.get("Action")
+        actions: List[str] = []
+        for act in ([raw] if isinstance(raw, str) else raw if isinstance(raw, list) else ()):
+            if isinstance(act, str):
+                actions.extend(granted.get(act, ()))
+        if not actions:
+            stats["dropped"] += 1
+            continue
+
+        key = json.dumps({k: v for k, v in stmt.items() if k not in _MERGE_EXCLUDED_KEYS}, sort_keys=True)
+        if key in groups:
+            stats["merged"] += 1
+        else:
+            groups[key] = (len(refined), set(), [])
+            refined.append(stmt)
+        _, seen, kept = groups[key]
+        for act in actions:
+            if act.lower() not in seen:
+                seen.add(act.lower())
+                kept.append(act)
+
+    # copy the grouped statements with their trimmed Action list (same key order as the input)
+    for position, _, kept in groups.values():
+        stmt = refined[position]
+        refined[position] = {k: (sorted(kept) if k == "Action" else v) for k, v in stmt.items()}
+    return refined, stats
+
+def suggest_resources(statements: List[Dict], resources: ResourceIndex,
+                      limit: int = DEFAULT_RESOURCE_LIMIT,
+                      apply: bool = False) -> List[Tuple[List[str], List[str], List[str]]]:
+    """
+    For every trimmed Allow statement, the observed ARNs its actions touched inside its
+    Resource (collapsed to at most `limit` ARNs / prefixes, see resource_index). With
+    `apply` the statement's Resource is replaced. Statements kept verbatim, NotResource
+    statements and statements with an action never seen on a resource are left alone.
+    Returns (actions, Resource before, suggested Resource) per narrowable statement.
+    """
+    suggestions = []
+    for stmt in statements:
+        if stmt.get("Effect") != "Allow" or not isinstance(stmt.get("Action"), list) or "Resource" not in stmt:
+            continue
+        raw = stmt["Resource"]
+        patterns = [raw] if isinstance(raw, str) else [r for r in raw if isinstance(r, str)]
+        suggestion = resources.suggest(stmt["Action"], patterns, limit)
+        if not suggestion or suggestion == sorted(patterns):
+            continue
+        suggestions.append((stmt["Action"], patterns, suggestion))
+        if apply:
+            stmt["Resource"] = suggestion[0] if len(suggestion) == 1 else suggestion
+    return suggestions
+
+def refine_policy(policy: Dict, used_actions_lower: Iterable[str],
+                  covered_actions: Optional[Iterable[str]] = None,
+                  flatten: bool = False,
+                  resources: Optional[ResourceIndex] = None,
+                  narrow_resources: bool = False,
+                  resource_limit: int = DEFAULT_RESOURCE_LIMIT) -> Tuple[Dict, Dict, str]:
+    """
+    Same as process_policy, for an already-parsed policy document.
+    Statement structure is kept (see refine_statements); `flatten` restores the legacy
+    output of one Allow statement with every kept action on "Resource": "*".
+    With a ResourceIndex the diff lists Resource narrowing suggestions per statement
+    (see suggest_resources); `narrow_resources` writes them into the refined policy.
+    """
     original_actions = collect_original_actions(policy)
     original_count = len(original_actions)
 
     # Classify actions
-    used_set_lower = set(a.lower() for a in used_actions_lower)
+    used = used_actions_lower if isinstance(used_actions_lower, ActionSet) else VOCABULARY.encode(used_actions_lower)
     kept_actions: List[str] = []
     wildcard_actions: List[str] = []
     unused_actions: List[str] = []
 
     for act in original_actions:
-        if '*' in act:
+        if is_wildcard(act):
             wildcard_actions.append(act)
             # Do not keep wildcards in refined policy
-        elif act.lower() in used_set_lower:
+        elif act in used:
             kept_actions.append(act)
         else:
             unused_actions.append(act)
 
-    # Build refined policy with only the kept actions
-    refined_statements = []
-    if kept_actions:
-        refined_statements.append({
-            "Effect": "Allow",
-            "Action": sorted(kept_actions),
-            "Resource": "*"
-        })
+    # Replace wildcards with the concrete observed actions they cover
+    replacements: List[Tuple[str, str]] = []
+    expansion: Dict[str, List[str]] = {}
+    if wildcard_actions and (covered_actions or kept_actions):
+        # compare reports an event as Covered only when no statement names it explicitly,
+        # so the used explicit actions join the pool: a wildcard in one statement still
+        # expands to them and keeps that access on its own Resource
+        expansion = WildcardMatcher(wildcard_actions).expand(list(covered_actions or ()) + kept_actions)
+        granted = {a.lower() for a in kept_actions}
+        for pattern in wildcard_actions:
+            for act in expansion.get(pattern.strip(), []):
+                if act.lower() not in granted:
+                    granted.add(act.lower())
+                    replacements.append((pattern, act))
+
+    # Build refined policy with only the kept actions (+ wildcard replacements)
+    statements = _statements(policy)
+    if flatten:
+        refined_statements = []
+        refined_actions = kept_actions + [act for _, act in replacements]
+        if refined_actions:
+            refined_statements.append({
+                "Effect": "Allow",
+                "Action": sorted(refined_actions),
+                "Resource": "*"
+            })
+    else:
+        # action -> its replacement(s), from the classification above (no second lookup in `used`)
+        granted: Dict[str, Sequence[str]] = {act: (act,) for act in kept_actions}
+        for pattern in wildcard_actions:
+            granted[pattern] = expansion.get(pattern.strip(), ())
+        refined_statements, statement_stats = refine_statements(statements, granted)
+    resource_suggestions = []
+    if resources is not None and not flatten:
+        resource_suggestions = suggest_resources(refined_statements, resources, resource_limit, narrow_resources)
 
     refined = {
         "Version": policy.get("Version", "2012-10-17"),
@@ -127,6 +314,7 @@ def process_policy(policy_path: str, used_actions_lower: List[str]) -> Tuple[Dic
         "Kept (Used)": kept_count,
         "Unused (Removed)": unused_count,
         "Wildcards Flagged": wildcard_count,
+        "Wildcard Replacements": len(replacements),
         "Least-Privilege %": f"{lpr_percent}%",                # numeric
         "pct_reduction_num": f"{pct_reduction_num}%",
         # exact label requested:
@@ -151,7 +339,24 @@ def process_policy(policy_path: str, used_actions_lower: List[str]) -> Tuple[Dic
         "",
         "Wildcard actions (removed):",
         *([f"  ! {a}" for a in wildcard_actions] if wildcard_actions else ["  (none)"]),
+        "",
+        "Wildcard replacements (observed usage):",
+        *([f"  ~ {p} -> {a}" for p, a in replacements] if replacements else ["  (none)"]),
     ]
+    if not flatten:
+        diff_lines[6:6] = [
+            f"  · statements: {len(statements)} -> {len(refined_statements)} "
+            f"({statement_stats['merged']} merged, {statement_stats['dropped']} emptied, "
+            f"{statement_stats['preserved']} Deny/NotAction kept as-is)",
+        ]
+    if resources is not None and not flatten:
+        verb = "narrowed" if narrow_resources else "suggested"
+        diff_lines += [
+            "",
+            f"Resource {verb} to observed ARNs:",
+            *([f"  @ {', '.join(actions)}: {', '.join(before)} -> {', '.join(after)}"
+               for actions, before, after in resource_suggestions] if resource_suggestions else ["  (none)"]),
+        ]
 
     return refined, metrics, "\n".join(diff_lines)
 
@@ -168,48 +373,143 @@ def write_text(path: str, text: str):
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
-def write_summary(rows: List[Dict], out_csv: str):
+def write_summary(rows: List[Dict], out_path: str):
+    """policy_summary as CSV or Parquet, by the extension of `out_path`."""
+    import pandas as pd
     df = pd.DataFrame(rows)
-    df.to_csv(out_csv, index=False)
-    print(f"✅ Summary written to: {out_csv}")
+    write_frame(df, out_path, dictionary_columns=SUMMARY_DICTIONARY_COLUMNS)
+    print(f"✅ Summary written to: {out_path}")
 
 # --------------------------
-# CLI
+# Folder driver (shared by the CLI and run_all's in-process pipeline)
 # --------------------------
-def main():
-    # Debug banner to confirm we are running the right script and thresholds
-    print(">> least_privilege_tool.py loaded from:", __file__)
-    print(">> Thresholds: High>=90, Medium 40–<90, Low<40")
-
-    ap = argparse.ArgumentParser(description="Generate least-privilege versions of IAM policies based on usage.")
-    ap.add_argument("--policies", required=True, help="Folder containing policy JSON files to refine")
-    ap.add_argument("--usage", required=True, help="CSV produced by compare_policy_usage.py")
-    ap.add_argument("--output", required=True, help="Folder to write refined policies and reports")
-    args = ap.parse_args()
+def list_policy_files(folder: str) -> List[Tuple[str, str]]:
+    """(file name, path) for every *.json policy directly under `folder`, sorted."""
+    return [(fname, os.path.join(folder, fname))
+            for fname in sorted(os.listdir(folder)) if fname.endswith(".json")]
 
-    os.makedirs(args.output, exist_ok=True)
-    usage_map = load_usage_report(args.usage)
-
-    summary_rows: List[Dict] = []
-
-    for fname in sorted(os.listdir(args.policies)):
-        if not fname.endswith(".json"):
-            continue
-        policy_path = os.path.join(args.policies, fname)
-        used_actions = usage_map.get(fname, [])
-
-        refined_json, metrics, diff_str = process_policy(policy_path, used_actions)
+def usage_maps_from_findings(results: Dict[str, Iterable[Tuple[str, str]]]) -> Tuple[UsageMap, CoverageMap]:
+    """
+    Build (usage_map, coverage_map) straight from compare_policy_usage findings,
+    equivalent to load_usage_report / load_wildcard_coverage on the written CSV.
+    """
+    usage_map: Dict[str, Set[int]] = {}
+    coverage_map: Dict[str, Set[str]] = {}
+    for policy, rows in results.items():
+        for action, status in rows:
+            status = status.lower()
+            if status == 'used':
+                usage_map.setdefault(policy, set()).add(VOCABULARY.id(action))
+            elif status == 'covered':
+                coverage_map.setdefault(policy, set()).add(action.strip())
+    return ({p: ActionSet.from_ids(VOCABULARY, ids) for p, ids in usage_map.items()},
+            {p: frozenset(a) for p, a in coverage_map.items()})
+
+_WORKER_CACHE: Optional[ResultCache] = None
+# keyword arguments for refine_policy (flatten / resources / narrow_resources / resource_limit)
+_WORKER_OPTIONS: Dict = {}
+
+def _init_refine_worker(cache: Optional[ResultCache], options: Optional[Dict] = None) -> None:
+    global _WORKER_CACHE, _WORKER_OPTIONS
+    _WORKER_CACHE = cache
+    _WORKER_OPTIONS = options or {}
+
+def _options_key(options: Dict) -> List:
+    """Cache-key part for the refine options (the resource index by content hash)."""
+    resources = options.get("resources")
+    return ["flatten" if options.get("flatten") else "statements",
+            resources.fingerprint() if resources is not None else None,
+            bool(options.get("narrow_resources")), options.get("resource_limit", DEFAULT_RESOURCE_LIMIT)]
+
+def _refine_cached(policy: Union[str, Dict], used_actions: ActionSet,
+                   covered: FrozenSet[str]) -> Tuple[Dict, Dict, str, bool]:
+    if not isinstance(policy, dict):
+        policy = load_policy(policy)
+    cache = _WORKER_CACHE
+    if cache is None or not cache.enabled:
+        return (*refine_policy(policy, used_actions, covered, **_WORKER_OPTIONS), False)
+
+    key = cache.key(policy_hash(policy), sorted(used_actions), sorted(covered), _options_key(_WORKER_OPTIONS))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached["refined"], cached["metrics"], cached["diff"], True
+    refined_json, metrics, diff_str = refine_policy(policy, used_actions, covered, **_WORKER_OPTIONS)
+    cache.put(key, {"refined": refined_json, "metrics": metrics, "diff": diff_str})
+    return refined_json, metrics, diff_str, False
+
+RefineItem = Tuple[str, Union[str, Dict], ActionSet, FrozenSet[str], str, Tuple[str, ...]]
+
+def _refine_chunk(chunk: List[RefineItem]) -> List[Tuple[str, Dict, bool]]:
+    """
+    Work unit: refine (or reuse the cached result) and write each policy, return (file name, metrics, hit).
+    The outputs are also written under each alias: files whose document is a duplicate of this one.
+    """
+    out: List[Tuple[str, Dict, bool]] = []
+    for fname, policy, used_actions, covered, output_dir, aliases in chunk:
+        refined_json, metrics, diff_str, hit = _refine_cached(policy, used_actions, covered)
 
         # outputs
-        base = fname[:-5]  # strip .json
-        refined_path = os.path.join(args.output, f"{base}_refined.json")
-        diff_path = os.path.join(args.output, f"{base}_refined.diff")
-
-        write_json(refined_path, refined_json)
-        write_text(diff_path, diff_str)
+        for name in (fname, *aliases):
+            base = name[:-5]  # strip .json
+            write_json(os.path.join(output_dir, f"{base}_refined.json"), refined_json)
+            write_text(os.path.join(output_dir, f"{base}_refined.diff"), diff_str)
+        out.append((fname, metrics, hit))
+    return out
+
+def refine_folder(policies: Iterable[Tuple[str, Union[str, Dict]]],
+                  usage_map: UsageMap,
+                  coverage_map: CoverageMap,
+                  output_dir: str,
+                  workers: int = 1,
+                  cache: Optional[ResultCache] = None,
+                  summary_format: str = "csv",
+                  reporter: Optional[Reporter] = None,
+                  flatten: bool = False,
+                  resources: Optional[ResourceIndex] = None,
+                  narrow_resources: bool = False,
+                  resource_limit: int = DEFAULT_RESOURCE_LIMIT,
+                  dedup: bool = True) -> List[Dict]:
+    """
+    Refine each (file name, path-or-parsed-document) pair, write the refined JSON and
+    diff per policy plus policy_summary.<summary_format> into `output_dir`. Returns the summary rows.
+    With workers > 1 policies are sharded across a process pool; rows keep input order.
+    With a `cache`, a policy whose document and used/covered actions are unchanged
+    reuses its stored refined JSON, diff and summary row.
+    Per-policy lines go through `reporter` (--log-level detail); otherwise only
+    aggregate progress by recommendation level is printed.
+    `flatten` selects the legacy single-statement output; `resources` adds Resource
+    suggestions, applied with `narrow_resources` (see refine_policy).
+    With `dedup`, policies with the same canonical document (policy_dedup) and the same
+    used / covered actions are refined once; the result is written for every copy.
+    """
+    reporter = reporter or Reporter()
+    reporter.reset()
+    os.makedirs(output_dir, exist_ok=True)
+    summary_rows: List[Dict] = []
 
-        print(f"✔ Processed {fname} → {os.path.basename(refined_path)}")
-        print(f"  ↳ Diff: {os.path.basename(diff_path)}")
+    options = {"flatten": flatten, "resources": resources, "narrow_resources": narrow_resources,
+               "resource_limit": resource_limit}
+    no_usage = VOCABULARY.encode(())
+    items = [(fname, policy, usage_map.get(fname, no_usage), coverage_map.get(fname, frozenset()), output_dir, ())
+             for fname, policy in policies]
+    if dedup:
+        # parse once here: the representatives go to the workers as documents
+        items = [(fname, policy if isinstance(policy, dict) else load_policy(policy), *rest)
+                 for fname, policy, *rest in items]
+        groups = DocumentGroups((canonical_hash(item[1]), item[2], item[3]) for item in items)
+    else:
+        groups = DocumentGroups(range(len(items)))
+    work = [(*items[members[0]][:5], tuple(items[i][0] for i in members[1:])) for members in groups.members()]
+    refined = imap_chunks(_refine_chunk, work, workers, initializer=_init_refine_worker, initargs=(cache, options))
+    for position, (_, metrics, hit), first in groups.fan_out(refined):
+        fname = items[position][0]
+        if reporter.detailed:
+            base = fname[:-5]  # strip .json
+            reporter.detail(f"✔ Processed {fname} → {base}_refined.json", f"  ↳ Diff: {base}_refined.diff")
+        # 'High: ...' -> High
+        reporter.tick([metrics["Least privilage recommendation"].split(":", 1)[0]])
+        if cache is not None and first:
+            cache.record(hit)
 
         # add summary row
         summary_rows.append({
@@ -217,7 +517,93 @@ def main():
             **metrics
         })
 
-    write_summary(summary_rows, os.path.join(args.output, "policy_summary.csv"))
+    if groups.duplicates:
+        reporter.info(f"♊ {groups.duplicates} duplicate policies reused the refinement of an identical document "
+                      f"({len(groups)} unique)")
+    reporter.done("✔ Refined")
+    write_summary(summary_rows, summary_path(output_dir, summary_format))
+    return summary_rows
+
+# --------------------------
+# CLI
+# --------------------------
+def main():
+    ap = argparse.ArgumentParser(description="Generate least-privilege versions of IAM policies based on usage.")
+    ap.add_argument("--policies", help="Folder containing policy JSON files to refine")
+    ap.add_argument("--snapshot", help="Refine policies from an iam_snapshot.py snapshot instead of --policies")
+    ap.add_argument("--snapshot-kind", choices=["managed", "inline", "all"], default="all",
+                    help="Which snapshot policies to refine (default: all)")
+    ap.add_argument("--usage", required=True, help="Report produced by compare_policy_usage.py (.csv or .parquet)")
+    ap.add_argument("--output", required=True, help="Folder to write refined policies and reports")
+    ap.add_argument("--summary-format", choices=FORMATS, default="csv",
+                    help="policy_summary file format (default: csv; parquet needs pyarrow)")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Processes to shard policies across (default: 1; 0 = one per CPU)")
+    ap.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                    help=f"Per-policy result cache location (default: {DEFAULT_CACHE_DIR})")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="Recompute every policy and do not read or write the result cache")
+    ap.add_argument("--no-dedup", action="store_true",
+                    help="Refine every policy file separately, even identical copies")
+    ap.add_argument("--cache-max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                    help=f"Evict cache entries unused for this many days (default: {DEFAULT_MAX_AGE_DAYS:g})")
+    ap.add_argument("--flatten", action="store_true",
+                    help="Legacy output: one Allow statement with all kept actions on Resource '*' "
+                         "(default keeps statements, Resource, Condition, Deny and NotAction)")
+    ap.add_argument("--resources", default=None,
+                    help="CloudTrail export with a resources column: suggest the observed ARNs per statement")
+    ap.add_argument("--narrow-resources", action="store_true",
+                    help="With --resources, write the suggested ARNs / prefixes into the refined Resource")
+    ap.add_argument("--resource-limit", type=int, default=DEFAULT_RESOURCE_LIMIT,
+                    help=f"Maximum Resource entries per narrowed statement (default: {DEFAULT_RESOURCE_LIMIT})")
+    add_metrics_arguments(ap)
+    add_reporting_arguments(ap)
+    args = ap.parse_args()
+    if not args.policies and not args.snapshot:
+        ap.error("one of --policies or --snapshot is required")
+    if args.narrow_resources and not args.resources:
+        ap.error("--narrow-resources needs --resources")
+
+    reporter = reporter_from_args(args)
+    # Debug banner to confirm we are running the right script and thresholds
+    reporter.detail(f">> least_privilege_tool.py loaded from: {__file__}",
+                    ">> Thresholds: High>=90, Medium 40–<90, Low<40")
+
+    metrics = metrics_from_args("least_privilege_tool", args)
+    with metrics.stage("load usage report", unit="policies") as stage:
+        usage_map, coverage_map = load_usage_tables(args.usage)
+        stage.items = len(usage_map)
+        stage.bytes_read = file_bytes([args.usage])
+
+    resources = None
+    if args.resources:
+        with metrics.stage("load resources", unit="events") as stage:
+            resources, resource_stats = load_resource_index(args.resources)
+            stage.items = resource_stats.rows
+            stage.bytes_read = file_bytes([args.resources])
+        reporter.info(f"Loaded {resources.describe()} from {args.resources}")
+
+    with metrics.stage("list policies", unit="policies") as stage:
+        if args.snapshot:
+            kinds = ("managed", "inline") if args.snapshot_kind == "all" else (args.snapshot_kind,)
+            policies = SnapshotReader(args.snapshot).policy_documents(kinds)
+            stage.bytes_read = file_bytes([args.snapshot])
+        else:
+            policies = list_policy_files(args.policies)
+        stage.items = len(policies)
+
+    cache = ResultCache(args.cache_dir, "refine", enabled=not args.no_cache)
+    with metrics.stage("refine", items=len(policies), unit="policies") as stage:
+        refine_folder(policies, usage_map, coverage_map, args.output, args.workers, cache, args.summary_format,
+                      reporter, args.flatten, resources, args.narrow_resources, args.resource_limit,
+                      dedup=not args.no_dedup)
+        stage.bytes_read = file_bytes(policy for _, policy in policies)
+        stage.bytes_written = tree_bytes(args.output)
+    cache.evict(args.cache_max_age_days)
+    metrics.record_cache("refine", cache)
+    reporter.info(f"♻️  Cache: {cache.describe()}")
+    reporter.flush()
+    finish(metrics, args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+import os
+import io
+import re
+import json
+import time
+import pstats
+import tempfile
+import argparse
+import cProfile
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# ---------- Run metrics (per-stage timings and counters) ----------
+#
+# Each CLI records its stages (wall + CPU seconds, items processed, bytes read and
+# written) and free-form counters (cache hits, events streamed, ...) into a RunMetrics,
+# then writes them with --metrics-out:
+#
+#   *.json   one JSON document per run
+#   *.prom   Prometheus textfile-collector format (written atomically, as the
+#            node_exporter textfile collector expects)
+#
+# --profile-stage NAME wraps that one stage in cProfile, dumps the stats next to the
+# metrics (or to --profile-out) and prints the top functions by cumulative time.
+
+METRIC_PREFIX = "iam_lp"
+PROFILE_TOP = 25
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    items: int = 0
+    unit: str = "items"
+    bytes_read: int = 0
+    bytes_written: int = 0
+
+    @property
+    def items_per_s(self) -> float:
+        return self.items / self.wall_s if self.wall_s > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "items_per_s": round(self.items_per_s, 1)}
+
+
+def file_bytes(paths: Iterable[object]) -> int:
+    """Total size of the given paths; non-path items (parsed documents) and missing files count 0."""
+    total = 0
+    for path in paths:
+        if isinstance(path, (str, os.PathLike)):
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                continue
+    return total
+
+
+def tree_bytes(folder: str) -> int:
+    """Total size of the files directly inside `folder` (outputs of a refine step)."""
+    if not os.path.isdir(folder):
+        return 0
+    return file_bytes(os.path.join(folder, name) for name in os.listdir(folder))
+
+
+class RunMetrics:
+    """
+    Stages and counters of one tool run. stage() is a context manager yielding the
+    StageMetrics, so callers fill in items / bytes once they know them.
+    """
+
+    def __init__(self, tool: str, profile_stage: Optional[str] = None,
+                 profile_out: Optional[str] = None) -> None:
+        self.tool = tool
+        self.started = time.time()
+        self.stages: List[StageMetrics] = []
+        self.counters: Dict[str, float] = {}
+        self.profile_stage = profile_stage
+        self.profile_out = profile_out
+        self.profiled = False
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0, unit: str = "items") -> Iterator[StageMetrics]:
+        stage = StageMetrics(name, items=items, unit=unit)
+        profiler = cProfile.Profile() if self._should_profile(name) else None
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            stage.wall_s = round(time.perf_counter() - wall0, 6)
+            stage.cpu_s = round(time.process_time() - cpu0, 6)
+            self.stages.append(stage)
+            if profiler:
+                self._dump_profile(name, profiler)
+
+    def count(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_cache(self, name: str, cache) -> None:
+        """Hit / miss counters of a result_cache.ResultCache."""
+        if cache is not None and cache.enabled:
+            self.count(f"{name}_cache_hits", cache.hits)
+            self.count(f"{name}_cache_misses", cache.misses)
+
+    # ----- profiling
+
+    def _should_profile(self, name: str) -> bool:
+        # the first stage whose name starts with --profile-stage (run_all labels carry suffixes)
+        return bool(self.profile_stage) and not self.profiled and name.startswith(self.profile_stage)
+
+    def _dump_profile(self, name: str, profiler: cProfile.Profile) -> None:
+        self.profiled = True
+        out = self.profile_out or f"{self.tool}.{_slug(name)}.prof"
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        profiler.dump_stats(out)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"\n🔬 Profile of stage '{name}' → {out}")
+        print(buf.getvalue())
+
+    # ----- output
+
+    def to_dict(self) -> Dict:
+        return {
+            "tool": self.tool,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "wall_s": round(sum(s.wall_s for s in self.stages), 6),
+            "cpu_s": round(sum(s.cpu_s for s in self.stages), 6),
+            "stages": [s.to_dict() for s in self.stages],
+            "counters": dict(self.counters),
+        }
+
+    def to_prometheus(self) -> str:
+        tool = _label(self.tool)
+        lines: List[str] = []
+
+        def family(metric: str, kind: str, help_text: str, samples: Iterable) -> None:
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {kind}")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{metric}{{{labels}}} {_number(value)}")
+
+        per_stage = [(f'tool="{tool}",stage="{_label(s.name)}"', s) for s in self.stages]
+        family("stage_wall_seconds", "gauge", "Wall-clock seconds per stage.",
+               [(labels, s.wall_s) for labels, s in per_stage])
+        family("stage_cpu_seconds", "gauge", "CPU seconds (this process) per stage.",
+               [(labels, s.cpu_s) for labels, s in per_stage])
+        family("stage_items", "gauge", "Items (policies, events, rows) processed per stage.",
+               [(f'{labels},unit="{_label(s.unit)}"', s.items) for labels, s in per_stage])
+        family("stage_items_per_second", "gauge", "Stage throughput.",
+               [(f'{labels},unit="{_label(s.unit)}"', s.items_per_s) for labels, s in per_stage])
+        family("stage_bytes_read", "gauge", "Bytes read per stage.",
+               [(labels, s.bytes_read) for labels, s in per_stage])
+        family("stage_bytes_written", "gauge", "Bytes written per stage.",
+               [(labels, s.bytes_written) for labels, s in per_stage])
+        family("counter", "gauge", "Run counters (cache hits, events streamed, ...).",
+               [(f'tool="{tool}",name="{_label(k)}"', v) for k, v in sorted(self.counters.items())])
+        family("run_wall_seconds", "gauge", "Wall-clock seconds of all stages.",
+               [(f'tool="{tool}"', sum(s.wall_s for s in self.stages))])
+        family("run_timestamp_seconds", "gauge", "Unix time the run started.",
+               [(f'tool="{tool}"', self.started)])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """JSON, or Prometheus textfile format for a .prom path; replaced atomically."""
+        text = self.to_prometheus() if path.endswith(".prom") else json.dumps(self.to_dict(), indent=2) + "\n"
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def describe(self) -> str:
+        lines = ["⏱  Stage metrics"]
+        for s in self.stages:
+            rate = f"{s.items_per_s:>12,.0f} {s.unit}/s" if s.items else ""
+            lines.append(f"  {s.name:<40} wall {s.wall_s:8.3f}s  cpu {s.cpu_s:8.3f}s  {rate}")
+        lines.append(f"  {'total':<40} wall {sum(s.wall_s for s in self.stages):8.3f}s")
+        return "\n".join(lines)
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", name).strip("_") or "stage"
+
+
+# ---------- CLI helpers ----------
+
+def add_metrics_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--metrics-out", default=None,
+                    help="Write per-stage timings and counters here (.json, or .prom for the "
+                         "Prometheus textfile collector)")
+    ap.add_argument("--profile-stage", default=None,
+                    help="Run this stage under cProfile and print the hottest functions")
+    ap.add_argument("--profile-out", default=None,
+                    help="Where to dump the --profile-stage stats (default: <tool>.<stage>.prof)")
+
+
+def metrics_from_args(tool: str, args: argparse.Namespace) -> RunMetrics:
+    return RunMetrics(tool, args.profile_stage, args.profile_out)
+
+
+def finish(metrics: RunMetrics, args: argparse.Namespace) -> None:
+    """Print the stage table and write --metrics-out if given."""
+    print(f"\n{metrics.describe()}")
+    if metrics.profile_stage and not metrics.profiled:
+        names = ", ".join(s.name for s in metrics.stages)
+        print(f"⚠️  No stage matched --profile-stage {metrics.profile_stage!r} (stages: {names})")
+    if args.metrics_out:
+        metrics.write(args.metrics_out)
+        print(f"📈 Metrics → {args.metrics_out}")
@@ -0,0 +1,65 @@
+import os
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, TypeVar
+
+# ---------- Ordered, chunked fan-out over a process pool ----------
+#
+# Policies are sharded into contiguous chunks (work units) and each chunk is handled by
+# one worker call. Results come back in input order whatever the number of workers, so
+# reports and summaries built from them are identical to a serial run.
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+MAX_CHUNK_SIZE = 256
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """0 / None -> one worker per CPU; negative values are treated as 1."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def chunked(items: Sequence[T], size: int) -> List[List[T]]:
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def default_chunk_size(n_items: int, workers: int) -> int:
+    # ~4 work units per worker keeps the pool busy without per-item IPC overhead
+    return max(1, min(MAX_CHUNK_SIZE, -(-n_items // (workers * 4))))
+
+
+def imap_chunks(fn: Callable[[List[T]], List[R]],
+                items: Iterable[T],
+                workers: int = 1,
+                chunk_size: Optional[int] = None,
+                initializer: Optional[Callable[..., None]] = None,
+                initargs: tuple = ()) -> Iterator[R]:
+    """
+    Apply `fn` to chunks of `items` and yield the per-item results in input order.
+
+    `fn` must be a module-level function taking a list of items and returning one
+    result per item. `initializer(*initargs)` runs once per worker process (and once
+    in-process for the serial path) to install shared read-only state such as a
+    usage index, so it is not pickled with every work unit.
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = resolve_workers(workers)
+    size = chunk_size or default_chunk_size(len(items), workers)
+    chunks = chunked(items, size)
+
+    if workers == 1 or len(chunks) == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for chunk in chunks:
+            yield from fn(chunk)
+        return
+
+    # imported here: multiprocessing is a noticeable part of CLI startup and serial runs never need it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             initializer=initializer, initargs=initargs) as pool:
+        for results in pool.map(fn, chunks):
+            yield from results
@@ -0,0 +1,124 @@
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+from result_cache import content_hash
+
+# ---------- Cross-policy deduplication ----------
+#
+# Accounts hold many copies of the same document (AWSLambdaBasicExecutionRole-<uuid>
+# inline policies, one per function). Documents are reduced to a canonical form:
+#
+#   - Statement is always a list; every other single-element list is collapsed to its
+#     element ("Action": ["s3:GetObject"] == "Action": "s3:GetObject")
+#   - Action / NotAction are lowercased, de-duplicated and sorted (IAM action names are
+#     case-insensitive); other lists (Resource, condition values, ...) are sorted
+#   - key order and whitespace do not matter (canonical JSON)
+#
+# refine groups its inputs by the hash of that form (plus the used / covered actions),
+# refines one representative per group (the first file in input order) and writes the
+# result for every file of the group. Copies that differ only in case or ordering
+# therefore share the representative's spelling. Statement order and Sid are kept as
+# part of the identity.
+#
+# compare needs less: its findings depend only on the action strings, so it groups by
+# the exact set of actions and output stays byte-identical. The per-function
+# AWSLambdaBasicExecutionRole copies differ in Resource and share one compare.
+
+T = TypeVar("T")
+
+_ACTION_KEYS = ("Action", "NotAction")
+
+
+def _canonical_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _canonical_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [_canonical_value(item) for item in value]
+        if len(items) == 1:
+            return items[0]
+        # sort by canonical JSON so mixed element types compare
+        return sorted(items, key=content_hash)
+    return value
+
+
+def canonical_statement(statement: Any) -> Any:
+    if not isinstance(statement, dict):
+        return statement
+    canonical = {}
+    for key, value in statement.items():
+        if key in _ACTION_KEYS:
+            names = [value] if isinstance(value, str) else value if isinstance(value, list) else None
+            if names is not None and all(isinstance(name, str) for name in names):
+                unique = sorted({name.strip().lower() for name in names})
+                canonical[key] = unique[0] if len(unique) == 1 else unique
+                continue
+        canonical[key] = _canonical_value(value)
+    return canonical
+
+
+def canonical_policy(policy: Dict) -> Dict:
+    """Canonical form of a policy document (see module comment)."""
+    canonical = {key: _canonical_value(value) for key, value in policy.items() if key != "Statement"}
+    statements = policy.get("Statement", [])
+    if not isinstance(statements, list):
+        statements = [statements]
+    canonical["Statement"] = [canonical_statement(statement) for statement in statements]
+    return canonical
+
+
+def canonical_hash(policy: Dict) -> str:
+    """Equal for documents that grant the same thing up to case, ordering and list wrapping."""
+    return content_hash(canonical_policy(policy))
+
+
+class DocumentGroups:
+    """
+    Input positions grouped by key. Groups are numbered in order of their first member
+    (the representative), so evaluating the representatives in group order visits the
+    inputs in their original order.
+    """
+
+    def __init__(self, keys: Iterable[Hashable]) -> None:
+        index: Dict[Hashable, int] = {}
+        self.group_of: List[int] = []
+        self.first: List[int] = []
+        for position, key in enumerate(keys):
+            group = index.get(key)
+            if group is None:
+                group = index[key] = len(self.first)
+                self.first.append(position)
+            self.group_of.append(group)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    @property
+    def duplicates(self) -> int:
+        """Inputs that reuse another input's result."""
+        return len(self.group_of) - len(self.first)
+
+    def representatives(self, items: Sequence[T]) -> List[T]:
+        return [items[position] for position in self.first]
+
+    def members(self) -> List[List[int]]:
+        """Input positions per group, representative first."""
+        members: List[List[int]] = [[] for _ in self.first]
+        for position, group in enumerate(self.group_of):
+            members[group].append(position)
+        return members
+
+    def fan_out(self, results: Iterable[T]) -> Iterator[Tuple[int, T, bool]]:
+        """
+        One result per group (in group order) -> (input position, result, is_representative)
+        for every input, in input order. Streams: an input is yielded as soon as the
+        result of its group has arrived.
+        """
+        known: List[T] = []
+        position = 0
+        total = len(self.group_of)
+        for group, result in enumerate(results):
+            known.append(result)
+            end = self.first[group + 1] if group + 1 < len(self.first) else total
+            while position < end:
+                member_group = self.group_of[position]
+                yield position, known[member_group], position == self.first[member_group]
+                position += 1
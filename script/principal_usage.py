@@ -0,0 +1,228 @@
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from event_stream import DEFAULT_CHUNK_SIZE, StreamStats, iter_event_chunks
+from hive_struct import STRUCT_CACHE_SIZE, struct_field
+from iam_snapshot import SnapshotReader
+from usage_index import UsageIndex
+
+# ---------- Per-principal usage attribution ----------
+#
+# A single global used-set marks s3:GetObject as "Used" for every policy as soon as
+# anybody called it. Here events are attributed to the principal in `useridentity`
+# while streaming, so each policy can be checked against the usage of the principals
+# that actually hold it:
+#
+#   inline policy  role_<name>_<policy>.json   -> role/<name>
+#   managed policy (snapshot attachments)      -> every user/role/group it is attached to
+#   group                                      -> its member users
+#
+# Memory is bounded by distinct (principal, event) pairs, not by the number of events:
+# every distinct (eventsource, eventname) gets a small int id, each principal holds a
+# sorted array('I') of the ids it used, and each chunk is de-duplicated before merging.
+
+PRINCIPAL_TYPES = ("user", "role", "group")
+
+MAX_CACHED_INDEXES = 4096
+
+
+def identity_arn(useridentity: str) -> str:
+    """ARN of the calling identity from a useridentity value (Hive-struct text or JSON)."""
+    return struct_field(useridentity, "arn") or ""
+
+
+def principal_key(arn: str) -> str:
+    """
+    'arn:aws:iam::1:user/path/alice'             -> 'user/alice'
+    'arn:aws:sts::1:assumed-role/Deploy/session' -> 'role/Deploy'
+    Anything else (root, federated users, services) keeps its ARN resource part.
+    """
+    if not arn:
+        return ""
+    resource = arn.split(":", 5)[-1]
+    kind, _, rest = resource.partition("/")
+    if kind == "assumed-role":
+        return "role/" + rest.split("/", 1)[0]
+    if kind in PRINCIPAL_TYPES and rest:
+        return f"{kind}/{rest.rsplit('/', 1)[-1]}"
+    return resource
+
+
+@lru_cache(maxsize=STRUCT_CACHE_SIZE)
+def identity_principal(useridentity: str) -> str:
+    """Principal key for a raw useridentity value (memoized: identities repeat across events)."""
+    return principal_key(identity_arn(useridentity))
+
+
+class PrincipalUsage:
+    """
+    Principal -> used events, plus the overall UsageIndex of every event seen.
+    usage_for(principals) returns a UsageIndex restricted to those principals.
+    """
+
+    def __init__(self) -> None:
+        self.overall = UsageIndex()
+        self._event_ids: Dict[Tuple[str, str], int] = {}
+        self._events: List[Tuple[str, str]] = []
+        self._by_principal: Dict[str, array] = {}
+        self.unattributed_events = 0
+        self._indexes: "OrderedDict[FrozenSet[str], UsageIndex]" = OrderedDict()
+
+    def _event_id(self, eventsource: str, eventname: str) -> int:
+        key = (eventsource, eventname)
+        ident = self._event_ids.get(key)
+        if ident is None:
+            ident = len(self._events)
+            self._event_ids[key] = ident
+            self._events.append(key)
+        return ident
+
+    def add_chunk(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """Merge (useridentity, eventsource, eventname) rows."""
+        self.add_attributed((identity_principal(identity), eventsource, eventname)
+                            for identity, eventsource, eventname in set(rows))
+
+    def add_attributed(self, rows: Iterable[Tuple[str, str, str]]) -> None:
+        """Merge (principal key, eventsource, eventname) rows; '' = unattributed."""
+        pending: Dict[str, Set[int]] = {}
+        event_ids: Dict[Tuple[str, str], int] = {}
+        for principal, eventsource, eventname in rows:
+            event = (eventsource, eventname)
+            ident = event_ids.get(event)
+            if ident is None:
+                if not eventname.strip():
+                    continue
+                self.overall.add_event(eventsource, eventname)
+                ident = event_ids[event] = self._event_id(eventsource, eventname)
+            if not principal:
+                self.unattributed_events += 1
+                continue
+            pending.setdefault(principal, set()).add(ident)
+
+        for principal, ids in pending.items():
+            current = self._by_principal.get(principal)
+            if current is not None:
+                ids.update(current)
+            self._by_principal[principal] = array("I", sorted(ids))
+        if pending:
+            self._indexes.clear()
+
+    def principals(self) -> List[str]:
+        return sorted(self._by_principal)
+
+    def __contains__(self, principal: str) -> bool:
+        return principal in self._by_principal
+
+    def usage_for(self, principals: Iterable[str]) -> UsageIndex:
+        """UsageIndex of the events used by any of `principals` (memoized per principal set)."""
+        key = frozenset(principals)
+        index = self._indexes.get(key)
+        if index is not None:
+            self._indexes.move_to_end(key)
+            return index
+        ids: Set[int] = set()
+        for principal in key:
+            ids.update(self._by_principal.get(principal, ()))
+        index = UsageIndex()
+        index.add_events(self._events[i] for i in sorted(ids))
+        self._indexes[key] = index
+        if len(self._indexes) > MAX_CACHED_INDEXES:
+            self._indexes.popitem(last=False)
+        return index
+
+    def describe(self) -> str:
+        pairs = sum(len(ids) for ids in self._by_principal.values())
+        return (f"{len(self._by_principal)} principals, {pairs} principal/event pairs, "
+                f"{len(self._events)} distinct attributed events")
+
+
+def load_principal_usage(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[PrincipalUsage, StreamStats]:
+    """Stream an event source once (useridentity, eventsource, eventname) into a PrincipalUsage."""
+    stats = StreamStats(path=path)
+    usage = PrincipalUsage()
+    for chunk in iter_event_chunks(path, ("useridentity", "eventsource", "eventname"), chunk_size, stats):
+        usage.add_chunk(chunk)
+    return usage, stats
+
+
+# ---------- Policy -> principals ----------
+
+class PolicyPrincipals:
+    """Which principals hold which policy file (inline owner, managed attachments, group members)."""
+
+    def __init__(self) -> None:
+        self.holders: Dict[str, Set[str]] = {}
+        self.members: Dict[str, Set[str]] = {}
+
+    def add(self, policy_file: str, principal: str) -> None:
+        self.holders.setdefault(policy_file, set()).add(principal)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Union[str, SnapshotReader]) -> "PolicyPrincipals":
+        reader = snapshot if isinstance(snapshot, SnapshotReader) else SnapshotReader(snapshot)
+        attribution = cls()
+        for rec in reader.iter_records(("inline", "principal")):
+            if rec["kind"] == "inline":
+                attribution.add(rec["name"], rec["principal"])
+                continue
+            for policy_file in rec.get("attached", []):
+                attribution.add(policy_file, rec["name"])
+            for group in rec.get("groups", []):
+                attribution.members.setdefault(f"group/{group}", set()).add(rec["name"])
+        return attribution
+
+    def principals_for(self, policy_file: str, known: FrozenSet[str] = frozenset()) -> Optional[Set[str]]:
+        """
+        Principals whose usage counts for `policy_file`, or None if it cannot be attributed.
+        Inline files not in the snapshot are resolved from their name against `known` principals.
+        """
+        holders = self.holders.get(policy_file)
+        if holders is None:
+            owner = inline_owner(policy_file, known)
+            if owner is None:
+                return None
+            holders = {owner}
+        expanded = set(holders)
+        for principal in holders:
+            expanded.update(self.members.get(principal, ()))
+        return expanded
+
+
+def inline_owner(policy_file: str, known: Union[Set[str], FrozenSet[str]]) -> Optional[str]:
+    """
+    'role_Deploy_s3.json' -> 'role/Deploy'. Entity and policy names may both contain '_',
+    so the longest candidate that is a `known` principal wins (one set lookup per '_');
+    without a match the name up to the first '_' is used.
+    """
+    kind, sep, rest = policy_file.partition("_")
+    if not sep or kind not in PRINCIPAL_TYPES or "_" not in rest:
+        return None
+    cuts = [i for i, ch in enumerate(rest) if ch == "_"]
+    for cut in reversed(cuts):
+        candidate = f"{kind}/{rest[:cut]}"
+        if candidate in known:
+            return candidate
+    return f"{kind}/{rest[:cuts[0]]}"
+
+
+def attribute_policies(files: List[Tuple[str, Union[str, Dict]]], usage: PrincipalUsage,
+                       attribution: Optional[PolicyPrincipals] = None
+                       ) -> Tuple[List[Tuple[str, Union[str, Dict], UsageIndex]], int]:
+    """
+    Pair every (file, policy) with the UsageIndex of its principals. Files that cannot be
+    attributed fall back to the overall index. Returns (items, number attributed).
+    """
+    attribution = attribution or PolicyPrincipals()
+    known = frozenset(usage.principals())
+    items: List[Tuple[str, Union[str, Dict], UsageIndex]] = []
+    attributed = 0
+    for file, policy in files:
+        principals = attribution.principals_for(file, known)
+        if principals is None:
+            items.append((file, policy, usage.overall))
+        else:
+            items.append((file, policy, usage.usage_for(principals)))
+            attributed += 1
+    return items, attributed
@@ -0,0 +1,124 @@
+import sys
+import time
+import argparse
+from collections import Counter
+from typing import Iterable, List, Optional, TextIO
+
+# ---------- Console reporting (log levels + buffered output) ----------
+#
+# Per-action and per-policy lines are the bulk of console output on large accounts
+# and can cost more than the analysis itself. A Reporter decides what is printed:
+#
+#   quiet     warnings, output paths and the final aggregate line per step
+#   progress  (default) status messages plus one aggregate line every N policies
+#   detail    everything, including the per-action ✅/❌/⚠️ lines
+#
+# Detail lines are collected and written to stdout in large blocks instead of one
+# print() per line; status, warning and progress lines flush straight away (with any
+# detail lines before them) so they appear when they happen. Callers check
+# `reporter.detailed` before formatting detail lines, so quieter levels do not even
+# build the strings.
+
+LOG_LEVELS = ("quiet", "progress", "detail")
+DEFAULT_LOG_LEVEL = "progress"
+DEFAULT_PROGRESS_EVERY = 1000
+
+# Flush the buffer once it holds this many characters
+BUFFER_CHARS = 64 * 1024
+
+
+class Reporter:
+    def __init__(self, level: str = DEFAULT_LOG_LEVEL, progress_every: int = DEFAULT_PROGRESS_EVERY,
+                 stream: Optional[TextIO] = None) -> None:
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level {level!r} (choose from {', '.join(LOG_LEVELS)})")
+        self.level = level
+        self.progress_every = max(0, progress_every)
+        self._stream = stream
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self.policies = 0
+        self.statuses: Counter = Counter()
+        self._start = time.perf_counter()
+
+    @property
+    def detailed(self) -> bool:
+        return self.level == "detail"
+
+    @property
+    def verbose(self) -> bool:
+        return self.level != "quiet"
+
+    # ----- output
+
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= BUFFER_CHARS:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            # resolved at write time so contextlib.redirect_stdout keeps working
+            stream = self._stream or sys.stdout
+            stream.write("\n".join(self._buffer) + "\n")
+            stream.flush()
+            self._buffer.clear()
+            self._buffered = 0
+
+    def detail(self, *lines: str) -> None:
+        if self.detailed:
+            for line in lines:
+                self._write(line)
+
+    def info(self, message: str) -> None:
+        if self.verbose:
+            self._write(message)
+            self.flush()
+
+    def warn(self, message: str) -> None:
+        self._write(message)
+        self.flush()
+
+    # ----- progress
+
+    def reset(self) -> None:
+        """Start counting a new batch of policies (one compare or refine step)."""
+        self.flush()
+        self.policies = 0
+        self.statuses = Counter()
+        self._start = time.perf_counter()
+
+    def tick(self, statuses: Iterable[str] = ()) -> None:
+        """One policy done; `statuses` are its finding statuses (Used, Unused, ...)."""
+        self.policies += 1
+        self.statuses.update(statuses)
+        if self.level == "progress" and self.progress_every and self.policies % self.progress_every == 0:
+            self._write(f"  … {self.describe()}")
+            self.flush()
+
+    def describe(self) -> str:
+        seconds = time.perf_counter() - self._start
+        rate = self.policies / seconds if seconds > 0 else 0.0
+        line = f"{self.policies:,} policies ({rate:,.0f}/s)"
+        if self.statuses:
+            line += ": " + ", ".join(f"{status} {n:,}" for status, n in sorted(self.statuses.items()))
+        return line
+
+    def done(self, label: str) -> None:
+        """Aggregate line for the batch, at every level, then flush."""
+        self._write(f"{label} {self.describe()}")
+        self.flush()
+
+
+def add_reporting_arguments(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--log-level", choices=LOG_LEVELS, default=DEFAULT_LOG_LEVEL,
+                    help="quiet: final summary only; progress: periodic aggregates (default); "
+                         "detail: per-policy / per-action lines")
+    ap.add_argument("--progress-every", type=int, default=DEFAULT_PROGRESS_EVERY,
+                    help=f"With --log-level progress, print an aggregate every N policies "
+                         f"(default: {DEFAULT_PROGRESS_EVERY}; 0 = never)")
+
+
+def reporter_from_args(args: argparse.Namespace) -> Reporter:
+    return Reporter(args.log_level, args.progress_every)
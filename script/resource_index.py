@@ -0,0 +1,352 @@
+import re
+import sys
+import heapq
+import hashlib
+import argparse
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from event_stream import DEFAULT_CHUNK_SIZE, StreamStats, iter_event_chunks
+from hive_struct import parse_struct
+from usage_index import action_keys
+from usage_rollups import split_event
+from wildcard_matcher import is_wildcard
+
+# ---------- Resource-level usage index ----------
+#
+# CloudTrail events list the resources they touched in the `resources` column
+# ([{accountid=..., type=AWS::S3::Bucket, arn=arn:aws:s3:::bucket}] in Athena exports,
+# a JSON list in CloudTrail JSON-lines). ResourceIndex maps every used (service, action)
+# to the ARNs it was observed on, so refinement can narrow Resource as well as Action.
+#
+# ARNs are interned once across all actions; each action keeps a sorted list of them.
+# That sorted list *is* the prefix trie over ARN segments (split after ':' and '/'):
+# every trie node is the contiguous range of ARNs sharing its prefix, found by bisect,
+# so no per-node objects exist and millions of ARNs cost one reference per
+# (action, ARN). Queries:
+#
+#   matching(pattern)   observed ARNs a policy Resource pattern grants – the literal
+#                       prefix before the first wildcard selects the range, only that
+#                       range is checked against the glob
+#   suggest(limit)      at most `limit` concrete ARNs / 'prefix*' patterns covering every
+#                       observed ARN, expanding the largest trie nodes first; the walk
+#                       starts at each Resource pattern's literal prefix, so a suggestion
+#                       is never wider than the Resource it narrows
+
+DEFAULT_RESOURCE_LIMIT = 10
+# (actions, patterns, limit) suggestions one ResourceIndex remembers (least recently used go first)
+SUGGESTION_CACHE_SIZE = 16384
+
+_MAX_CHAR = chr(sys.maxunicode)
+# An ARN segment ends after ':' or '/'
+_BOUNDARY = re.compile(r"[:/]")
+
+# A trie node: (prefix, lo, hi, is_leaf) – the ARNs arns[lo:hi] sharing `prefix`
+Node = Tuple[str, int, int, bool]
+
+
+def compile_resource_pattern(pattern: str) -> "re.Pattern[str]":
+    """IAM Resource glob -> anchored regex. ARN matching is case-sensitive."""
+    return re.compile("".join(".*" if ch == "*" else "." if ch == "?" else re.escape(ch) for ch in pattern),
+                      re.DOTALL)
+
+
+def _literal_prefix(pattern: str) -> str:
+    cut = [i for i in (pattern.find("*"), pattern.find("?")) if i >= 0]
+    return pattern[:min(cut)] if cut else pattern
+
+
+class ArnSet:
+    """Sorted, de-duplicated ARNs with prefix-trie queries (see module comment)."""
+
+    __slots__ = ("arns",)
+
+    def __init__(self, arns: Iterable[str]) -> None:
+        self.arns: List[str] = sorted(set(arns))
+
+    @classmethod
+    def from_sorted(cls, arns: List[str]) -> "ArnSet":
+        """Wrap a list that is already sorted and de-duplicated (e.g. a matching() result)."""
+        arn_set = cls(())
+        arn_set.arns = arns
+        return arn_set
+
+    def __len__(self) -> int:
+        return len(self.arns)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.arns)
+
+    def __contains__(self, arn: str) -> bool:
+        i = bisect_left(self.arns, arn)
+        return i < len(self.arns) and self.arns[i] == arn
+
+    def prefix_range(self, prefix: str, lo: int = 0) -> Tuple[int, int]:
+        """[lo, hi) of the ARNs starting with `prefix` – one trie node."""
+        start = bisect_left(self.arns, prefix, lo)
+        return start, bisect_left(self.arns, prefix + _MAX_CHAR, start)
+
+    def matching(self, pattern: str) -> List[str]:
+        """Observed ARNs an IAM Resource pattern ('*', 'arn:aws:s3:::b/*', exact ARN) grants."""
+        pattern = pattern.strip()
+        if not is_wildcard(pattern):
+            return [pattern] if pattern in self else []
+        prefix = _literal_prefix(pattern)
+        lo, hi = self.prefix_range(prefix)
+        if pattern == prefix + "*":
+            return self.arns[lo:hi]
+        regex = compile_resource_pattern(pattern)
+        return [arn for arn in self.arns[lo:hi] if regex.fullmatch(arn)]
+
+    # ----- trie walk
+
+    def _children(self, prefix: str, lo: int, hi: int) -> List[Node]:
+        """Child nodes (prefix, lo, hi, is_leaf) of the node `prefix` = arns[lo:hi]."""
+        children = []
+        depth = len(prefix)
+        i = lo
+        while i < hi:
+            arn = self.arns[i]
+            m = _BOUNDARY.search(arn, depth)
+            if m is None or m.end() == len(arn):
+                children.append((arn, i, i + 1, True))
+                i += 1
+                continue
+            child = arn[:m.end()]
+            _, j = self.prefix_range(child, i)
+            children.append((child, i, j, False))
+            i = j
+        return children
+
+    def _descend(self, node: Node) -> Tuple[Node, List[Node]]:
+        """Follow single-child chains ('arn:' -> 'arn:aws:' -> ...); returns (node, its children)."""
+        while not node[3]:
+            children = self._children(*node[:3])
+            if len(children) != 1:
+                return node, children
+            node = children[0]
+        return node, []
+
+    def _pattern_roots(self, patterns: Sequence[str]) -> Tuple[List[Node], Dict[Node, List[Node]]]:
+        """
+        The nodes the walk starts from, one per Resource pattern, so no entry is ever
+        wider than the pattern its ARNs matched: the literal-prefix node of 'prefix*',
+        the ARN itself for an exact ARN, and for any other glob a node emitted as the
+        glob itself whose only expansion is its matching ARNs (returned as `whole`).
+        """
+        prefixed: List[Node] = []
+        others: List[Node] = []
+        whole: Dict[Node, List[Node]] = {}
+        for pattern in dict.fromkeys(p.strip() for p in patterns):
+            if not is_wildcard(pattern):
+                if pattern in self:
+                    i = bisect_left(self.arns, pattern)
+                    others.append((pattern, i, i + 1, True))
+                continue
+            prefix = _literal_prefix(pattern)
+            lo, hi = self.prefix_range(prefix)
+            if pattern == prefix + "*":
+                if lo < hi:
+                    prefixed.append((prefix, lo, hi, False))
+                continue
+            regex = compile_resource_pattern(pattern)
+            leaves = [(self.arns[i], i, i + 1, True) for i in range(lo, hi) if regex.fullmatch(self.arns[i])]
+            if leaves:
+                node = (pattern, lo, hi, False)
+                others.append(node)
+                whole[node] = leaves
+        # prefix ranges are nested or disjoint: keep the outermost ones, and drop the
+        # other roots that fall inside them
+        roots: List[Node] = []
+        for node in sorted(prefixed, key=lambda n: (n[1], -n[2])):
+            if not roots or node[1] >= roots[-1][2]:
+                roots.append(node)
+        spans = [(lo, hi) for _, lo, hi, _ in roots]
+        for node in others:
+            if not any(lo <= node[1] and node[2] <= hi for lo, hi in spans):
+                roots.append(node)
+        return roots, whole
+
+    def suggest(self, limit: int = DEFAULT_RESOURCE_LIMIT, patterns: Sequence[str] = ("*",)) -> List[str]:
+        """
+        At most `limit` Resource entries covering every ARN inside `patterns`: exact ARNs
+        where the budget allows, otherwise 'prefix*' for the trie nodes that could not be
+        expanded. A node is never shorter than its pattern's literal prefix, so when the
+        ARNs do not fit the result is the original pattern, never something wider.
+        """
+        if not self.arns:
+            return []
+        roots, whole = self._pattern_roots(patterns)
+        frontier: Set[Node] = set()
+        expandable: Dict[Node, List[Node]] = {}
+        heap: List[Tuple[int, Node]] = []
+        for root in roots:
+            if root in whole:
+                children = whole[root]
+            else:
+                root, children = self._descend(root)
+            frontier.add(root)
+            if children:
+                expandable[root] = children
+                heapq.heappush(heap, (root[1] - root[2] if root not in whole else -len(children), root))
+        while heap:
+            _, node = heapq.heappop(heap)
+            children = expandable.pop(node)
+            if len(frontier) - 1 + len(children) > max(1, limit):
+                continue
+            frontier.remove(node)
+            for child in children:
+                child, grandchildren = self._descend(child)
+                frontier.add(child)
+                if grandchildren:
+                    expandable[child] = grandchildren
+                    heapq.heappush(heap, (child[1] - child[2], child))
+        return sorted({prefix if leaf or (prefix, lo, hi, leaf) in whole else f"{prefix}*"
+                       for prefix, lo, hi, leaf in frontier})
+
+
+class ResourceIndex:
+    """
+    (service, action) -> ArnSet of observed resource ARNs.
+    Keys are the lowercased 'service:action' strings UsageIndex uses.
+    """
+
+    def __init__(self) -> None:
+        self._intern: Dict[str, str] = {}
+        self._pending: Dict[str, Set[str]] = {}
+        self._sets: Dict[str, ArnSet] = {}
+        self._suggestions: "OrderedDict[Tuple, Optional[List[str]]]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+
+    # ----- building
+
+    def add(self, service: str, action: str, arns: Iterable[str]) -> None:
+        key = f"{service}:{action.lower()}"
+        bucket = self._pending.get(key)
+        if bucket is None:
+            bucket = self._pending[key] = set(self._sets.pop(key, ()))
+        intern = self._intern.setdefault
+        for arn in arns:
+            bucket.add(intern(arn, arn))
+        self._suggestions.clear()
+        self._fingerprint = None
+
+    def _set(self, key: str) -> Optional[ArnSet]:
+        if key in self._pending:
+            self._sets[key] = ArnSet(self._pending.pop(key))
+        return self._sets.get(key)
+
+    # ----- queries
+
+    def arns_for(self, action: str) -> Optional[ArnSet]:
+        """Observed ARNs of a concrete 'service:Action' (None if it never named a resource)."""
+        return self._set(action_keys(action)[0])
+
+    def matching(self, action: str, patterns: Sequence[str]) -> List[str]:
+        arns = self.arns_for(action)
+        if arns is None:
+            return []
+        if len(patterns) == 1:
+            return arns.matching(patterns[0])
+        return sorted({arn for pattern in patterns for arn in arns.matching(pattern)})
+
+    def suggest(self, actions: Iterable[str], patterns: Sequence[str],
+                limit: int = DEFAULT_RESOURCE_LIMIT) -> Optional[List[str]]:
+        """
+        Narrowed Resource list for a statement granting `actions` on `patterns`: the
+        observed ARNs inside `patterns`, collapsed to at most `limit` entries. None when
+        any action has no observed resource there (e.g. List* calls CloudTrail logs
+        without resources) – the statement cannot be narrowed safely.
+        """
+        key = (tuple(sorted(set(actions))), tuple(patterns), limit)
+        if key in self._suggestions:
+            self._suggestions.move_to_end(key)
+            return self._suggestions[key]
+        matched = [self.matching(action, patterns) for action in key[0]]
+        if not all(matched):
+            suggestion = None
+        elif len(matched) == 1:
+            # already sorted and unique: walk it without re-sorting
+            suggestion = ArnSet.from_sorted(matched[0]).suggest(limit, patterns)
+        else:
+            suggestion = ArnSet(arn for arns in matched for arn in arns).suggest(limit, patterns)
+        self._suggestions[key] = suggestion
+        while len(self._suggestions) > SUGGESTION_CACHE_SIZE:
+            self._suggestions.popitem(last=False)
+        return suggestion
+
+    def fingerprint(self) -> str:
+        """Content hash (part of the refine cache key when resources are used)."""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            for key in sorted(set(self._sets) | set(self._pending)):
+                h.update(f"{key}\n".encode("utf-8"))
+                for arn in self._set(key):
+                    h.update(f"\t{arn}\n".encode("utf-8"))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def __len__(self) -> int:
+        return len(set(self._sets) | set(self._pending))
+
+    def describe(self) -> str:
+        return f"{len(self)} actions with resources, {len(self._intern):,} distinct ARNs"
+
+
+def resource_arns(resources: str) -> List[str]:
+    """ARNs in one `resources` value (Hive array text or JSON list); [] when empty."""
+    text = resources.strip()
+    if not text or text in ("[]", "null"):
+        return []
+    parsed = parse_struct(text, ("arn",))
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+    return [item["arn"] for item in parsed
+            if isinstance(item, dict) and isinstance(item.get("arn"), str) and item["arn"].startswith("arn:")]
+
+
+def load_resource_index(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[ResourceIndex, StreamStats]:
+    """Stream eventsource / eventname / resources once into a ResourceIndex."""
+    stats = StreamStats(path=path)
+    index = ResourceIndex()
+    for chunk in iter_event_chunks(path, ("eventsource", "eventname", "resources"), chunk_size, stats):
+        per_action: Dict[Tuple[str, str], Set[str]] = {}
+        for eventsource, eventname, resources in set(chunk):
+            if not eventname.strip():
+                continue
+            arns = resource_arns(resources)
+            if arns:
+                per_action.setdefault(split_event(eventsource, eventname), set()).update(arns)
+        for (service, action), arns in per_action.items():
+            if service:
+                index.add(service, action, arns)
+    return index, stats
+
+
+# ---------- CLI ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Show the resource ARNs each action was observed on.")
+    ap.add_argument("events", help="CloudTrail CSV / JSON-lines export with a resources column")
+    ap.add_argument("--action", action="append", default=[],
+                    help="Action to report, e.g. s3:GetObject (repeatable)")
+    ap.add_argument("--resource", default="*", help="Policy Resource pattern to match within (default: *)")
+    ap.add_argument("--limit", type=int, default=DEFAULT_RESOURCE_LIMIT,
+                    help=f"Maximum suggested Resource entries (default: {DEFAULT_RESOURCE_LIMIT})")
+    ap.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                    help=f"Rows read per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    args = ap.parse_args()
+
+    index, stats = load_resource_index(args.events, args.chunk_size)
+    print(f"Loaded {index.describe()} ({stats.describe()})")
+    for action in args.action:
+        matched = index.matching(action, [args.resource])
+        suggestion = index.suggest([action], [args.resource], args.limit)
+        print(f"\n{action}: {len(matched):,} observed ARNs in {args.resource}")
+        for entry in suggestion or ["(no observed resources – keep Resource as is)"]:
+            print(f"  {entry}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from typing import Any, Dict, Iterable, Optional
+
+# ---------- Content-addressed cache of per-policy results ----------
+#
+# Entries are keyed by the hash of the policy document plus the hash of the usage it was
+# evaluated against (and a format version plus the source of the analysis code), so an unchanged policy under unchanged usage
+# is never recomputed, while any edit to either side simply misses. Entries are small JSON
+# files under <root>/<namespace>/<k[:2]>/<k>.json, written atomically, so concurrent
+# workers can share one cache. A hit refreshes the entry's mtime; evict() removes entries
+# nobody has used for `max_age_days`.
+
+DEFAULT_CACHE_DIR = ".iam_cache"
+DEFAULT_MAX_AGE_DAYS = 30.0
+
+# Bump when the cached result format changes
+CACHE_VERSION = "1"
+
+# Modules whose code decides a namespace's results. Their source is hashed into every
+# key, so an upgrade that changes the analysis misses instead of serving old results.
+ANALYSIS_MODULES = {
+    "compare": ("compare_policy_usage", "effective_permissions", "usage_index", "wildcard_matcher"),
+    "refine": ("least_privilege_tool", "effective_permissions", "action_vocab", "resource_index",
+               "wildcard_matcher"),
+}
+
+
+def content_hash(*parts: Any) -> str:
+    """sha256 over the parts (str/bytes as-is, anything else as canonical JSON)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode("utf-8")
+        else:
+            data = json.dumps(part, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def code_version(modules: Iterable[str]) -> str:
+    """Hash of the source files of `modules` (siblings of this file); missing files count empty."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    sources = []
+    for module in modules:
+        try:
+            with open(os.path.join(here, f"{module}.py"), "rb") as f:
+                sources.append(f.read())
+        except OSError:
+            sources.append(b"")
+    return content_hash(*sources)
+
+
+def policy_hash(policy: Dict) -> str:
+    """Hash of a parsed policy document (key order and whitespace do not matter)."""
+    return content_hash(policy)
+
+
+class ResultCache:
+    """
+    On-disk cache for one kind of result (`namespace`, e.g. 'compare' or 'refine').
+    A disabled cache (--no-cache) misses on every get() and ignores put().
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, namespace: str = "default", enabled: bool = True) -> None:
+        self.root = os.path.join(root, namespace)
+        self.enabled = enabled
+        self.code = code_version(ANALYSIS_MODULES.get(namespace, ()))
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts: Any) -> str:
+        return content_hash(CACHE_VERSION, self.code, *parts)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path, None)  # mark as recently used for eviction
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def evict(self, max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> int:
+        """Delete entries not read or written within `max_age_days`. Returns the count removed."""
+        if not self.enabled or not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.unlink(path)
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def describe(self) -> str:
+        if not self.enabled:
+            return "cache disabled"
+        return f"{self.hits} hits, {self.misses} misses ({self.root})"
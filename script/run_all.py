@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
-import subprocess as sp
+import argparse
 import sys
 from pathlib import Path
+from typing import ContextManager, Dict, List, Tuple
+
+import compare_policy_usage as cpu
+import least_privilege_tool as lpt
+from metrics import RunMetrics, StageMetrics, add_metrics_arguments, file_bytes, finish, tree_bytes
+from parallel import resolve_workers
+from reporting import Reporter, add_reporting_arguments, reporter_from_args
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_AGE_DAYS, ResultCache
+from usage_index import UsageIndex, load_usage_index
 
 # --- paths (adjust only if your folders differ)
 ROOT = Path(__file__).resolve().parents[1]
@@ -36,11 +45,69 @@ TEST_CUSTOM   = ROOT / "test_refined_custom"
 TEST_NEW      = ROOT / "test_refined_new"
 TEST_MID60    = ROOT / "test_refined_mid60"                  # NEW: folder for the mid test case
 
-def sh(args):
-    print("\n$ " + " ".join(map(str, args)))
-    cp = sp.run(args, cwd=ROOT)
-    if cp.returncode != 0:
-        sys.exit(cp.returncode)
+# Per-policy result cache (content-hash keyed; see result_cache.py)
+CACHE_DIR     = ROOT / DEFAULT_CACHE_DIR
+
+# --- in-process pipeline state
+class Pipeline:
+    """
+    Runs every compare/refine step in this interpreter. Each policy file, counts file
+    and usage report is parsed at most once and shared across dataset variants;
+    wall/CPU time, items and bytes are recorded per stage (see metrics.py).
+    """
+
+    def __init__(self) -> None:
+        self._policies: Dict[Path, Dict] = {}
+        self._indexes: Dict[Path, UsageIndex] = {}
+        self._usage: Dict[Path, Tuple[lpt.UsageMap, lpt.CoverageMap]] = {}
+        self.metrics = RunMetrics("run_all")
+        self.reporter = Reporter()
+        self.workers = 1
+        self.flatten = False
+        self.dedup = True
+        self.compare_cache = ResultCache(str(CACHE_DIR), "compare", enabled=False)
+        self.refine_cache = ResultCache(str(CACHE_DIR), "refine", enabled=False)
+
+    def stage(self, label: str, items: int = 0, unit: str = "items") -> ContextManager[StageMetrics]:
+        return self.metrics.stage(label, items, unit)
+
+    def policy(self, path: Path) -> Dict:
+        if path not in self._policies:
+            self._policies[path] = cpu.load_policy(str(path))
+        return self._policies[path]
+
+    def load_policies(self) -> None:
+        with self.stage("parse policies", unit="policies") as stage:
+            files = cpu.list_policy_files(str(POLICIES_DIR), str(INLINE_DIR))
+            for _, path in files:
+                self.policy(Path(path))
+            stage.items = len(files)
+            stage.bytes_read = file_bytes(path for _, path in files)
+
+    def usage_index(self, counts_path: Path) -> UsageIndex:
+        if counts_path not in self._indexes:
+            with self.stage(f"load {counts_path.name}", unit="events") as stage:
+                index, stats = load_usage_index(str(counts_path))
+                stage.items = stats.rows
+                stage.bytes_read = file_bytes([counts_path])
+            print(f"Loaded {index.describe()} from {counts_path.name} ({stats.describe()})")
+            self._indexes[counts_path] = index
+        return self._indexes[counts_path]
+
+    def usage_maps(self, usage_csv: Path) -> Tuple[lpt.UsageMap, lpt.CoverageMap]:
+        if usage_csv not in self._usage:
+            with self.stage(f"load {usage_csv.name}", unit="policies") as stage:
+                self._usage[usage_csv] = lpt.load_usage_tables(str(usage_csv))
+                stage.items = len(self._usage[usage_csv][0])
+                stage.bytes_read = file_bytes([usage_csv])
+        return self._usage[usage_csv]
+
+    def remember_findings(self, usage_csv: Path, results: Dict[str, List[Tuple[str, str]]]) -> None:
+        """Register a freshly written usage report so refine steps skip re-reading it."""
+        self._usage[usage_csv] = lpt.usage_maps_from_findings(results)
+
+
+PIPELINE = Pipeline()
 
 def ensure_files():
     # NEW_REPORT and MID_REPORT are already usage CSVs; still check they exist
@@ -56,26 +123,58 @@ def ensure_files():
         d.mkdir(parents=True, exist_ok=True)
 
 def run_compare(counts_path: Path, out_csv: Path):
-    sh([
-        sys.executable, str(COMPARE),
-        "--counts", str(counts_path),
-        "--policies", str(POLICIES_DIR),
-        "--inline", str(INLINE_DIR),
-        "--output", str(out_csv),
-    ])
+    index = PIPELINE.usage_index(counts_path)
+    with PIPELINE.stage(f"compare → {out_csv.name}", unit="policies") as stage:
+        files = cpu.list_policy_files(str(POLICIES_DIR), str(INLINE_DIR))
+        if PIPELINE.workers == 1 or PIPELINE.dedup:
+            # reuse the documents parsed once up front (dedup parses every file here anyway);
+            # without dedup, workers parse their own shard
+            files = [(file, PIPELINE.policy(Path(path))) for file, path in files]
+        results = cpu.compare_policy_files(files, index, PIPELINE.workers, cache=PIPELINE.compare_cache,
+                                           reporter=PIPELINE.reporter, dedup=PIPELINE.dedup)
+        cpu.write_report_to_csv(results, str(out_csv))
+        stage.items = len(files)
+        stage.bytes_written = file_bytes([out_csv])
+    # The refine steps below read this report; hand it over without re-parsing the CSV
+    PIPELINE.remember_findings(out_csv, results)
     print(f"✅ Usage report → {out_csv}")
 
 def run_least_privilege(usage_csv: Path, output_dir: Path):
-    sh([
-        sys.executable, str(LEAST),
-        "--usage", str(usage_csv),
-        "--policies", str(POLICIES_DIR),
-        "--output", str(output_dir),
-    ])
+    usage_map, coverage_map = PIPELINE.usage_maps(usage_csv)
+    with PIPELINE.stage(f"refine → {output_dir.relative_to(ROOT)}", unit="policies") as stage:
+        policies = [(fname, PIPELINE.policy(Path(path)))
+                    for fname, path in lpt.list_policy_files(str(POLICIES_DIR))]
+        lpt.refine_folder(policies, usage_map, coverage_map, str(output_dir), PIPELINE.workers,
+                          PIPELINE.refine_cache, reporter=PIPELINE.reporter,
+                          flatten=PIPELINE.flatten, dedup=PIPELINE.dedup)
+        stage.items = len(policies)
+        stage.bytes_written = tree_bytes(str(output_dir))
     print(f"✨ Refined policies → {output_dir}")
 
 def main():
+    ap = argparse.ArgumentParser(description="Run compare + refine for every dataset variant in-process.")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Processes to shard policies across in each step (default: 1; 0 = one per CPU)")
+    ap.add_argument("--no-cache", action="store_true",
+                    help=f"Recompute everything; do not read or write the result cache ({CACHE_DIR.name}/)")
+    ap.add_argument("--cache-max-age-days", type=float, default=DEFAULT_MAX_AGE_DAYS,
+                    help=f"Evict cache entries unused for this many days (default: {DEFAULT_MAX_AGE_DAYS:g})")
+    ap.add_argument("--flatten", action="store_true",
+                    help="Legacy refine output: one Allow statement on Resource '*' per policy")
+    ap.add_argument("--no-dedup", action="store_true",
+                    help="Analyze every policy file separately, even identical copies")
+    add_metrics_arguments(ap)
+    add_reporting_arguments(ap)
+    args = ap.parse_args()
+    PIPELINE.flatten = args.flatten
+    PIPELINE.dedup = not args.no_dedup
+    PIPELINE.reporter = reporter_from_args(args)
+    PIPELINE.metrics.profile_stage, PIPELINE.metrics.profile_out = args.profile_stage, args.profile_out
+    PIPELINE.workers = resolve_workers(args.workers)
+    PIPELINE.compare_cache.enabled = PIPELINE.refine_cache.enabled = not args.no_cache
+
     ensure_files()
+    PIPELINE.load_policies()
 
     print("\n================ 1) MIT =================")
     run_compare(MIT_COUNTS, MIT_REPORT)
@@ -107,5 +206,14 @@ def main():
     print(f"- Test refined (Mid60):  {TEST_MID60}")
     print(f"- Test refined (New):    {TEST_NEW}")
 
+    for cache in (PIPELINE.compare_cache, PIPELINE.refine_cache):
+        cache.evict(args.cache_max_age_days)
+    print(f"\n♻️  Compare cache: {PIPELINE.compare_cache.describe()}")
+    print(f"♻️  Refine cache:  {PIPELINE.refine_cache.describe()}")
+
+    PIPELINE.metrics.record_cache("compare", PIPELINE.compare_cache)
+    PIPELINE.metrics.record_cache("refine", PIPELINE.refine_cache)
+    finish(PIPELINE.metrics, args)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from event_stream import DEFAULT_CHUNK_SIZE, StreamStats, iter_event_chunks
+from wildcard_matcher import WildcardMatcher
+
+# ---------- Service-qualified usage index ----------
+#
+# CloudTrail identifies the service by `eventsource` (s3.amazonaws.com), IAM policies
+# by the action prefix (s3:GetObject). The index stores used events keyed by the
+# normalized 'service:action' string so that s3:GetObject never matches an unrelated
+# service's GetObject. Inputs that carry no service at all (e.g. athena_event_counts.csv,
+# which only has eventname) land in a separate name-only set and match any service,
+# which is the best that can be done without a service column.
+
+# eventsource prefixes that differ from the IAM action prefix
+_EVENTSOURCE_ALIASES = {
+    "monitoring": "cloudwatch",
+    "tagging": "tag",
+}
+
+_EVENTSOURCE_SUFFIX = ".amazonaws.com"
+
+# Distinct action strings memoized by action_keys; bounded because the analysis
+# service feeds it arbitrary client documents for as long as it runs
+ACTION_CACHE_SIZE = 65536
+# Wildcard patterns whose coverage one UsageIndex remembers (least recently used go first)
+COVERAGE_CACHE_SIZE = 16384
+
+
+def service_from_eventsource(eventsource: str) -> str:
+    """'s3.amazonaws.com' -> 's3' (lowercased, with IAM prefix aliases applied)."""
+    src = eventsource.strip().lower()
+    if src.endswith(_EVENTSOURCE_SUFFIX):
+        src = src[:-len(_EVENTSOURCE_SUFFIX)]
+    return _EVENTSOURCE_ALIASES.get(src, src)
+
+
+@lru_cache(maxsize=ACTION_CACHE_SIZE)
+def action_keys(action: str) -> Tuple[str, str]:
+    """
+    Lookup keys for a policy action, computed once per distinct string:
+    's3:GetObject' -> ('s3:getobject', 'getobject').
+    """
+    qualified = action.strip().lower()
+    return qualified, qualified.split(":", 1)[-1]
+
+
+class UsageIndex:
+    """
+    Set of used CloudTrail events, built once and queried per policy action in O(1).
+
+    `qualified` maps 's3:getobject' -> 's3:GetObject' (display form as seen in the events),
+    `bare` holds lowercased event names whose service is unknown.
+    """
+
+    def __init__(self) -> None:
+        self.qualified: Dict[str, str] = {}
+        self.bare: Set[str] = set()
+        # lazily built per-service event lists and memoized wildcard coverage
+        self._by_service: Optional[Dict[str, List[str]]] = None
+        self._coverage: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._fingerprint: Optional[str] = None
+
+    # ----- building -----
+    def add_event(self, eventsource: str, eventname: str) -> None:
+        name = eventname.strip()
+        if not name:
+            return
+        if ":" in name:
+            # service-prefixed inputs such as athena_events_custom.csv ("ec2:DescribeInstances")
+            service, _, action = name.partition(":")
+            service = service.strip().lower()
+        elif eventsource and eventsource.strip():
+            service, action = service_from_eventsource(eventsource), name
+        else:
+            self.bare.add(name.lower())
+            self._fingerprint = None
+            return
+        key = f"{service}:{action.lower()}"
+        if key not in self.qualified:
+            self.qualified[key] = f"{service}:{action}"
+            self._by_service = None
+            self._coverage.clear()
+            self._fingerprint = None
+
+    def add_events(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for eventsource, eventname in pairs:
+            self.add_event(eventsource, eventname)
+
+    @classmethod
+    def from_event_names(cls, names: Iterable[str]) -> "UsageIndex":
+        """Build from plain event names ('putobject' or 'ec2:describeinstances')."""
+        index = cls()
+        for name in names:
+            index.add_event("", name)
+        return index
+
+    # ----- queries -----
+    def is_used(self, action: str) -> bool:
+        qualified, bare = action_keys(action)
+        return qualified in self.qualified or bare in self.bare
+
+    def __contains__(self, action: str) -> bool:
+        return self.is_used(action)
+
+    def __len__(self) -> int:
+        return len(self.qualified) + len(self.bare)
+
+    def qualified_actions(self) -> Iterator[str]:
+        """Display-form 'service:Action' strings for every service-qualified event."""
+        return iter(self.qualified.values())
+
+    def _events_for(self, services: Optional[Set[str]]) -> Iterable[str]:
+        if services is None:
+            return self.qualified.values()
+        if self._by_service is None:
+            by_service: Dict[str, List[str]] = {}
+            for key, display in self.qualified.items():
+                by_service.setdefault(key.split(":", 1)[0], []).append(display)
+            self._by_service = by_service
+        return [event for svc in services for event in self._by_service.get(svc, ())]
+
+    def covered_by(self, patterns: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Observed service-qualified events covered by each wildcard pattern.
+        All not-yet-seen patterns are compiled into one WildcardMatcher and run once over
+        the events of the services they name; results are memoized per pattern (the
+        COVERAGE_CACHE_SIZE most recent), so the same 's3:Get*' across thousands of
+        policies is evaluated once.
+        Name-only events are never expanded: their service is unknown.
+        """
+        patterns = [p.strip() for p in patterns]
+        found: Dict[str, List[str]] = {}
+        todo: List[str] = []
+        for p in dict.fromkeys(patterns):
+            if p in self._coverage:
+                self._coverage.move_to_end(p)
+                found[p] = self._coverage[p]
+            else:
+                todo.append(p)
+        if todo:
+            matcher = WildcardMatcher(todo)
+            expanded = matcher.expand(self._events_for(matcher.services()))
+            found.update(expanded)
+            self._coverage.update(expanded)
+            while len(self._coverage) > COVERAGE_CACHE_SIZE:
+                self._coverage.popitem(last=False)
+        return {p: found.get(p, []) for p in patterns}
+
+    def fingerprint(self) -> str:
+        """Content hash of the index (used to key cached per-policy results)."""
+        if self._fingerprint is None:
+            h = hashlib.sha256()
+            for key in sorted(self.qualified):
+                h.update(f"q\t{key}\t{self.qualified[key]}\n".encode("utf-8"))
+            for name in sorted(self.bare):
+                h.update(f"b\t{name}\n".encode("utf-8"))
+            self._fingerprint = h.hexdigest()
+        return self._fingerprint
+
+    def sample(self, n: int = 8) -> List[str]:
+        qualified = sorted(self.qualified.values(), key=str.lower)[:n]
+        return qualified + sorted(self.bare)[:n - len(qualified)]
+
+    def describe(self) -> str:
+        return f"{len(self)} unique events ({len(self.qualified)} service-qualified, {len(self.bare)} name-only)"
+
+
+def load_usage_index(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     index: Optional[UsageIndex] = None) -> Tuple[UsageIndex, StreamStats]:
+    """
+    Stream an event source once (eventsource + eventname columns only) into a UsageIndex
+    (a new one, or `index` to add a further file to it).
+    Each chunk is de-duplicated before indexing, so repeated events cost one set insert.
+    """
+    stats = StreamStats(path=path)
+    index = index if index is not None else UsageIndex()
+    for chunk in iter_event_chunks(path, ("eventsource", "eventname"), chunk_size, stats):
+        index.add_events(set(chunk))
+    return index, stats
@@ -0,0 +1,331 @@
+import os
+import io
+import csv
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from event_stream import DEFAULT_CHUNK_SIZE, StreamStats, iter_event_chunks
+from principal_usage import PrincipalUsage, identity_principal
+from usage_index import UsageIndex, service_from_eventsource
+
+# ---------- Per-day usage rollups ----------
+#
+# Raw events are aggregated once into one small file per UTC day:
+#
+#   <rollups>/days/2024-05-01.csv.gz   principal,service,action,count
+#   <rollups>/manifest.json           source files already ingested (path, size, mtime)
+#   <rollups>/sources/<id>.csv.gz      what each source added: day,principal,service,action,count
+#
+# A --since/--until window then reads only the day files inside it, never the raw
+# events. Ingesting a new export merges into (and rewrites) only the days it touches,
+# and a source already listed in the manifest is skipped, so history is never
+# reprocessed. Re-ingesting a source (--force, or the file changed) first takes its
+# recorded contribution back out of the days, so its events are never counted twice. `service` is the IAM action prefix ('' for name-only inputs such as
+# athena_event_counts.csv) and `principal` a principal_usage key ('' if unattributed).
+
+DEFAULT_ROLLUPS_DIR = "data/rollups"
+ROLLUP_HEADER = ["principal", "service", "action", "count"]
+
+
+def _days_dir(root: str) -> str:
+    return os.path.join(root, "days")
+
+
+def _day_path(root: str, day: str) -> str:
+    return os.path.join(_days_dir(root), f"{day}.csv.gz")
+
+
+def manifest_path(root: str) -> str:
+    return os.path.join(root, "manifest.json")
+
+
+def load_manifest(root: str) -> Dict[str, Dict]:
+    try:
+        with open(manifest_path(root), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def source_id(path: str) -> Dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def event_day(eventtime: str) -> Optional[str]:
+    """'2023-07-10T11:42:31Z' / '2023-07-10 11:42:31.000' -> '2023-07-10' (None if unparseable)."""
+    day = eventtime.strip()[:10]
+    try:
+        date.fromisoformat(day)
+    except ValueError:
+        return None
+    return day
+
+
+def split_event(eventsource: str, eventname: str) -> Tuple[str, str]:
+    """(eventsource, eventname) -> (IAM service prefix, action), as UsageIndex keys them."""
+    name = eventname.strip()
+    if ":" in name:
+        service, _, action = name.partition(":")
+        return service.strip().lower(), action
+    if eventsource and eventsource.strip():
+        return service_from_eventsource(eventsource), name
+    return "", name
+
+
+# ---------- Day files ----------
+
+def read_day(root: str, day: str) -> Counter:
+    counts: Counter = Counter()
+    path = _day_path(root, day)
+    if not os.path.exists(path):
+        return counts
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for principal, service, action, count in reader:
+            counts[(principal, service, action)] += int(count)
+    return counts
+
+
+def write_day(root: str, day: str, counts: Counter) -> None:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(ROLLUP_HEADER)
+    for (principal, service, action), count in sorted(counts.items()):
+        writer.writerow([principal, service, action, count])
+    # mtime=0 keeps the gzip bytes deterministic for identical content
+    atomic_write(_day_path(root, day), gzip.compress(buf.getvalue().encode("utf-8"), mtime=0))
+
+
+def remove_day(root: str, day: str) -> None:
+    try:
+        os.unlink(_day_path(root, day))
+    except FileNotFoundError:
+        pass
+
+
+def _contribution_name(source_key: str) -> str:
+    return hashlib.sha256(source_key.encode("utf-8")).hexdigest()[:20] + ".csv.gz"
+
+
+def read_contribution(root: str, name: Optional[str]) -> Dict[str, Counter]:
+    """{day: counts} a source added, as recorded at its last ingest (empty if unknown)."""
+    days: Dict[str, Counter] = {}
+    if not name:
+        return days
+    try:
+        with gzip.open(os.path.join(root, "sources", name), "rt", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for day, principal, service, action, count in reader:
+                days.setdefault(day, Counter())[(principal, service, action)] += int(count)
+    except FileNotFoundError:
+        pass
+    return days
+
+
+def write_contribution(root: str, name: str, days: Dict[str, Counter]) -> None:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["day", *ROLLUP_HEADER])
+    for day, counts in sorted(days.items()):
+        for (principal, service, action), count in sorted(counts.items()):
+            writer.writerow([day, principal, service, action, count])
+    atomic_write(os.path.join(root, "sources", name), gzip.compress(buf.getvalue().encode("utf-8"), mtime=0))
+
+
+def list_days(root: str) -> List[str]:
+    folder = _days_dir(root)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-len(".csv.gz")] for name in os.listdir(folder) if name.endswith(".csv.gz"))
+
+
+# ---------- Ingest ----------
+
+def aggregate_events(path: str, default_day: Optional[str] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Dict[str, Counter], int, StreamStats]:
+    """
+    Stream an event source once into {day: Counter[(principal, service, action)]}.
+    An `event_count` column (athena_event_counts.csv) is honoured; rows without a usable
+    eventtime go to `default_day`, or are skipped and counted. Returns (days, skipped, stats).
+    """
+    stats = StreamStats(path=path)
+    days: Dict[str, Counter] = {}
+    skipped = 0
+    columns = ("eventtime", "useridentity", "eventsource", "eventname", "eventcount")
+    for chunk in iter_event_chunks(path, columns, chunk_size, stats):
+        for (eventtime, identity, eventsource, eventname, count), n in Counter(chunk).items():
+            if not eventname.strip():
+                continue
+            day = event_day(eventtime) or default_day
+            if day is None:
+                skipped += n
+                continue
+            service, action = split_event(eventsource, eventname)
+            weight = n * (int(count) if count.strip().isdigit() else 1)
+            days.setdefault(day, Counter())[(identity_principal(identity), service, action)] += weight
+    return days, skipped, stats
+
+
+def ingest(path: str, root: str = DEFAULT_ROLLUPS_DIR, default_day: Optional[str] = None,
+           force: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[Dict]:
+    """
+    Fold one event export into the rollups. Only the days present in the export (and,
+    on re-ingest, the days it contributed to before) are read and rewritten. Returns a summary dict, or None if the source (same path, size
+    and mtime) was already ingested.
+    """
+    manifest = load_manifest(root)
+    key = os.path.abspath(path)
+    source = source_id(path)
+    if not force and manifest.get(key, {}).get("source") == source:
+        return None
+
+    days, skipped, stats = aggregate_events(path, default_day, chunk_size)
+    if not days and key not in manifest:
+        # nothing landed (e.g. undated rows without --day): allow a retry
+        return {"source": source, "days": [], "rows": stats.rows, "skipped_undated": skipped}
+    # a re-ingested source replaces what it added last time
+    name = _contribution_name(key)
+    previous = read_contribution(root, manifest.get(key, {}).get("contribution"))
+    for day in sorted(set(days) | set(previous)):
+        merged = read_day(root, day)
+        merged.subtract(previous.get(day, Counter()))
+        merged.update(days.get(day, Counter()))
+        merged = +merged  # drop counts that reached zero
+        if merged:
+            write_day(root, day, merged)
+        else:
+            remove_day(root, day)
+    write_contribution(root, name, days)
+
+    summary = {"source": source, "days": sorted(days), "rows": stats.rows, "skipped_undated": skipped,
+               "contribution": name, "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    manifest[key] = summary
+    atomic_write(manifest_path(root), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return summary
+
+
+# ---------- Window queries ----------
+
+def parse_window(since: Optional[str], until: Optional[str],
+                 today: Optional[date] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    --since/--until values -> inclusive (first_day, last_day) ISO strings.
+    `since` may be a date or a lookback such as '90d' (counted back from `until`, or today).
+    """
+    today = today or datetime.now(timezone.utc).date()
+    last = date.fromisoformat(until) if until else None
+    first: Optional[date] = None
+    if since:
+        if since[-1:].lower() == "d" and since[:-1].isdigit():
+            first = (last or today) - timedelta(days=int(since[:-1]) - 1)
+        else:
+            first = date.fromisoformat(since)
+    return (first.isoformat() if first else None, last.isoformat() if last else None)
+
+
+def window_days(root: str, since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+    return [day for day in list_days(root)
+            if not ((since and day < since) or (until and day > until))]
+
+
+def window_files(root: str, since: Optional[str] = None, until: Optional[str] = None) -> List[str]:
+    """Paths of the day files a [since, until] query reads."""
+    return [_day_path(root, day) for day in window_days(root, since, until)]
+
+
+def iter_window(root: str, since: Optional[str] = None,
+                until: Optional[str] = None) -> Iterator[Tuple[str, Counter]]:
+    """(day, counts) for every rollup day inside [since, until]; days outside are never opened."""
+    for day in window_days(root, since, until):
+        yield day, read_day(root, day)
+
+
+def _window_rows(root: str, since: Optional[str], until: Optional[str],
+                 stats: StreamStats) -> Iterator[Tuple[str, str, str]]:
+    start = time.perf_counter()
+    for _, counts in iter_window(root, since, until):
+        stats.chunks += 1
+        stats.rows += len(counts)
+        yield from counts
+    stats.seconds = time.perf_counter() - start
+
+
+def usage_index_from_rollups(root: str, since: Optional[str] = None,
+                             until: Optional[str] = None) -> Tuple[UsageIndex, StreamStats]:
+    """Account-wide UsageIndex for the window (stats count rollup rows and day files)."""
+    stats = StreamStats(path=root)
+    index = UsageIndex()
+    index.add_events({(service, action) for _, service, action in _window_rows(root, since, until, stats)})
+    return index, stats
+
+
+def principal_usage_from_rollups(root: str, since: Optional[str] = None,
+                                 until: Optional[str] = None) -> Tuple[PrincipalUsage, StreamStats]:
+    """PrincipalUsage for the window."""
+    stats = StreamStats(path=root)
+    usage = PrincipalUsage()
+    usage.add_attributed(set(_window_rows(root, since, until, stats)))
+    return usage, stats
+
+
+def describe_window(since: Optional[str], until: Optional[str]) -> str:
+    return f"{since or 'beginning'} .. {until or 'latest'}"
+
+
+# ---------- CLI ----------
+
+def main():
+    ap = argparse.ArgumentParser(description="Maintain per-day (principal, service, action) usage rollups.")
+    ap.add_argument("--rollups", default=DEFAULT_ROLLUPS_DIR, help=f"Rollup store (default: {DEFAULT_ROLLUPS_DIR})")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    ing = sub.add_parser("ingest", help="Fold event exports into the daily rollups")
+    ing.add_argument("events", nargs="+", help="CloudTrail CSV / JSON-lines exports (optionally .gz)")
+    ing.add_argument("--day", default=None, help="Day (YYYY-MM-DD) for rows without eventtime, e.g. count exports")
+    ing.add_argument("--force", action="store_true", help="Re-ingest sources already in the manifest")
+    ing.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                     help=f"Rows read per chunk (default: {DEFAULT_CHUNK_SIZE})")
+
+    sub.add_parser("days", help="List rollup days")
+    args = ap.parse_args()
+
+    if args.command == "days":
+        days = list_days(args.rollups)
+        print(f"{len(days)} days in {args.rollups}" + (f": {days[0]} .. {days[-1]}" if days else ""))
+        return
+
+    for path in args.events:
+        summary = ingest(path, args.rollups, args.day, args.force, args.chunk_size)
+        if summary is None:
+            print(f"⏭️  Already ingested: {path}")
+            continue
+        print(f"✅ Ingested {path}: {summary['rows']:,} rows into {len(summary['days'])} day(s)")
+        if summary["skipped_undated"]:
+            print(f"⚠️  Skipped {summary['skipped_undated']:,} rows without eventtime (use --day)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+# ---------- Compiled matcher for IAM action patterns ----------
+#
+# IAM action patterns use '*' (any run of characters) and '?' (one character) and are
+# case-insensitive. Patterns are grouped per service and stored in a character trie
+# keyed on their literal prefix (the text before the first wildcard). Matching an
+# action walks the trie once along the action name and collects every pattern whose
+# prefix was consumed; a regex check is only needed for patterns that have more
+# wildcards after the prefix ('iam:*User*'), never for plain prefix patterns ('s3:Get*').
+# Patterns with a wildcard in the service part ('*', '*:Get*') are kept in a small
+# global list and checked by regex against the full action.
+
+_WILDCARD_CHARS = ("*", "?")
+
+
+def is_wildcard(action: str) -> bool:
+    return "*" in action or "?" in action
+
+
+def _first_wildcard(text: str) -> int:
+    positions = [i for i in (text.find(c) for c in _WILDCARD_CHARS) if i >= 0]
+    return min(positions) if positions else -1
+
+
+def compile_pattern(pattern: str) -> Pattern[str]:
+    """IAM glob -> anchored, case-insensitive regex (use with .fullmatch on lowercased text)."""
+    parts = []
+    for ch in pattern.lower():
+        if ch == "*":
+            parts.append(".*")
+        elif ch == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        # (original pattern, regex for the action part or None when the prefix alone decides)
+        self.entries: List[Tuple[str, Optional[Pattern[str]]]] = []
+
+
+class WildcardMatcher:
+    """
+    Match many IAM action patterns against many 'service:Action' strings.
+
+        matcher = WildcardMatcher(["ec2:*", "s3:Get*", "iam:*User*"])
+        matcher.match("s3:GetObject")          -> ["s3:Get*"]
+        matcher.expand(observed_actions)       -> {"ec2:*": [...], "s3:Get*": [...], ...}
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns: List[str] = list(dict.fromkeys(p.strip() for p in patterns if p and p.strip()))
+        self._tries: Dict[str, _Node] = {}
+        self._global: List[Tuple[str, Pattern[str]]] = []
+        for pattern in self.patterns:
+            self._add(pattern)
+
+    def _add(self, pattern: str) -> None:
+        service, sep, action = pattern.lower().partition(":")
+        if not sep or is_wildcard(service):
+            self._global.append((pattern, compile_pattern(pattern)))
+            return
+
+        cut = _first_wildcard(action)
+        prefix = action if cut < 0 else action[:cut]
+        tail = "" if cut < 0 else action[cut:]
+        # exact names (no wildcard) need a full-length check, pure prefix patterns need none
+        regex = None if tail == "*" else compile_pattern(action)
+
+        node = self._tries.setdefault(service, _Node())
+        for ch in prefix:
+            node = node.children.setdefault(ch, _Node())
+        node.entries.append((pattern, regex))
+
+    def services(self) -> Optional[Set[str]]:
+        """Services the patterns can match, or None if any pattern spans all services."""
+        if self._global:
+            return None
+        return set(self._tries)
+
+    def match(self, action: str) -> List[str]:
+        """All patterns covering `action` ('service:Action', any case)."""
+        lowered = action.strip().lower()
+        service, _, name = lowered.partition(":")
+        hits: List[str] = []
+
+        node = self._tries.get(service)
+        if node is not None:
+            depth = 0
+            while True:
+                for pattern, regex in node.entries:
+                    if regex is None or regex.fullmatch(name):
+                        hits.append(pattern)
+                if depth == len(name):
+                    break
+                node = node.children.get(name[depth])
+                if node is None:
+                    break
+                depth += 1
+
+        for pattern, regex in self._global:
+            if regex.fullmatch(lowered):
+                hits.append(pattern)
+        return hits
+
+    def expand(self, actions: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Map every pattern to the (sorted, de-duplicated) actions it covers.
+        Patterns that cover nothing map to an empty list.
+        """
+        covered: Dict[str, Dict[str, str]] = {p: {} for p in self.patterns}
+        for action in actions:
+            for pattern in self.match(action):
+                covered[pattern].setdefault(action.lower(), action)
+        return {p: sorted(hits.values(), key=str.lower) for p, hits in covered.items()}
@@ -0,0 +1,72 @@
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import analysis_service  # noqa: E402
+import resource_index  # noqa: E402
+import usage_index  # noqa: E402
+from analysis_service import AnalysisService, RequestError, UsageSource  # noqa: E402
+from usage_index import UsageIndex  # noqa: E402
+from usage_rollups import ingest, parse_window  # noqa: E402
+
+
+def test_analysis_service_reloads_new_event_files(tmp_path):
+    (tmp_path / "a.csv").write_text("eventsource,eventname\niam.amazonaws.com,ListUsers\n")
+    service = AnalysisService(UsageSource(counts=str(tmp_path)))
+    policy = {"Statement": [{"Effect": "Allow", "Action": ["iam:ListUsers", "s3:GetObject"], "Resource": "*"}]}
+    first = service.compare({"policy": policy})
+    assert first["counts"] == {"Used": 1, "Unused": 1} and not first["memoized"]
+    assert service.compare({"policy": policy})["memoized"]
+    assert not service.reload()
+
+    (tmp_path / "b.csv").write_text("eventsource,eventname\ns3.amazonaws.com,GetObject\n")
+    assert service.reload()
+    assert service.compare({"policy": policy})["counts"] == {"Used": 2}
+    refined = service.refine({"policy": policy})["refined"]
+    assert refined["Statement"][0]["Action"] == ["iam:ListUsers", "s3:GetObject"]
+    for bad in ({"resource_limit": "ten"}, {"resource_limit": [5]}, {"flatten": ["yes"]}):
+        with pytest.raises(RequestError) as raised:
+            service.refine({"policy": policy, **bad})
+        assert raised.value.status == 400
+
+
+def test_analysis_service_lookback_moves_with_the_calendar(tmp_path, monkeypatch):
+    events = tmp_path / "events.csv"
+    events.write_text("eventtime,eventsource,eventname\n2024-05-01T10:00:00Z,s3.amazonaws.com,GetObject\n")
+    rollups = str(tmp_path / "rollups")
+    ingest(str(events), rollups)
+    today = [date(2024, 5, 10)]
+    monkeypatch.setattr(analysis_service, "parse_window", lambda since, until: parse_window(since, until, today[0]))
+
+    service = AnalysisService(UsageSource(rollups=rollups, since="10d"))
+    policy = {"policy": {"Statement": {"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"}}}
+    assert service.compare(policy)["counts"] == {"Used": 1}
+    assert not service.reload()
+    today[0] = date(2024, 5, 12)  # no new data, but the window no longer reaches 2024-05-01
+    assert service.reload()
+    assert service.compare(policy)["counts"] == {"Unused": 1}
+
+
+def test_request_pattern_memos_stay_bounded(monkeypatch):
+    monkeypatch.setattr(usage_index, "COVERAGE_CACHE_SIZE", 8)
+    monkeypatch.setattr(resource_index, "SUGGESTION_CACHE_SIZE", 8)
+    usage = UsageIndex()
+    usage.add_event("s3.amazonaws.com", "GetObject")
+    for i in range(50):
+        assert usage.covered_by([f"s3:Get{'O' * (i % 2)}*", f"s3:x{i}*"]) == \
+            {f"s3:Get{'O' * (i % 2)}*": ["s3:GetObject"], f"s3:x{i}*": []}
+    assert len(usage._coverage) == 8
+    # one batch larger than the memo still answers every pattern
+    batch = [f"s3:y{i}*" for i in range(20)] + ["s3:G*"]
+    assert usage.covered_by(batch)["s3:G*"] == ["s3:GetObject"] and len(usage._coverage) == 8
+
+    index = resource_index.ResourceIndex()
+    index.add("s3", "GetObject", ["arn:aws:s3:::b/k"])
+    for i in range(50):
+        assert index.suggest(["s3:GetObject"], [f"arn:aws:s3:::b/*{i}", "arn:aws:s3:::b/*"]) == ["arn:aws:s3:::b/k"]
+    assert len(index._suggestions) == 8
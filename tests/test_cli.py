@@ -0,0 +1,18 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+
+def test_cli_and_commands_import_without_heavy_dependencies():
+    # a fresh interpreter: this test process has long since imported pandas
+    code = ("import importlib, sys\n"
+            f"sys.path.insert(0, {str(ROOT / 'script')!r})\n"
+            "import cli\n"
+            "for module, _ in cli.COMMANDS.values():\n"
+            "    importlib.import_module(module)\n"
+            "print(' '.join(sorted(m for m in ('pandas', 'pyarrow', 'boto3') if m in sys.modules)))\n")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
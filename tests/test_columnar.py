@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pandas as pd
+    from columnar import column_names, read_columns, replace_columns, write_frame, write_report_parquet
+
+    report = str(tmp_path / "report.parquet")
+    rows = [("A.json", [("s3:GetObject", "Used"), ("s3:PutObject", "Unused")]), ("B.json", [("iam:*", "Used")])]
+    write_report_parquet(rows, report)
+    assert not (tmp_path / "report.parquet.tmp").exists()
+    assert column_names(report) == ["Policy File", "Action", "Status"]
+    df = read_columns(report, ["Action", "Status"])
+    assert isinstance(df["Status"].dtype, pd.CategoricalDtype)
+    assert [tuple(r) for r in df.astype(str).itertuples(index=False)] == \
+        [("s3:GetObject", "Used"), ("s3:PutObject", "Unused"), ("iam:*", "Used")]
+
+    summary = str(tmp_path / "summary.pq")
+    frame = pd.DataFrame({"Policy": ["A.json", "B.json"], "Grade": ["ok", "ok"], "Count": [3, 1]})
+    write_frame(frame, summary, dictionary_columns=["Grade"])
+    back = read_columns(summary)
+    assert isinstance(back["Grade"].dtype, pd.CategoricalDtype)
+    assert back.astype({"Grade": str}).equals(frame)
+
+    replace_columns(summary, {"Count": pd.Series([5, 6]), "Note": pd.Series(["x", "y"])}, ["Note"])
+    back = read_columns(summary, ["Policy", "Count", "Note"])
+    assert back["Count"].tolist() == [5, 6] and back["Note"].astype(str).tolist() == ["x", "y"]
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from compare_policy_usage import extract_actions  # noqa: E402
+from effective_permissions import PermissionEngine, granted_actions  # noqa: E402
+from least_privilege_tool import collect_original_actions  # noqa: E402
+
+
+def test_effective_permissions_apply_deny_and_notaction():
+    engine = PermissionEngine()
+    engine.extend_space(["s3:GetObject", "s3:PutObject", "s3:DeleteObject", "iam:CreateUser", "ec2:RunInstances"])
+    engine.add_policy(("managed", "S3.json"), {"Statement": [
+        {"Effect": "Allow", "Action": "s3:*", "Resource": "*"},
+        {"Effect": "Deny", "Action": "s3:DeleteObject", "Resource": "*"},
+        {"Effect": "Deny", "Action": "s3:PutObject", "Resource": "*",
+         "Condition": {"Bool": {"aws:SecureTransport": "false"}}}]})
+    engine.add_policy(("managed", "NotIam.json"), {"Statement": {"Effect": "Allow", "NotAction": "iam:*",
+                                                                 "Resource": "*"}})
+    engine.add_policy(("inline", "group_devs_deny.json"), {"Statement": {"Effect": "Deny", "NotAction": [
+        "s3:*", "iam:CreateUser"], "Resource": "*"}})
+    engine.attach("user/ann", ("managed", "S3.json"))
+    engine.attach("role/ci", ("managed", "NotIam.json"))
+    engine.attach("group/devs", ("inline", "group_devs_deny.json"))
+    engine.add_member("role/ci", "devs")
+
+    ann = engine.effective("user/ann")
+    assert sorted(ann.actions()) == ["s3:getobject", "s3:putobject"]
+    assert sorted(ann.actions(ann.conditional_deny)) == ["s3:putobject"]
+    assert sorted(engine.effective("role/ci").actions()) == ["s3:deleteobject", "s3:getobject", "s3:putobject"]
+    assert engine.decide("role/ci", "ec2:RunInstances") == "ExplicitDeny"
+    assert engine.decide("role/ci", "iam:CreateUser") == "ImplicitDeny"
+    assert engine.decide("user/ann", "s3:DeleteObject") == "ExplicitDeny"
+
+    policy = {"Statement": [{"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": "*"},
+                            {"Effect": "Deny", "Action": "s3:PutObject", "Resource": "*"}]}
+    assert collect_original_actions(policy) == granted_actions(policy) == ["s3:GetObject"]
+    assert extract_actions(policy) == {"s3:GetObject"}
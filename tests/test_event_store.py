@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from event_store import EventStore, ingest  # noqa: E402
+from usage_index import load_usage_index  # noqa: E402
+from usage_rollups import parse_window  # noqa: E402
+
+
+def test_event_store_answers_lookups_without_scanning(tmp_path):
+    store_dir = str(tmp_path / "store")
+    events = tmp_path / "events.csv"
+    events.write_text("eventtime,eventsource,eventname\n"
+                      "2024-05-01T10:00:00Z,s3.amazonaws.com,GetObject\n"
+                      "2024-05-01T11:00:00Z,s3.amazonaws.com,GetObject\n"
+                      "2024-06-10T09:00:00Z,iam.amazonaws.com,ListUsers\n")
+    assert ingest(str(events), store_dir)["services"] == ["iam", "s3"]
+    assert ingest(str(events), store_dir) is None  # already ingested
+    ingest(str(events), store_dir, force=True)  # replaces its own counts, no double count
+    ingest(str(ROOT / "data" / "athena_event_counts.csv"), store_dir, default_day="2024-06-01")
+
+    with EventStore(store_dir) as store:
+        assert store.has_action("S3:getobject") and not store.has_action("s3:PutObject")
+        assert not store.has_action("s3:GetObject", since="2024-05-02")
+        assert store.has_action("iam:ListUsers", since="2024-06-01", until="2024-06-30")
+        assert store.calls("s3:GetObject") == 2 and store.calls("s3:GetBucketAcl") == 7
+
+        expected, _ = load_usage_index(str(events))
+        load_usage_index(str(ROOT / "data" / "athena_event_counts.csv"), index=expected)
+        index, _ = store.usage_index()
+        assert (index.qualified, index.bare) == (expected.qualified, expected.bare)
+        june, _ = store.usage_index(*parse_window("30d", "2024-06-30"))
+        assert june.is_used("iam:ListUsers") and not june.is_used("s3:GetObject")
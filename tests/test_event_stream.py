@@ -0,0 +1,32 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from event_stream import StreamStats, iter_event_chunks  # noqa: E402
+
+
+def test_event_stream_chunks_and_projects_columns(tmp_path):
+    path = str(ROOT / "data" / "athena_events_raw.csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        expected = [(r["eventsource"], r["eventname"], "") for r in csv.DictReader(f)]
+
+    stats = StreamStats(path=path)
+    chunks = list(iter_event_chunks(path, ("eventsource", "EventName", "nosuchcolumn"), 7, stats))
+    assert all(len(c) == 7 for c in chunks[:-1]) and 0 < len(chunks[-1]) <= 7
+    assert [row for chunk in chunks for row in chunk] == expected
+    assert (stats.rows, stats.chunks) == (len(expected), len(chunks))
+
+    # a pretty-printed CloudTrail export is one {"Records": [...]} document, not JSON lines
+    records = [{"eventSource": s, "eventName": n} for s, n, _ in expected]
+    export = tmp_path / "cloudtrail.json"
+    export.write_text(json.dumps({"Records": records}, indent=2))
+    lines = tmp_path / "cloudtrail.jsonl"
+    lines.write_text("\n".join(json.dumps(r) for r in records) + "\n")
+    for source in (export, lines):
+        rows = [row for chunk in iter_event_chunks(str(source), ("eventsource", "eventname"), 7)
+                for row in chunk]
+        assert rows == [(s, n) for s, n, _ in expected]
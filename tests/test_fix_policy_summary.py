@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from fix_policy_summary import batch_fix, lpr_recommendation, recalc, variant_path  # noqa: E402
+from metrics import RunMetrics  # noqa: E402
+
+
+def test_batch_fix_matches_per_file_recalc(tmp_path):
+    frames = [pd.DataFrame({"Policy": ["a", "b", "c"], "Original Actions": [10, 4, 0],
+                            "Kept (Used)": [9, 1, 0], "Wildcards Flagged": [1, 2, 0]}),
+              pd.DataFrame({"Policy": ["d"], "Original Actions": [5], "Kept (Used)": [3]})]
+    paths = []
+    for i, frame in enumerate(frames):
+        (tmp_path / str(i)).mkdir()
+        paths.append(str(tmp_path / str(i) / "policy_summary.csv"))
+        frame.to_csv(paths[-1], index=False)
+
+    report = batch_fix(paths, True, [(90.0, 40.0), (50.0, 20.0)], 2, RunMetrics("test"))
+    assert report[["Policies", "High", "Medium", "Low"]].values.tolist() == [[3, 1, 1, 1], [1, 0, 1, 0],
+                                                                             [3, 2, 0, 1], [1, 1, 0, 0]]
+    for path, frame in zip(paths, frames):
+        expected = recalc(frame.copy(), True, 50.0, 20.0)
+        written = pd.read_csv(variant_path(path, (50.0, 20.0)))
+        assert written.astype(str).equals(expected.astype(str))
+    assert written["Least privilage recommendation"][0] == lpr_recommendation(60.0, 50, 20)
+    # several threshold sets leave the original summaries untouched
+    assert "Least privilage recommendation" not in pd.read_csv(paths[1]).columns
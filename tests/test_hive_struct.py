@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from hive_struct import parse_struct, struct_field  # noqa: E402
+
+
+def test_hive_struct_parsing_edge_cases():
+    identity = ("{type=AssumedRole, principalid=AROA:bob, arn=arn:aws:sts::1:assumed-role/R/bob, "
+                "sessioncontext={sessionissuer={type=Role, arn=arn:aws:iam::1:role/R}, attributes={"
+                "creationdate=2023-07-10T11:42:31Z, mfaauthenticated=false}}, invokedby=null, note=a, b,c}")
+    full = parse_struct(identity)
+    assert full["note"] == "a, b,c"  # ',' only separates fields when followed by ' key='
+    assert full["invokedby"] is None
+    assert full["sessioncontext"]["attributes"] == {"creationdate": "2023-07-10T11:42:31Z",
+                                                    "mfaauthenticated": "false"}
+    assert parse_struct(identity, ["arn", "sessioncontext.sessionissuer.arn"]) == {
+        "arn": "arn:aws:sts::1:assumed-role/R/bob",
+        "sessioncontext": {"sessionissuer": {"arn": "arn:aws:iam::1:role/R"}}}
+    # a parent selected whole wins over a narrower path below it
+    assert parse_struct(identity, ["sessioncontext", "sessioncontext.attributes.creationdate"]) == \
+        {"sessioncontext": full["sessioncontext"]}
+    assert struct_field(identity, "sessioncontext.sessionissuer.arn") == "arn:aws:iam::1:role/R"
+    assert struct_field(identity, "invokedby", "-") == "-"
+    assert struct_field(identity, "sessioncontext.nosuch.arn") == ""
+
+    resources = ("[{accountid=1, type=AWS::S3::Bucket, arn=arn:aws:s3:::b}, "
+                 "{arn=arn:aws:s3:::b/k, type=AWS::S3::Object}]")
+    assert parse_struct(resources, ["arn"]) == [{"arn": "arn:aws:s3:::b"}, {"arn": "arn:aws:s3:::b/k"}]
+    assert parse_struct("{a={}, b=[], c=1}") == {"a": {}, "b": [], "c": "1"}
+    assert parse_struct("[a, b]") == ["a", "b"]
+    assert parse_struct("") == parse_struct("  ") == parse_struct("not a struct") == {}
+    # CloudTrail JSON-lines input: nested objects arrive as JSON, keys matched lowercased
+    assert parse_struct('{"Type": "IAMUser", "ARN": "x", "sessionContext": {"a": 1}}', ["arn", "type"]) == \
+        {"arn": "x", "type": "IAMUser"}
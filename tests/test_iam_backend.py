@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import iam_backend  # noqa: E402
+from iam_backend import StubIAMClient, StubThrottlingError, call_with_retry, paginate  # noqa: E402
+
+
+def test_stub_iam_client_paginates_and_retries_throttling(monkeypatch):
+    monkeypatch.setattr(iam_backend.time, "sleep", lambda seconds: None)
+    client = StubIAMClient(entities=25, inline_per_entity=2, page_size=10, throttle_rate=0.3, seed=1)
+    policies = list(paginate(client.list_policies, "Policies", Scope="Local"))
+    assert [p["PolicyName"] for p in policies] == [f"StubPolicy{i:05d}" for i in range(25)]
+    assert client.throttled > 0 and client.calls == 3 + client.throttled  # 3 pages, each retried until it succeeds
+    assert list(paginate(client.list_role_policies, "PolicyNames", RoleName="stub-role-00003")) == \
+        ["inline-0", "inline-1"]
+
+    always = StubIAMClient(entities=1, throttle_rate=1.0)
+    with pytest.raises(StubThrottlingError):
+        call_with_retry(always.list_users, max_attempts=3)
+    assert always.calls == 3
+    with pytest.raises(KeyError):  # anything but throttling is raised straight away
+        call_with_retry(client.get_policy_version, PolicyArn="arn:aws:iam::123456789012:policy/Nope",
+                        VersionId="v1")
@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+from pathlib import Path
+from urllib.parse import quote
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from iam_backend import StubIAMClient  # noqa: E402
+from iam_snapshot import (SnapshotReader, index_path, iter_authorization_details,  # noqa: E402
+                          records_from_details, records_from_directory, write_snapshot)
+
+
+def test_snapshot_write_then_indexed_lookup(tmp_path):
+    client = StubIAMClient(entities=3, page_size=4)
+    records = records_from_details(iter_authorization_details(client))
+    records += records_from_directory(str(ROOT / "iam_policies"))
+    # the raw API returns URL-encoded document strings
+    records += records_from_details([{"Policies": [{"PolicyName": "Encoded", "PolicyVersionList": [
+        {"IsDefaultVersion": True, "Document": quote(json.dumps({"Version": "2012-10-17"}))}]}]}])
+
+    path = str(tmp_path / "snapshot.jsonl")
+    assert write_snapshot(records, path) == len(records)
+    by_key = {(r["kind"], r["name"]): r for r in records}
+    for rebuilt in (False, True):
+        if rebuilt:
+            os.remove(index_path(path))  # the index is rebuilt by one scan
+        reader = SnapshotReader(path)
+        assert [(r["kind"], r["name"]) for r in reader.iter_records()] == \
+            sorted(by_key, key=lambda k: (("managed", "inline", "principal").index(k[0]), k[1]))
+        assert reader.load("Encoded.json") == {"Version": "2012-10-17"}
+        assert reader.load("StubPolicy00002.json") == client.policies[2]["Document"]
+        assert reader.load("role_stub-role-00001_inline-0.json", "inline") == \
+            client.principals["role"]["stub-role-00001"]["inline-0"]
+        assert reader.record("user/stub-user-00000", "principal")["attached"] == ["StubPolicy00000.json"]
+        assert reader.load("TestPolicy_Mixed.json") == by_key[("managed", "TestPolicy_Mixed.json")]["document"]
+        with pytest.raises(KeyError):
+            reader.load("StubPolicy00002.json", "inline")
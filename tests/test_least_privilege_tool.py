@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from compare_policy_usage import compare_policy_document, compare_policy_files, list_policy_files  # noqa: E402
+from least_privilege_tool import (_read_usage_frame, load_usage_report, load_usage_tables,  # noqa: E402
+                                  load_wildcard_coverage, refine_folder, refine_policy, usage_maps_from_findings)
+from usage_index import UsageIndex, load_usage_index  # noqa: E402
+
+
+def test_refine_keeps_statement_structure():
+    scoped = {"Effect": "Allow", "Action": ["s3:GetObject", "s3:PutObject"], "Resource": "arn:aws:s3:::b/*"}
+    policy = {"Version": "2012-10-17", "Statement": [
+        {"Sid": "Read", **scoped},
+        {"Effect": "Allow", "Action": "s3:DeleteObject", "Resource": "arn:aws:s3:::b/*"},
+        {"Effect": "Allow", "Action": ["ec2:*"], "Resource": "*",
+         "Condition": {"Bool": {"aws:MultiFactorAuthPresent": "true"}}},
+        {"Effect": "Allow", "Action": "kms:Decrypt", "Resource": "*"},
+        {"Effect": "Deny", "Action": "iam:*", "Resource": "*"},
+    ]}
+    used = ["s3:getobject", "s3:deleteobject"]
+    refined, metrics, _ = refine_policy(policy, used, ["ec2:StartInstances"])
+    statements = refined["Statement"]
+    # same Resource merged (first Sid kept), unused statement dropped, Deny untouched
+    assert statements[0] == {"Sid": "Read", "Effect": "Allow", "Action": ["s3:DeleteObject", "s3:GetObject"],
+                             "Resource": "arn:aws:s3:::b/*"}
+    assert statements[1]["Action"] == ["ec2:StartInstances"] and "Condition" in statements[1]
+    assert statements[2] == policy["Statement"][4]
+    assert len(statements) == 3
+
+    flat, flat_metrics, _ = refine_policy(policy, used, ["ec2:StartInstances"], flatten=True)
+    assert flat["Statement"] == [{"Effect": "Allow", "Resource": "*",
+                                  "Action": ["ec2:StartInstances", "s3:DeleteObject", "s3:GetObject"]}]
+    assert flat_metrics == metrics
+
+
+def test_wildcard_keeps_used_actions_another_statement_names():
+    policy = {"Version": "2012-10-17", "Statement": [
+        {"Effect": "Allow", "Action": "s3:*", "Resource": "arn:aws:s3:::bucket-x/*"},
+        {"Effect": "Allow", "Action": "s3:GetObject", "Resource": "arn:aws:s3:::bucket-y/*"},
+    ]}
+    usage = UsageIndex()
+    usage.add_event("s3.amazonaws.com", "GetObject")
+    usage.add_event("s3.amazonaws.com", "PutObject")
+    # compare lists GetObject as Used only (it is named explicitly), not as Covered by s3:*
+    used, covered = usage_maps_from_findings({"P.json": compare_policy_document("P.json", policy, usage, False)})
+    refined, _, _ = refine_policy(policy, used["P.json"], covered["P.json"])
+    assert refined["Statement"] == [
+        {"Effect": "Allow", "Action": ["s3:GetObject", "s3:PutObject"], "Resource": "arn:aws:s3:::bucket-x/*"},
+        {"Effect": "Allow", "Action": ["s3:GetObject"], "Resource": "arn:aws:s3:::bucket-y/*"},
+    ]
+
+
+def test_output_is_identical_for_any_worker_count(tmp_path):
+    files = list_policy_files(str(ROOT / "iam_policies"), str(ROOT / "iam_policies" / "inline"))
+    usage, _ = load_usage_index(str(ROOT / "data" / "athena_events_raw.csv"))
+    serial = compare_policy_files(files, usage, workers=1)
+    assert compare_policy_files(files, usage, workers=2, chunk_size=1) == serial
+
+    used, covered = usage_maps_from_findings(serial)
+    outputs = {}
+    for workers in (1, 2):
+        out = tmp_path / f"w{workers}"
+        rows = refine_folder(files, used, covered, str(out), workers=workers)
+        outputs[workers] = (rows, {p.name: p.read_bytes() for p in sorted(out.iterdir())})
+    assert outputs[1] == outputs[2]
+
+
+def test_vectorized_usage_report_matches_row_by_row_loader(tmp_path):
+    report = tmp_path / "report.csv"
+    report.write_text("Policy File,Action,Status\n"
+                      "A.json,S3:GetObject,Used\n"
+                      " A.json , s3:getobject ,USED\n"
+                      "A.json,s3:PutObject,unused\n"
+                      "A.json,s3:*,Wildcard\n"
+                      "A.json,S3:ListBucket,Covered\n"
+                      ",,\n"
+                      "A.json,,Used\n"
+                      ",s3:GetObject,Used\n"
+                      "B.json,iam:ListUsers, Used\n"
+                      "B.json,iam:ListUsers,Used\n"
+                      "B.json,IAM:CreateUser,Unused\n"
+                      "A.json,ec2:DescribeInstances,covered\n"
+                      "B.json,iam:ListUsers,Used\n")
+
+    def row_by_row(status, lowercase):
+        # the iterrows() loader load_usage_tables replaced; empty cells came back as
+        # the string 'nan', which never names a policy or action
+        out = {}
+        for _, row in pd.read_csv(report).iterrows():
+            policy, action = str(row["Policy File"]).strip(), str(row["Action"]).strip()
+            if str(row["Status"]).strip().lower() == status and "nan" not in (policy, action):
+                out.setdefault(policy, set()).add(action.lower() if lowercase else action)
+        return out
+
+    used, covered = load_usage_tables(str(report))
+    assert {p: set(a) for p, a in used.items()} == row_by_row("used", True) == \
+        {"A.json": {"s3:getobject"}, "B.json": {"iam:listusers"}}
+    assert {p: set(a) for p, a in covered.items()} == row_by_row("covered", False)
+    frame = _read_usage_frame(str(report))
+    unused = frame[frame["status"] == "unused"]
+    assert {p: set(g) for p, g in unused["action"].groupby(unused["policy"])} == row_by_row("unused", False)
+    assert load_usage_report(str(report)) == used and load_wildcard_coverage(str(report)) == covered
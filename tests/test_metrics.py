@@ -0,0 +1,50 @@
+import json
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import cli  # noqa: E402
+import metrics  # noqa: E402
+
+
+def test_metrics_out_json_and_prometheus(tmp_path, capsys, monkeypatch):
+    base = ["compare", "--counts", str(ROOT / "data" / "athena_events_raw.csv"), "--policies",
+            str(ROOT / "iam_policies"), "--output", str(tmp_path / "report.csv"),
+            "--cache-dir", str(tmp_path / "cache"), "--log-level", "quiet"]
+    # --profile-stage matches by prefix and profiles only the first matching stage
+    cli.main(base + ["--metrics-out", str(tmp_path / "run.json"),
+                     "--profile-stage", "load", "--profile-out", str(tmp_path / "load.prof")])
+    out = capsys.readouterr().out
+    assert "🔬 Profile of stage 'load usage'" in out and (tmp_path / "load.prof").exists()
+    doc = json.loads((tmp_path / "run.json").read_text())
+    assert doc["tool"] == "compare_policy_usage"
+    assert [s["name"] for s in doc["stages"]] == ["load usage", "list policies", "compare", "write report"]
+    stages = {s["name"]: s for s in doc["stages"]}
+    assert stages["load usage"]["items"] == 10 and stages["load usage"]["unit"] == "events"
+    assert stages["compare"]["items"] == 4 and stages["write report"]["bytes_written"] > 0
+    assert doc["counters"] == {"usage_rows": 10, "compare_cache_hits": 0, "compare_cache_misses": 3}
+
+    prom = tmp_path / "run.prom"
+    cli.main(base + ["--metrics-out", str(prom), "--profile-stage", "nosuch"])
+    assert "No stage matched --profile-stage 'nosuch'" in capsys.readouterr().out
+    lines = prom.read_text().splitlines()
+    sample = re.compile(r'iam_lp_[a-z_]+\{tool="compare_policy_usage"(,[a-z]+="[^"]*")*\} -?\d+(\.\d+)?(e-?\d+)?')
+    for line in lines:
+        assert line.startswith(("# HELP iam_lp_", "# TYPE iam_lp_")) or sample.fullmatch(line), line
+    assert 'iam_lp_counter{tool="compare_policy_usage",name="compare_cache_hits"} 3' in lines
+    assert 'iam_lp_stage_items{tool="compare_policy_usage",stage="compare",unit="policies"} 4' in lines
+    assert "# TYPE iam_lp_stage_wall_seconds gauge" in lines
+
+    # written through a temp file: a failed write leaves the previous file and no leftovers
+    def fail(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(metrics.os, "replace", fail)
+    with pytest.raises(OSError):
+        metrics.RunMetrics("x").write(str(prom))
+    assert prom.read_text().splitlines() == lines
+    assert sorted(p.name for p in tmp_path.iterdir() if p.suffix == ".tmp") == []
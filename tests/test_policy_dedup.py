@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from compare_policy_usage import compare_policy_files  # noqa: E402
+from policy_dedup import DocumentGroups, canonical_hash  # noqa: E402
+from usage_index import UsageIndex  # noqa: E402
+
+
+def test_duplicate_policies_are_analyzed_once():
+    a = {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": ["s3:GetObject", "S3:PutObject"],
+                                                 "Resource": ["arn:aws:s3:::b/*"]}]}
+    b = {"Statement": [{"Resource": "arn:aws:s3:::b/*", "Action": ["s3:putobject", "s3:GetObject"],
+                        "Effect": "Allow"}], "Version": "2012-10-17"}
+    c = {"Version": "2012-10-17", "Statement": {"Effect": "Allow", "Action": "s3:GetObject", "Resource": "*"}}
+    assert canonical_hash(a) == canonical_hash(b) != canonical_hash(c)
+
+    groups = DocumentGroups(["x", "y", "x", "z", "y"])
+    assert (len(groups), groups.duplicates, groups.members()) == (3, 2, [[0, 2], [1, 4], [3]])
+    assert list(groups.fan_out(["X", "Y", "Z"])) == [(0, "X", True), (1, "Y", True), (2, "X", False),
+                                                     (3, "Z", True), (4, "Y", False)]
+
+    files = [("a.json", a), ("c.json", c), ("a2.json", dict(a))]
+    usage = UsageIndex()
+    usage.add_event("s3.amazonaws.com", "GetObject")
+    assert compare_policy_files(files, usage) == compare_policy_files(files, usage, dedup=False)
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from principal_usage import PolicyPrincipals, inline_owner, load_principal_usage, principal_key  # noqa: E402
+
+
+def test_usage_is_attributed_per_principal():
+    assert principal_key("arn:aws:sts::1:assumed-role/Deploy/session-1") == "role/Deploy"
+    assert principal_key("arn:aws:iam::1:user/team/alice") == "user/alice"
+    assert inline_owner("role_my_app_s3_read.json", {"role/my_app"}) == "role/my_app"
+
+    usage, _ = load_principal_usage(str(ROOT / "data" / "athena_events_filtered.csv"))
+    assert usage.principals() == ["user/benjamin"]
+    assert usage.usage_for(["user/benjamin"]).is_used("s3:GetBucketAcl")
+    assert not usage.usage_for(["role/idle"]).is_used("s3:GetBucketAcl")
+
+    attribution = PolicyPrincipals()
+    attribution.add("Shared.json", "group/devs")
+    attribution.members["group/devs"] = {"user/benjamin"}
+    assert attribution.principals_for("Shared.json") == {"group/devs", "user/benjamin"}
+    assert attribution.principals_for("Unattached.json") is None
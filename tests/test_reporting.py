@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import cli  # noqa: E402
+import reporting  # noqa: E402
+from reporting import Reporter  # noqa: E402
+
+
+def test_reporter_levels(capsys):
+    def run(level, progress_every=2):
+        reporter = Reporter(level, progress_every)
+        reporter.info("status")
+        reporter.reset()
+        for i in range(5):
+            if reporter.detailed:
+                reporter.detail(f"  ✅ Used:   a{i}")
+            reporter.tick(["Used", "Unused"] if i % 2 else ["Used"])
+        reporter.warn("⚠️  careful")
+        reporter.done("✔ Compared")
+        return capsys.readouterr().out.splitlines()
+
+    quiet = run("quiet")
+    assert quiet[0] == "⚠️  careful" and quiet[1].startswith("✔ Compared 5 policies (")
+    assert quiet[1].endswith("): Unused 2, Used 5") and len(quiet) == 2
+
+    progress = run("progress")
+    assert progress[0] == "status" and progress[-2:-1] == ["⚠️  careful"]
+    # one aggregate line every --progress-every policies, no per-action lines
+    assert [line.split(" (")[0] for line in progress[1:3]] == ["  … 2 policies", "  … 4 policies"]
+    assert len(progress) == 5 and not any("Used:" in line for line in progress)
+    assert not any(line.startswith("  …") for line in run("progress", progress_every=0))
+
+    detail = run("detail")
+    assert detail[:6] == ["status"] + [f"  ✅ Used:   a{i}" for i in range(5)]
+    assert detail[6] == "⚠️  careful" and len(detail) == 8
+
+
+def test_reporter_buffers_detail_and_flushes_status_lines(capsys, monkeypatch):
+    reporter = Reporter("detail")
+    reporter.detail("one", "two")
+    assert capsys.readouterr().out == ""  # detail lines wait for the next flush
+    reporter.warn("warning")
+    assert capsys.readouterr().out == "one\ntwo\nwarning\n"  # in order, straight away
+    reporter.info("info")
+    assert capsys.readouterr().out == "info\n"
+
+    monkeypatch.setattr(reporting, "BUFFER_CHARS", 10)
+    reporter.detail("12345", "67890")
+    assert capsys.readouterr().out == "12345\n67890\n"  # a full buffer flushes by itself
+    with pytest.raises(ValueError):
+        Reporter("loud")
+
+
+def test_compare_console_output_per_log_level(tmp_path, capsys):
+    base = ["compare", "--counts", str(ROOT / "data" / "athena_events_raw.csv"), "--policies",
+            str(ROOT / "iam_policies"), "--output", str(tmp_path / "report.csv"), "--no-cache"]
+    outputs = {}
+    for level in ("quiet", "progress", "detail"):
+        cli.main(base + ["--log-level", level])
+        outputs[level] = capsys.readouterr().out
+    assert "📄 Policy:" not in outputs["progress"] and "❌ Unused:" not in outputs["progress"]
+    assert "📄 Policy: TestPolicy_Mixed.json" in outputs["detail"] and "❌ Unused:" in outputs["detail"]
+    assert "Loading CloudTrail event usage" in outputs["progress"]
+    assert "Loading CloudTrail event usage" not in outputs["quiet"]
+    for out in outputs.values():
+        assert "✔ Compared 4 policies" in out
@@ -0,0 +1,82 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+import cli  # noqa: E402
+from resource_index import ArnSet, ResourceIndex, resource_arns  # noqa: E402
+
+
+def test_resource_index_matches_and_suggests_arns():
+    assert resource_arns("[{accountid=1, type=AWS::S3::Bucket, arn=arn:aws:s3:::b}, "
+                         "{accountid=1, type=AWS::S3::Object, arn=arn:aws:s3:::b/k}]") == \
+        ["arn:aws:s3:::b", "arn:aws:s3:::b/k"]
+    assert resource_arns('[{"ARN": "arn:aws:s3:::b", "accountId": "1"}]') == ["arn:aws:s3:::b"]
+
+    arns = ArnSet([f"arn:aws:s3:::data/{d}/{i}" for d in ("in", "out") for i in range(20)] + ["arn:aws:s3:::logs/x"])
+    assert len(arns.matching("arn:aws:s3:::data/in/*")) == 20
+    assert arns.matching("arn:aws:s3:::data/*/1?") == [f"arn:aws:s3:::data/{d}/1{i}" for d in ("in", "out")
+                                                       for i in range(10)]
+    assert arns.suggest(3) == ["arn:aws:s3:::data/in/*", "arn:aws:s3:::data/out/*", "arn:aws:s3:::logs/x"]
+    assert arns.suggest(1) == ["arn:aws:s3:::*"]
+
+    index = ResourceIndex()
+    index.add("s3", "GetObject", ["arn:aws:s3:::data/in/1", "arn:aws:s3:::data/in/2"])
+    assert index.suggest(["s3:GetObject"], ["arn:aws:s3:::data/*"]) == ["arn:aws:s3:::data/in/1",
+                                                                        "arn:aws:s3:::data/in/2"]
+    # an action never seen on a resource cannot be narrowed
+    assert index.suggest(["s3:GetObject", "s3:ListAllMyBuckets"], ["*"]) is None
+
+
+def test_resource_suggestions_never_widen_the_pattern():
+    index = ResourceIndex()
+    index.add("s3", "PutObject", ["arn:aws:s3:::prod-a/x", "arn:aws:s3:::prod-b/y", "arn:aws:s3:::prod-c/z",
+                                  "arn:aws:s3:::dev/q"])
+    # wildcard mid-segment: collapsing to the 'arn:aws:s3:::' node would grant dev/q too
+    assert index.suggest(["s3:PutObject"], ["arn:aws:s3:::prod-*"], 1) == ["arn:aws:s3:::prod-*"]
+    assert index.suggest(["s3:PutObject"], ["arn:aws:s3:::prod-*"], 3) == \
+        ["arn:aws:s3:::prod-a/x", "arn:aws:s3:::prod-b/y", "arn:aws:s3:::prod-c/z"]
+    assert index.suggest(["s3:PutObject"], ["arn:aws:s3:::prod-*", "arn:aws:s3:::dev/q"], 2) == \
+        ["arn:aws:s3:::dev/q", "arn:aws:s3:::prod-*"]
+    # other globs are kept as they are, or replaced by the ARNs they matched
+    assert index.suggest(["s3:PutObject"], ["arn:aws:s3:::prod-?/*"], 2) == ["arn:aws:s3:::prod-?/*"]
+
+    # more child nodes than the limit: the original pattern, not its parent 'b/*'
+    arns = ArnSet(["arn:aws:s3:::b/a1/x", "arn:aws:s3:::b/a2/y", "arn:aws:s3:::b/a3/z"])
+    assert arns.suggest(2, ["arn:aws:s3:::b/a*"]) == ["arn:aws:s3:::b/a*"]
+    assert arns.suggest(1) == ["arn:aws:s3:::b/*"]
+
+
+def test_resource_index_cli_wiring(tmp_path, capsys):
+    events = tmp_path / "events.csv"
+    events.write_text('eventsource,eventname,resources\n'
+                      's3.amazonaws.com,GetObject,"[{accountid=1, type=AWS::S3::Object, arn=arn:aws:s3:::data/in/1}]"\n'
+                      's3.amazonaws.com,GetObject,"[{accountid=1, type=AWS::S3::Object, arn=arn:aws:s3:::data/in/2}]"\n'
+                      's3.amazonaws.com,ListAllMyBuckets,[]\n')
+    cli.main(["resources", str(events), "--action", "s3:GetObject", "--resource", "arn:aws:s3:::data/*"])
+    out = capsys.readouterr().out
+    assert "s3:GetObject: 2 observed ARNs in arn:aws:s3:::data/*" in out
+    assert "  arn:aws:s3:::data/in/1\n  arn:aws:s3:::data/in/2\n" in out
+
+    policies = tmp_path / "policies"
+    policies.mkdir()
+    (policies / "P.json").write_text(json.dumps({"Version": "2012-10-17", "Statement": [
+        {"Effect": "Allow", "Action": ["s3:GetObject", "s3:PutObject"], "Resource": "*"}]}))
+    usage = tmp_path / "usage.csv"
+    usage.write_text("Policy File,Action,Status\nP.json,s3:GetObject,Used\nP.json,s3:PutObject,Unused\n")
+    base = ["refine", "--policies", str(policies), "--usage", str(usage), "--no-cache", "--log-level", "quiet"]
+
+    cli.main(base + ["--output", str(tmp_path / "narrowed"), "--resources", str(events), "--narrow-resources"])
+    cli.main(base + ["--output", str(tmp_path / "suggested"), "--resources", str(events)])
+    narrowed = json.loads((tmp_path / "narrowed" / "P_refined.json").read_text())
+    suggested = json.loads((tmp_path / "suggested" / "P_refined.json").read_text())
+    assert narrowed["Statement"][0]["Resource"] == ["arn:aws:s3:::data/in/1", "arn:aws:s3:::data/in/2"]
+    assert suggested["Statement"][0]["Resource"] == "*"
+
+    with pytest.raises(SystemExit):
+        cli.main(base + ["--output", str(tmp_path / "bad"), "--narrow-resources"])
+    assert "--narrow-resources needs --resources" in capsys.readouterr().err
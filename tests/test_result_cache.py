@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from compare_policy_usage import compare_policy_files  # noqa: E402
+from result_cache import ResultCache  # noqa: E402
+from usage_index import UsageIndex  # noqa: E402
+
+
+def test_result_cache_hits_misses_and_disabled(tmp_path):
+    policy = {"Statement": [{"Effect": "Allow", "Action": ["s3:GetObject", "s3:PutObject"], "Resource": "*"}]}
+    usage = UsageIndex()
+    usage.add_event("s3.amazonaws.com", "GetObject")
+    files = [("a.json", policy)]
+
+    cold = ResultCache(str(tmp_path), "compare")
+    expected = compare_policy_files(files, usage, cache=cold)
+    assert (cold.hits, cold.misses) == (0, 1)
+    warm = ResultCache(str(tmp_path), "compare")
+    assert compare_policy_files(files, usage, cache=warm) == expected
+    assert (warm.hits, warm.misses) == (1, 0)
+
+    disabled = ResultCache(str(tmp_path), "compare", enabled=False)  # --no-cache
+    assert compare_policy_files(files, usage, cache=disabled) == expected
+    assert (disabled.hits, disabled.misses) == (0, 1)
+
+    upgraded = ResultCache(str(tmp_path), "compare")
+    upgraded.code = "changed analysis code"
+    compare_policy_files(files, usage, cache=upgraded)
+    assert (upgraded.hits, upgraded.misses) == (0, 1)
@@ -0,0 +1,64 @@
+import pickle
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from action_vocab import VOCABULARY  # noqa: E402
+from usage_index import UsageIndex, load_usage_index, service_from_eventsource  # noqa: E402
+from wildcard_matcher import WildcardMatcher  # noqa: E402
+
+
+def test_eventsource_maps_to_iam_prefix():
+    assert service_from_eventsource("s3.amazonaws.com") == "s3"
+    assert service_from_eventsource("monitoring.amazonaws.com") == "cloudwatch"
+
+
+def test_index_is_service_qualified():
+    index = UsageIndex()
+    index.add_event("s3.amazonaws.com", "GetObject")
+    assert index.is_used("s3:GetObject")
+    assert index.is_used("S3:getobject")
+    assert not index.is_used("ec2:GetObject")
+
+
+def test_name_only_and_prefixed_inputs():
+    # athena_event_counts.csv: eventname only -> matches any service
+    mit, _ = load_usage_index(str(ROOT / "data" / "athena_event_counts.csv"))
+    assert mit.is_used("iam:ListUsers")
+    assert not mit.is_used("iam:CreateUser")
+
+    # athena_events_custom.csv: 'service:Action' names
+    custom, _ = load_usage_index(str(ROOT / "data" / "athena_events_custom.csv"))
+    assert custom.is_used("s3:GetObject")
+    assert not custom.is_used("logs:PutLogEvents")
+    assert not custom.is_used("ec2:GetObject")
+
+
+def test_wildcard_matcher_patterns():
+    matcher = WildcardMatcher(["ec2:*", "s3:Get*", "iam:*User*", "*", "logs:PutLogEvent?"])
+    assert sorted(matcher.match("s3:GetObject")) == ["*", "s3:Get*"]
+    assert sorted(matcher.match("IAM:ListUsers")) == ["*", "iam:*User*"]
+    assert "iam:*User*" not in matcher.match("iam:GetRole")
+    assert "logs:PutLogEvent?" in matcher.match("logs:PutLogEvents")
+    assert "s3:Get*" not in matcher.match("ec2:GetConsoleOutput")
+
+
+def test_wildcard_coverage_from_index():
+    custom, _ = load_usage_index(str(ROOT / "data" / "athena_events_custom.csv"))
+    coverage = custom.covered_by(["ec2:*", "s3:*Object", "iam:Delete*"])
+    assert coverage["ec2:*"] == ["ec2:DescribeInstances", "ec2:StartInstances", "ec2:StopInstances"]
+    assert coverage["s3:*Object"] == ["s3:DeleteObject", "s3:GetObject", "s3:PutObject"]
+    assert coverage["iam:Delete*"] == []
+
+
+def test_action_sets_are_integer_coded():
+    used = VOCABULARY.encode(["s3:GetObject", "S3:PutObject", "iam:ListUsers"])
+    policy = VOCABULARY.encode(["s3:getobject", "ec2:StartInstances"])
+    assert "s3:GETOBJECT" in used and "ec2:StartInstances" not in used
+    assert sorted(policy & used) == ["s3:getobject"]
+    assert sorted(policy - used) == ["ec2:startinstances"]
+    assert len(policy | used) == 4
+    assert pickle.loads(pickle.dumps(used)) == used
+    assert type(used).from_bits(VOCABULARY, used.bits()) == used
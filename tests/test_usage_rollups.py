@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "script"))
+
+from usage_rollups import ingest, list_days, parse_window, read_day, usage_index_from_rollups  # noqa: E402
+
+
+def test_daily_rollups_answer_windows(tmp_path):
+    rollups = str(tmp_path / "rollups")
+    assert ingest(str(ROOT / "data" / "athena_events_filtered.csv"), rollups)["days"] == ["2023-07-10"]
+    assert ingest(str(ROOT / "data" / "athena_events_filtered.csv"), rollups) is None  # already ingested
+    ingest(str(ROOT / "data" / "athena_events_custom.csv"), rollups, default_day="2023-09-01")
+    assert list_days(rollups) == ["2023-07-10", "2023-09-01"]
+
+    july, _ = usage_index_from_rollups(rollups, *parse_window("2023-07-01", "2023-07-31"))
+    assert july.is_used("s3:GetBucketAcl") and not july.is_used("ec2:StartInstances")
+    recent, _ = usage_index_from_rollups(rollups, *parse_window("30d", "2023-09-01"))
+    assert recent.is_used("ec2:StartInstances") and not recent.is_used("s3:GetBucketAcl")
+
+
+def test_rollup_reingest_replaces_a_source(tmp_path):
+    rollups = str(tmp_path / "rollups")
+    events = tmp_path / "events.csv"
+    events.write_text("eventtime,eventsource,eventname\n2024-05-01T10:00:00Z,s3.amazonaws.com,GetObject\n")
+    ingest(str(events), rollups)
+    ingest(str(events), rollups, force=True)
+    assert read_day(rollups, "2024-05-01") == {("", "s3", "GetObject"): 1}
+
+    # the export was rewritten: its old day is taken back out, the new one lands
+    events.write_text("eventtime,eventsource,eventname\n2024-05-02T10:00:00Z,s3.amazonaws.com,GetObject\n")
+    ingest(str(events), rollups)
+    assert list_days(rollups) == ["2024-05-02"]